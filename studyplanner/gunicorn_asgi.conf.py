@@ -0,0 +1,20 @@
+﻿"""gunicorn settings for serving studyplanner.asgi with uvicorn workers.
+
+    gunicorn -c gunicorn_asgi.conf.py studyplanner.asgi:application
+
+Not named gunicorn.conf.py, which gunicorn would also load for the WSGI app.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = 'uvicorn_worker.UvicornWorker'
+# One event loop per worker already keeps many requests in flight; more workers add CPU cores.
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() + 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = timeout
+keepalive = 5
+# Restart workers now and then so slow leaks in a long-lived process cannot pile up.
+max_requests = 1000
+max_requests_jitter = 100
+accesslog = '-'
@@ -1,27 +1,210 @@
 ﻿from django.contrib import admin
-from .models import Course, Task, Reminder, StudyEvent
+from django.core.paginator import Paginator
+from django.db import connection
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from . import profiling, search
+from .models import Course, Task, Reminder, StudyEvent, RequestProfile
+
+# Changelists count at most this many rows; an unfiltered table uses the database's row estimate instead.
+COUNT_LIMIT = 10000
+FILTER_PAGE_SIZE = 30
+
+
+def estimated_count(model):
+    """Cheap row count of a table: PostgreSQL's planner estimate, SQLite's highest id. None if unknown."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            # An index lookup; rows deleted since make it a little high.
+            cursor.execute(f'SELECT max(id) FROM {table}')
+        else:
+            return None
+        row = cursor.fetchone()
+    # reltuples is -1 until the table is first vacuumed or analyzed.
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Never counts more than COUNT_LIMIT rows: an unfiltered big table reports its estimated size."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model)
+            if estimate is not None and estimate > COUNT_LIMIT:
+                return estimate
+        return queryset.order_by()[:COUNT_LIMIT].count()
+
+
+class PaginatedRelatedFilter(admin.RelatedFieldListFilter):
+    """A foreign key filter showing one page of choices at a time, with the selected one always listed.
+
+    Choices are the selected owner's rows when the changelist is filtered by owner.
+    """
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.page_kwarg = f'{field_path}_page'
+        page = params.get(self.page_kwarg, ['1'])[-1]
+        self.page = max(int(page), 1) if page.isdigit() else 1
+        self.owner_id = self.owner_param(request, field_path)
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    @staticmethod
+    def owner_param(request, field_path):
+        value = request.GET.get('owner__id__exact', '')
+        return int(value) if field_path != 'owner' and value.isdigit() else None
+
+    def expected_parameters(self):
+        return [*super().expected_parameters(), self.page_kwarg]
+
+    def queryset(self, request, queryset):
+        self.used_parameters.pop(self.page_kwarg, None)
+        return super().queryset(request, queryset)
+
+    def field_choices(self, field, request, model_admin):
+        related = field.remote_field.model
+        queryset = related._default_manager.all()
+        if self.owner_id is not None:
+            queryset = queryset.filter(owner_id=self.owner_id)
+        else:
+            # Across all owners only the primary key order is cheap.
+            queryset = queryset.order_by('pk')
+        start = (self.page - 1) * FILTER_PAGE_SIZE
+        rows = list(queryset[start:start + FILTER_PAGE_SIZE + 1])
+        if not rows and self.page > 1:
+            # A page left over from before the owner filter changed.
+            self.page = 1
+            rows = list(queryset[:FILTER_PAGE_SIZE + 1])
+        self.has_next = len(rows) > FILTER_PAGE_SIZE
+        choices = [(obj.pk, str(obj)) for obj in rows[:FILTER_PAGE_SIZE]]
+        selected = self.lookup_val[-1] if self.lookup_val else None
+        if selected and selected.isdigit() and int(selected) not in {pk for pk, _ in choices}:
+            obj = related._default_manager.filter(pk=selected).first()
+            if obj is not None:
+                choices.insert(0, (obj.pk, str(obj)))
+        return choices
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield from super().choices(changelist)
+        if self.page > 1:
+            yield {
+                'selected': False,
+                'query_string': changelist.get_query_string({self.page_kwarg: self.page - 1}),
+                'display': '← предыдущие',
+            }
+        if self.has_next:
+            yield {
+                'selected': False,
+                'query_string': changelist.get_query_string({self.page_kwarg: self.page + 1}),
+                'display': 'следующие →',
+            }
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelists that stay fast on millions of rows: no exact counts, no facets, paginated FK filters.
+
+    Search goes through the full-text index; the owner filter, applied first, narrows it with the owner index.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    # Newest first by primary key, which needs no sort, unlike created_at.
+    ordering = ('-pk',)
+    # Rows of another indexed model to search in, e.g. the tasks of reminders.
+    search_path = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        if self.search_path is None:
+            return search.filter_queryset(queryset, search_term), False
+        related = self.model._meta.get_field(self.search_path).remote_field.model
+        matches = related.objects.all()
+        owner_id = PaginatedRelatedFilter.owner_param(request, self.search_path)
+        if owner_id is not None:
+            matches = matches.filter(owner_id=owner_id)
+        matches = search.filter_queryset(matches, search_term)
+        return queryset.filter(**{f'{self.search_path}__in': matches.values('pk')}), False
 
 
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
-    list_display = ('name', 'teacher', 'color', 'created_at')
+class CourseAdmin(LargeTableAdmin):
+    list_display = ('name', 'owner', 'teacher', 'color', 'created_at')
+    list_filter = (('owner', PaginatedRelatedFilter),)
+    list_select_related = ('owner',)
     search_fields = ('name', 'teacher')
+    autocomplete_fields = ('owner',)
 
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
-    list_display = ('title', 'course', 'status', 'deadline', 'priority', 'estimated_minutes', 'created_at')
-    list_filter = ('status', 'course')
+class TaskAdmin(LargeTableAdmin):
+    list_display = ('title', 'owner', 'course', 'status', 'deadline', 'priority', 'estimated_minutes', 'created_at')
+    list_filter = ('status', ('owner', PaginatedRelatedFilter), ('course', PaginatedRelatedFilter))
+    list_select_related = ('owner', 'course')
     search_fields = ('title', 'description')
+    autocomplete_fields = ('owner', 'course')
 
 
 @admin.register(Reminder)
-class ReminderAdmin(admin.ModelAdmin):
-    list_display = ('task', 'remind_at', 'is_sent', 'created_at')
-    list_filter = ('is_sent',)
+class ReminderAdmin(LargeTableAdmin):
+    list_display = ('task', 'owner', 'remind_at', 'is_sent', 'created_at')
+    list_filter = ('is_sent', ('owner', PaginatedRelatedFilter))
+    list_select_related = ('owner', 'task')
+    search_fields = ('task__title', 'task__description')
+    search_path = 'task'
+    autocomplete_fields = ('owner', 'task')
 
 
 @admin.register(StudyEvent)
-class StudyEventAdmin(admin.ModelAdmin):
-    list_display = ('title', 'start_at', 'end_at', 'location')
-    search_fields = ('title', 'location', 'notes')
\ No newline at end of file
+class StudyEventAdmin(LargeTableAdmin):
+    list_display = ('title', 'owner', 'start_at', 'end_at', 'location')
+    list_filter = (('owner', PaginatedRelatedFilter),)
+    list_select_related = ('owner',)
+    search_fields = ('title', 'location', 'notes')
+    autocomplete_fields = ('owner',)
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'user', 'download')
+    list_filter = ('method', 'status_code')
+    list_select_related = ('user',)
+    readonly_fields = ('created_at', 'user', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'download', 'stats')
+    exclude = ('file_name', 'summary')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='.prof')
+    def download(self, obj):
+        url = reverse('admin:planner_requestprofile_download', args=[obj.pk])
+        return format_html('<a href="{}">{}</a>', url, obj.file_name)
+
+    @admin.display(description='Top calls')
+    def stats(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto">{}</pre>', obj.summary)
+
+    def get_urls(self):
+        urls = [path('<int:pk>/download/', self.admin_site.admin_view(self.download_view), name='planner_requestprofile_download')]
+        return urls + super().get_urls()
+
+    def download_view(self, request, pk):
+        record = self.get_object(request, str(pk))
+        if record is None or not self.has_view_permission(request, record):
+            raise Http404
+        try:
+            return FileResponse(profiling.file_path(record).open('rb'), as_attachment=True, filename=record.file_name)
+        except FileNotFoundError:
+            raise Http404('The profile file was removed.')
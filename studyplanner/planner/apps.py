@@ -3,4 +3,7 @@
 
 class PlannerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'planner'
\ No newline at end of file
+    name = 'planner'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,56 @@
+﻿"""Set-based task actions: each action is a few UPDATE/DELETE statements instead of one save() per task."""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import rollup, stamps
+from .models import Task
+
+ACTIONS = ('done', 'todo', 'course', 'shift', 'delete')
+
+
+def status_changes(status, now):
+    """UPDATE values reproducing Task.save: completed_at is kept or set for DONE and cleared otherwise."""
+    if status != Task.Status.DONE:
+        return {'status': status, 'completed_at': None}
+    return {
+        'status': status,
+        'completed_at': Case(
+            When(status=Task.Status.DONE, completed_at__isnull=False, then=F('completed_at')),
+            default=Value(now),
+        ),
+    }
+
+
+def _completed_days(tasks):
+    done = tasks.filter(status=Task.Status.DONE, completed_at__isnull=False)
+    return set(done.annotate(day=TruncDate('completed_at')).values_list('day', flat=True).distinct().order_by())
+
+
+def apply(owner, tasks, action, course=None, days=0):
+    """Run a bulk action on an owner's task queryset and return how many tasks it touched."""
+    tasks = tasks.filter(owner=owner).order_by()
+    now = timezone.now()
+    with transaction.atomic(), stamps.deferred():
+        if action == 'delete':
+            # Task signals keep the rollup in step; deferring them collapses the writes per day.
+            with rollup.deferred():
+                count = tasks.delete()[1].get(Task._meta.label, 0)
+        elif action in ('done', 'todo'):
+            status = Task.Status.DONE if action == 'done' else Task.Status.TODO
+            changing = tasks.exclude(status=status)
+            affected_days = _completed_days(changing) | {timezone.localdate(now)}
+            count = changing.update(**status_changes(status, now))
+            rollup.refresh(owner.id, affected_days)
+        elif action == 'course':
+            count = tasks.update(course=course)
+        elif action == 'shift':
+            count = tasks.filter(deadline__isnull=False).update(deadline=F('deadline') + timedelta(days=days))
+        else:
+            raise ValueError(f'Unknown bulk action {action!r}')
+        if count:
+            stamps.touch(owner.id)
+    return count
@@ -0,0 +1,131 @@
+﻿"""Per-user versioned cache.
+
+Keys embed the user's ChangeStamp version, and every change to the user's courses, tasks, reminders or
+events bumps that version, so stale entries are never read again and simply expire.
+"""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import stamps
+
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2.0
+WAIT_STEP = 0.02
+
+_missing = object()
+_counters = {'hits': 0, 'misses': 0, 'waits': 0}
+_counters_lock = threading.Lock()
+# Counters of the current request, when RequestTimingMiddleware asks for them (counting()).
+_request_counters = ContextVar('planner_cache_counters', default=None)
+
+
+def _count(name):
+    request_counters = _request_counters.get()
+    with _counters_lock:
+        _counters[name] += 1
+        if request_counters is not None:
+            request_counters[name] += 1
+
+
+@contextmanager
+def counting():
+    """Also count the lookups made inside the block, including its sync_to_async threads, in the yielded dict."""
+    counters = dict.fromkeys(_counters, 0)
+    token = _request_counters.set(counters)
+    try:
+        yield counters
+    finally:
+        _request_counters.reset(token)
+
+
+def stats():
+    """Hit/miss counters of this process; `waits` counts misses served by another request's computation."""
+    with _counters_lock:
+        counters = dict(_counters)
+    lookups = counters['hits'] + counters['misses']
+    counters['hit_rate'] = counters['hits'] / lookups if lookups else 0.0
+    return counters
+
+
+def reset_stats():
+    with _counters_lock:
+        for name in _counters:
+            _counters[name] = 0
+
+
+def get_cache():
+    return caches[getattr(settings, 'PLANNER_CACHE', 'default')]
+
+
+def key_for(user, name):
+    return f'planner:{user.pk}:{stamps.for_user(user).version}:{name}'
+
+
+def get_or_set(user, name, compute, timeout=300):
+    """Return the cached value for the user, computing it once even when several requests miss together."""
+    cache = get_cache()
+    key = key_for(user, name)
+    value = cache.get(key, _missing)
+    if value is not _missing:
+        _count('hits')
+        return value
+
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+    deadline = time.monotonic() + LOCK_WAIT
+    while not locked and time.monotonic() < deadline:
+        # Another request is computing this value: wait for its result instead of repeating the queries.
+        time.sleep(WAIT_STEP)
+        value = cache.get(key, _missing)
+        if value is not _missing:
+            _count('hits')
+            _count('waits')
+            return value
+        locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+
+    _count('misses')
+    try:
+        value = compute()
+        cache.set(key, value, timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+async def aget_or_set(user, name, compute, timeout=300):
+    """get_or_set() for async views: `compute` is a coroutine function and waiting does not block the loop."""
+    cache = get_cache()
+    await stamps.afor_user(user)
+    key = key_for(user, name)
+    value = await cache.aget(key, _missing)
+    if value is not _missing:
+        _count('hits')
+        return value
+
+    lock_key = f'{key}:lock'
+    locked = await cache.aadd(lock_key, 1, LOCK_TIMEOUT)
+    deadline = time.monotonic() + LOCK_WAIT
+    while not locked and time.monotonic() < deadline:
+        await asyncio.sleep(WAIT_STEP)
+        value = await cache.aget(key, _missing)
+        if value is not _missing:
+            _count('hits')
+            _count('waits')
+            return value
+        locked = await cache.aadd(lock_key, 1, LOCK_TIMEOUT)
+
+    _count('misses')
+    try:
+        value = await compute()
+        await cache.aset(key, value, timeout)
+    finally:
+        if locked:
+            await cache.adelete(lock_key)
+    return value
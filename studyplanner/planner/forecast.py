@@ -0,0 +1,100 @@
+﻿"""Deadline-risk forecast for all open tasks of one owner."""
+from bisect import bisect_right
+from datetime import timedelta
+from itertools import accumulate
+
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import OPEN_STATUSES, Task
+
+
+class DeadlineForecast:
+    """Forecasts one task with an aggregate, or every open task from one load and prefix sums over deadlines."""
+
+    def __init__(self, owner, now=None):
+        self.now = now or timezone.now()
+        done_minutes = Task.objects.filter(
+            owner=owner,
+            status=Task.Status.DONE,
+            completed_at__gte=self.now - timedelta(days=7),
+            completed_at__lte=self.now,
+        ).aggregate(total=Sum('estimated_minutes'))['total'] or 0
+        self.capacity_per_day = done_minutes / 7
+        self._open_tasks = Task.objects.filter(owner=owner, status__in=OPEN_STATUSES, deadline__gte=self.now).order_by()
+        self._rows = None
+        self._loaded_until = None
+        # Remaining minutes by deadline, from statuses().
+        self._remaining = {}
+
+    def load(self, until=None):
+        """Read the open tasks due up to `until` (all of them by default) for prefix sums."""
+        if self._rows is None:
+            tasks = self._open_tasks if until is None else self._open_tasks.filter(deadline__lte=until)
+            self._rows = sorted(tasks.values_list('deadline', 'id', 'estimated_minutes'))
+            self._loaded_until = until
+            self._deadlines = [deadline for deadline, _, _ in self._rows]
+            self._cumulative = [0, *accumulate(minutes for _, _, minutes in self._rows)]
+        return self
+
+    def remaining_minutes(self, deadline) -> int:
+        if deadline in self._remaining:
+            return self._remaining[deadline]
+        if self._rows is None or (self._loaded_until is not None and deadline > self._loaded_until):
+            return self._open_tasks.filter(deadline__lte=deadline).aggregate(total=Sum('estimated_minutes'))['total'] or 0
+        return self._cumulative[bisect_right(self._deadlines, deadline)]
+
+    def _forecast(self, deadline, remaining_minutes) -> dict:
+        if self.capacity_per_day == 0:
+            return {'status': 'no_data'}
+
+        seconds_left = (deadline - self.now).total_seconds()
+        days_left = max(1, int((seconds_left + 86399) // 86400))
+        capacity_total = self.capacity_per_day * days_left
+
+        return {
+            'status': 'ok' if remaining_minutes <= capacity_total else 'risk',
+            'remaining_minutes': remaining_minutes,
+            'days_left': days_left,
+            'capacity_per_day': self.capacity_per_day,
+            'capacity_total': capacity_total,
+        }
+
+    def for_task(self, task) -> dict:
+        if not task.deadline:
+            return {'status': 'no_deadline'}
+        if task.deadline <= self.now:
+            return {'status': 'deadline_passed'}
+        if self.capacity_per_day == 0:
+            return {'status': 'no_data'}
+        return self._forecast(task.deadline, self.remaining_minutes(task.deadline))
+
+    def all(self) -> dict:
+        self.load()
+        if self._loaded_until is not None:
+            raise ValueError('all() needs every open task; this forecast was loaded up to a deadline.')
+        forecasts = {}
+        end = len(self._rows)
+        # Walk backwards so tasks sharing a deadline all see the cumulative total of the whole group.
+        for index in range(end - 1, -1, -1):
+            deadline, task_id, _ = self._rows[index]
+            if index + 1 < end and self._deadlines[index + 1] != deadline:
+                end = index + 1
+            if deadline <= self.now:
+                forecasts[task_id] = {'status': 'deadline_passed'}
+            else:
+                forecasts[task_id] = self._forecast(deadline, self._cumulative[end])
+        return forecasts
+
+    def statuses(self, tasks) -> dict:
+        """Status of each task; unless load() ran, one aggregate covers the given tasks' deadlines only."""
+        tasks = list(tasks)
+        deadlines = sorted({task.deadline for task in tasks if task.deadline and task.deadline > self.now})
+        if self.capacity_per_day and deadlines and self._rows is None:
+            # Bounded by the latest deadline asked about, however many open tasks lie beyond it.
+            totals = self._open_tasks.filter(deadline__lte=deadlines[-1]).aggregate(**{
+                f'due_{index}': Sum('estimated_minutes', filter=Q(deadline__lte=deadline))
+                for index, deadline in enumerate(deadlines)
+            })
+            self._remaining.update((deadline, totals[f'due_{index}'] or 0) for index, deadline in enumerate(deadlines))
+        return {task.id: self.for_task(task)['status'] for task in tasks}
@@ -1,4 +1,7 @@
-﻿from django import forms
+﻿from datetime import date
+
+from django import forms
+from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from .models import Course, Task, Reminder, StudyEvent
@@ -20,6 +23,43 @@ def apply_field_classes(fields):
             widget.attrs['class'] = f"{existing} {class_name}".strip()
 
 
+class LazySelect(forms.Select):
+    """A <select> rendered with only the chosen option; js/autocomplete.js fetches the others from `url_name`.
+
+    The field's queryset is queried only for the selected value, so it still limits what validates.
+    """
+
+    def __init__(self, url_name, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocomplete-url'] = reverse(self.url_name)
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        field = self.choices.field
+        chosen = [item for item in value if str(item).isdigit()]
+        options = []
+        if field.empty_label is not None:
+            options.append(self.create_option(name, '', field.empty_label, not chosen, 0, attrs=attrs))
+        for index, obj in enumerate(field.queryset.filter(pk__in=chosen), start=1):
+            options.append(self.create_option(name, obj.pk, field.label_from_instance(obj), True, index, attrs=attrs))
+        return [(None, options, 0)]
+
+
+def validate_deadline(deadline, created_at):
+    """Task deadline rule shared by TaskForm and the bulk importer."""
+    if deadline and deadline < created_at:
+        raise forms.ValidationError('Deadline cannot be earlier than created_at.')
+
+
+def validate_priority(priority):
+    if priority is not None and (priority < 1 or priority > 5):
+        raise forms.ValidationError('Priority must be between 1 and 5.')
+
+
 class CourseForm(forms.ModelForm):
     class Meta:
         model = Course
@@ -38,6 +78,7 @@ class TaskForm(forms.ModelForm):
         model = Task
         fields = ['course', 'title', 'description', 'deadline', 'priority', 'estimated_minutes', 'status']
         widgets = {
+            'course': LazySelect('course_autocomplete'),
             'deadline': forms.DateTimeInput(attrs={'type': 'datetime-local'}, format=DT_FORMAT),
         }
 
@@ -51,27 +92,66 @@ class TaskForm(forms.ModelForm):
 
     def clean_deadline(self):
         deadline = self.cleaned_data.get('deadline')
-        if not deadline:
-            return deadline
-        created_at = self.instance.created_at or timezone.now()
-        if deadline < created_at:
-            raise forms.ValidationError('Deadline cannot be earlier than created_at.')
+        validate_deadline(deadline, self.instance.created_at or timezone.now())
         return deadline
 
     def clean_priority(self):
         priority = self.cleaned_data.get('priority')
-        if priority is None:
-            return priority
-        if priority < 1 or priority > 5:
-            raise forms.ValidationError('Priority must be between 1 and 5.')
+        validate_priority(priority)
         return priority
 
 
+class IdListField(forms.Field):
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        try:
+            return [int(item) for item in value or []]
+        except (TypeError, ValueError):
+            raise forms.ValidationError('Invalid task selection.')
+
+
+class TaskBulkActionForm(forms.Form):
+    ACTION_CHOICES = [
+        ('done', 'Mark done'),
+        ('todo', 'Mark TODO'),
+        ('course', 'Move to course'),
+        ('shift', 'Shift deadline (days)'),
+        ('delete', 'Delete'),
+    ]
+    SCOPE_CHOICES = [('selected', 'Selected tasks'), ('filter', 'All tasks matching the filter')]
+
+    action = forms.ChoiceField(choices=ACTION_CHOICES)
+    scope = forms.ChoiceField(choices=SCOPE_CHOICES, initial='selected')
+    ids = IdListField(required=False)
+    # Not "course": the list's course filter is posted alongside as a hidden input under that name.
+    target_course = forms.ModelChoiceField(queryset=Course.objects.none(), required=False, empty_label='Без курса')
+    days = forms.IntegerField(
+        required=False, min_value=-365, max_value=365, widget=forms.NumberInput(attrs={'placeholder': 'Days'}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        self.user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        apply_field_classes(self.fields)
+        if self.user:
+            self.fields['target_course'].queryset = Course.objects.filter(owner=self.user)
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get('scope') == 'selected' and not cleaned.get('ids'):
+            raise forms.ValidationError('Select at least one task.')
+        if cleaned.get('action') == 'shift' and not cleaned.get('days'):
+            raise forms.ValidationError('Enter the number of days to shift deadlines by.')
+        return cleaned
+
+
 class ReminderForm(forms.ModelForm):
     class Meta:
         model = Reminder
         fields = ['task', 'remind_at', 'is_sent']
         widgets = {
+            'task': LazySelect('task_autocomplete'),
             'remind_at': forms.DateTimeInput(attrs={'type': 'datetime-local'}, format=DT_FORMAT),
         }
 
@@ -85,12 +165,21 @@ class ReminderForm(forms.ModelForm):
 
 
 class StudyEventForm(forms.ModelForm):
+    exception_dates = forms.CharField(
+        required=False,
+        help_text='Dates to skip in a repeating event, YYYY-MM-DD, comma separated.',
+    )
+
     class Meta:
         model = StudyEvent
-        fields = ['title', 'start_at', 'end_at', 'location', 'notes']
+        fields = [
+            'title', 'start_at', 'end_at', 'location', 'notes',
+            'repeat', 'repeat_interval', 'repeat_until', 'repeat_count', 'exception_dates',
+        ]
         widgets = {
             'start_at': forms.DateTimeInput(attrs={'type': 'datetime-local'}, format=DT_FORMAT),
             'end_at': forms.DateTimeInput(attrs={'type': 'datetime-local'}, format=DT_FORMAT),
+            'repeat_until': forms.DateInput(attrs={'type': 'date'}, format='%Y-%m-%d'),
         }
 
     def __init__(self, *args, **kwargs):
@@ -98,6 +187,32 @@ class StudyEventForm(forms.ModelForm):
         apply_field_classes(self.fields)
         self.fields['start_at'].input_formats = [DT_FORMAT]
         self.fields['end_at'].input_formats = [DT_FORMAT]
+        if self.instance.exception_dates:
+            self.initial['exception_dates'] = ', '.join(self.instance.exception_dates)
+
+    def clean_exception_dates(self):
+        value = self.cleaned_data.get('exception_dates') or ''
+        days = set()
+        for part in value.replace(';', ',').split(','):
+            if not part.strip():
+                continue
+            try:
+                days.add(date.fromisoformat(part.strip()))
+            except ValueError:
+                raise forms.ValidationError(f'Invalid date: {part.strip()}. Use YYYY-MM-DD.')
+        return [day.isoformat() for day in sorted(days)]
+
+    def clean_repeat_interval(self):
+        interval = self.cleaned_data.get('repeat_interval')
+        if interval is not None and interval < 1:
+            raise forms.ValidationError('Interval must be at least 1.')
+        return interval
+
+    def clean_repeat_count(self):
+        count = self.cleaned_data.get('repeat_count')
+        if count is not None and count < 1:
+            raise forms.ValidationError('Number of occurrences must be at least 1.')
+        return count
 
     def clean(self):
         cleaned = super().clean()
@@ -105,6 +220,27 @@ class StudyEventForm(forms.ModelForm):
         end_at = cleaned.get('end_at')
         if start_at and end_at and end_at < start_at:
             raise forms.ValidationError('End time must be after start time.')
+        if cleaned.get('repeat_count') is not None and cleaned.get('repeat_until'):
+            raise forms.ValidationError('End a repeating event either after a number of occurrences or on a date, not both.')
+        return cleaned
+
+
+class TaskImportForm(forms.Form):
+    FORMAT_CHOICES = [('', 'By file extension'), ('csv', 'CSV'), ('jsonl', 'JSON Lines')]
+
+    file = forms.FileField(help_text='Columns: title, description, course, deadline, priority, estimated_minutes, status.')
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+    create_courses = forms.BooleanField(required=False, help_text='Create courses that do not exist yet.')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        apply_field_classes(self.fields)
+
+    def clean(self):
+        cleaned = super().clean()
+        upload = cleaned.get('file')
+        if upload and not cleaned.get('format'):
+            cleaned['format'] = 'csv' if upload.name.lower().endswith('.csv') else 'jsonl'
         return cleaned
 
 
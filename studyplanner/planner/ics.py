@@ -0,0 +1,174 @@
+﻿"""iCalendar (RFC 5545) feed of a user's study events and task deadlines, produced as a stream."""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from django.db.models import Min
+from django.utils import timezone
+
+from . import recurrence
+from .models import StudyEvent, Task
+
+CHUNK_SIZE = 500
+RRULE_FREQ = {'daily': 'DAILY', 'weekly': 'WEEKLY'}
+# Offset changes of the zone are listed up to this many years ahead; clients keep the last one after that.
+VTIMEZONE_YEARS_AHEAD = 10
+
+
+def escape(value):
+    value = (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+    return value.replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line):
+    """Split a content line into 75-octet pieces without breaking UTF-8 sequences."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line
+    pieces, current, limit = [], b'', 75
+    for char in line:
+        octets = char.encode()
+        if len(current) + len(octets) > limit:
+            pieces.append(current.decode())
+            current, limit = b'', 74
+        current += octets
+    pieces.append(current.decode())
+    return '\r\n '.join(pieces)
+
+
+def utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def local(value):
+    return timezone.localtime(value).strftime('%Y%m%dT%H%M%S')
+
+
+def _component(name, lines):
+    return ''.join(fold(line) + '\r\n' for line in (f'BEGIN:{name}', *lines, f'END:{name}'))
+
+
+def _offset(value):
+    seconds = int(value.total_seconds())
+    sign = '-' if seconds < 0 else '+'
+    hours, rest = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f'{sign}{hours:02}{minutes:02}' + (f'{seconds:02}' if seconds else '')
+
+
+def _transitions(zone, start, end):
+    """Yield the UTC instants in [start, end) at which the zone's UTC offset or DST flag changes."""
+    def state(instant):
+        local_time = instant.astimezone(zone)
+        return local_time.utcoffset(), local_time.dst()
+
+    day = timedelta(days=1)
+    current, before = start, state(start)
+    while current < end:
+        following = current + day
+        if state(following) != before:
+            # Offsets change at most once a day: narrow the day down to the second of the change.
+            low, high = current, following
+            while high - low > timedelta(seconds=1):
+                middle = low + (high - low) / 2
+                low, high = (middle, high) if state(middle) == before else (low, middle)
+            yield high
+            before = state(high)
+        current = following
+
+
+def _observance(zone, instant, offset_from):
+    """STANDARD or DAYLIGHT sub-component for the rules in effect from `instant` on."""
+    local_time = instant.astimezone(zone)
+    # DTSTART of an observance is local time in the offset before it.
+    onset = (instant + offset_from).replace(tzinfo=None)
+    return _component('DAYLIGHT' if local_time.dst() else 'STANDARD', [
+        f'DTSTART:{onset.strftime("%Y%m%dT%H%M%S")}',
+        f'TZOFFSETFROM:{_offset(offset_from)}',
+        f'TZOFFSETTO:{_offset(local_time.utcoffset())}',
+        f'TZNAME:{escape(local_time.tzname())}',
+    ])
+
+
+@lru_cache(maxsize=32)
+def vtimezone(tzid, first_year, last_year):
+    """VTIMEZONE for the TZID the events are written in, with every offset change from first_year to last_year."""
+    zone = ZoneInfo(tzid)
+    start = datetime(first_year, 1, 1, tzinfo=dt_timezone.utc)
+    end = datetime(last_year + 1, 1, 1, tzinfo=dt_timezone.utc)
+    offset = start.astimezone(zone).utcoffset()
+    observances = [_observance(zone, start, offset)]
+    for instant in _transitions(zone, start, end):
+        observances.append(_observance(zone, instant, offset))
+        offset = instant.astimezone(zone).utcoffset()
+    return f'BEGIN:VTIMEZONE\r\n{fold(f"TZID:{tzid}")}\r\n{"".join(observances)}END:VTIMEZONE\r\n'
+
+
+def event_component(event, stamp):
+    tzid = timezone.get_current_timezone_name()
+    lines = [
+        f'UID:event-{event.pk}@studyplanner',
+        f'DTSTAMP:{utc(stamp)}',
+        f'DTSTART;TZID={tzid}:{local(event.start_at)}',
+    ]
+    if event.end_at:
+        lines.append(f'DTEND;TZID={tzid}:{local(event.end_at)}')
+    lines.append(f'SUMMARY:{escape(event.title)}')
+    if event.location:
+        lines.append(f'LOCATION:{escape(event.location)}')
+    if event.notes:
+        lines.append(f'DESCRIPTION:{escape(event.notes)}')
+    if recurrence.is_recurring(event):
+        # The client expands the series itself; occurrences are never listed one by one.
+        rule = f'RRULE:FREQ={RRULE_FREQ[event.repeat]};INTERVAL={event.repeat_interval}'
+        # RFC 5545 allows COUNT or UNTIL, not both: keep the one that ends the series first.
+        bound = recurrence.ending_bound(event)
+        if bound == 'count':
+            rule += f';COUNT={event.repeat_count}'
+        elif bound == 'until':
+            until = timezone.make_aware(datetime.combine(event.repeat_until, time.max))
+            rule += f';UNTIL={utc(until)}'
+        lines.append(rule)
+        days = sorted(recurrence.exception_days(event))
+        if days:
+            lines.append(f'EXDATE;TZID={tzid}:' + ','.join(local(recurrence.start_on(event, day)) for day in days))
+    return _component('VEVENT', lines)
+
+
+def task_component(task, stamp):
+    lines = [
+        f'UID:task-{task.pk}@studyplanner',
+        f'DTSTAMP:{utc(stamp)}',
+        f'DTSTART:{utc(task.deadline - timedelta(minutes=task.estimated_minutes))}',
+        f'DTEND:{utc(task.deadline)}',
+        f'SUMMARY:{escape("Дедлайн: " + task.title)}',
+    ]
+    if task.description:
+        lines.append(f'DESCRIPTION:{escape(task.description)}')
+    return _component('VEVENT', lines)
+
+
+def feed(owner_id, stamp):
+    """Yield the calendar in chunks; querysets are read with iterator() so memory stays flat."""
+    yield (
+        'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//StudyPlanner//Calendar//RU\r\n'
+        'CALSCALE:GREGORIAN\r\nX-WR-CALNAME:StudyPlanner\r\n'
+    )
+    events = StudyEvent.objects.filter(owner_id=owner_id).only(
+        'id', 'title', 'location', 'notes', *recurrence.EXPANSION_FIELDS,
+    ).order_by('pk')
+    # Events are written in local time with a TZID (series keep their wall-clock time across DST),
+    # which RFC 5545 requires to be defined in the calendar; task deadlines are plain UTC.
+    first_start = events.aggregate(first=Min('start_at'))['first']
+    if first_start is not None:
+        this_year = timezone.localdate().year
+        first_year = min(timezone.localtime(first_start).year, this_year)
+        yield vtimezone(timezone.get_current_timezone_name(), first_year, this_year + VTIMEZONE_YEARS_AHEAD)
+    for event in events.iterator(chunk_size=CHUNK_SIZE):
+        yield event_component(event, stamp)
+    tasks = Task.objects.filter(owner_id=owner_id, deadline__isnull=False).exclude(status=Task.Status.DONE).only(
+        'id', 'title', 'description', 'deadline', 'estimated_minutes',
+    ).order_by('pk')
+    for task in tasks.iterator(chunk_size=CHUNK_SIZE):
+        yield task_component(task, stamp)
+    yield 'END:VCALENDAR\r\n'
@@ -0,0 +1,182 @@
+﻿"""Bulk task import from CSV or JSON Lines: rows are parsed, validated and inserted as a stream."""
+import csv
+import io
+import json
+from datetime import datetime, time
+
+from django import forms
+from django.db import connection, transaction
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import rollup, stamps
+from .forms import validate_deadline, validate_priority
+from .models import Course, Task
+
+MAX_REPORTED_ERRORS = 1000
+# The portable limits of the integer columns, whatever the database accepts.
+INTEGER_RANGES = BaseDatabaseOperations.integer_field_ranges
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict) from a text stream without reading it whole.
+
+    A file that is not UTF-8 or not valid CSV raises forms.ValidationError when the bad line is reached.
+    """
+    rows = _csv_rows(stream) if fmt == 'csv' else _jsonl_rows(stream)
+    line = 0
+    try:
+        for line, row in rows:
+            yield line, row
+    except UnicodeDecodeError:
+        # Text is decoded in blocks ahead of the parser, so the line is not known.
+        raise forms.ValidationError('The file is not UTF-8 encoded text.')
+    except csv.Error as exc:
+        raise forms.ValidationError(f'Line {line + 1}: not valid CSV ({exc}).')
+
+
+def _csv_rows(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _jsonl_rows(stream):
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, None
+            continue
+        yield number, row if isinstance(row, dict) else None
+
+
+def open_text(binary):
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def _text(row, key):
+    value = row.get(key)
+    return str(value).strip() if value is not None else ''
+
+
+def _integer(row, key, default):
+    value = _text(row, key)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise forms.ValidationError(f'{key} must be a whole number.')
+    low, high = INTEGER_RANGES[Task._meta.get_field(key).get_internal_type()]
+    if not low <= number <= high:
+        raise forms.ValidationError(f'{key} must be between {low} and {high}.')
+    return number
+
+
+def _deadline(row):
+    value = _text(row, 'deadline')
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise forms.ValidationError('deadline must be an ISO date or date and time.')
+        parsed = datetime.combine(day, time(23, 59))
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.rolled_back = False
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+class TaskImporter:
+    """Validate rows with the TaskForm rules and insert them with bulk_create in batches."""
+
+    def __init__(self, owner, batch_size=1000, create_courses=False, strict=False):
+        self.owner = owner
+        self.batch_size = batch_size
+        self.create_courses = create_courses
+        self.strict = strict
+        self.now = timezone.now()
+        self.courses = dict(Course.objects.filter(owner=owner).values_list('name', 'id'))
+
+    def _course_id(self, name):
+        if not name:
+            return None
+        if name not in self.courses:
+            if not self.create_courses:
+                raise forms.ValidationError(f'Unknown course "{name}".')
+            self.courses[name] = Course.objects.create(owner=self.owner, name=name).id
+        return self.courses[name]
+
+    def build(self, row):
+        if row is None:
+            raise forms.ValidationError('Row is not a JSON object.')
+        title = _text(row, 'title')
+        if not title:
+            raise forms.ValidationError('title is required.')
+        if len(title) > 255:
+            raise forms.ValidationError('title is longer than 255 characters.')
+        status = _text(row, 'status').upper() or Task.Status.TODO
+        if status not in Task.Status.values:
+            raise forms.ValidationError(f'status must be one of {", ".join(Task.Status.values)}.')
+        deadline = _deadline(row)
+        validate_deadline(deadline, self.now)
+        priority = _integer(row, 'priority', 3)
+        validate_priority(priority)
+        estimated_minutes = _integer(row, 'estimated_minutes', 60)
+        return Task(
+            owner=self.owner,
+            course_id=self._course_id(_text(row, 'course')),
+            title=title,
+            description=_text(row, 'description') or None,
+            deadline=deadline,
+            priority=priority,
+            estimated_minutes=estimated_minutes,
+            status=status,
+            completed_at=self.now if status == Task.Status.DONE else None,
+        )
+
+    def _insert(self, batch):
+        created = len(Task.objects.bulk_create(batch))
+        # With DEBUG on, the query log would keep the SQL of every batch and memory would grow with the file.
+        connection.queries_log.clear()
+        return created
+
+    def run(self, rows):
+        report = ImportReport()
+        batch = []
+        with transaction.atomic(), stamps.deferred():
+            for line, row in rows:
+                try:
+                    batch.append(self.build(row))
+                except forms.ValidationError as exc:
+                    report.add_error(line, ' '.join(exc.messages))
+                    continue
+                if len(batch) >= self.batch_size:
+                    report.created += self._insert(batch)
+                    batch = []
+            if batch:
+                report.created += self._insert(batch)
+            if self.strict and report.failed:
+                transaction.set_rollback(True)
+                report.rolled_back = True
+            elif report.created:
+                # bulk_create skips the Task signals, so the rollup and change stamp are updated here.
+                rollup.refresh(self.owner.id, {timezone.localdate(self.now), timezone.localdate()})
+                stamps.touch(self.owner.id)
+        return report
@@ -0,0 +1,222 @@
+﻿import asyncio
+import importlib
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import override_settings
+from django.urls import clear_url_caches, reverse
+from django.utils.http import urlencode
+
+from planner.management.commands.load_test import HOST, VirtualUser, wsgi_environ
+
+BENCH_CACHE = 'bench_async'
+# name: (URL name, query string parameters)
+PAGES = {
+    'dashboard': ('dashboard', None),
+    'stats': ('stats', None),
+    'calendar_week': ('calendar_week', None),
+    'calendar_month': ('calendar_month', None),
+    'calendar_agenda': ('calendar_agenda', {'to': '2100-01-01'}),
+}
+# name: (served by the async views, their queries run concurrently)
+MODES = {
+    'sync': (False, False),
+    'async': (True, False),
+    'async_parallel': (True, True),
+}
+
+
+def reload_urls():
+    """Re-read the URLconfs, which pick the sync or async page views when imported."""
+    importlib.reload(importlib.import_module('planner.urls'))
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+@contextmanager
+def serving(async_views, parallel_queries):
+    with override_settings(PLANNER_ASYNC_VIEWS=async_views, PLANNER_PARALLEL_QUERIES=parallel_queries):
+        reload_urls()
+        yield
+    reload_urls()
+
+
+def page_path(page):
+    url_name, params = PAGES[page]
+    return f'{reverse(url_name)}?{urlencode(params)}' if params else reverse(url_name)
+
+
+def summarize(timings, elapsed):
+    timings = sorted(timings)
+    return {
+        'requests': len(timings),
+        'per_second': round(len(timings) / elapsed, 1),
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the sync dashboard, stats and calendar pages under WSGI with their async versions under ASGI, '
+        'with and without concurrent queries: latency of single requests and under concurrency, page cache off.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='User whose pages are requested (default: first PREFIX* user)')
+        parser.add_argument('--username-prefix', default='synthetic', help='Users created by generate_data')
+        parser.add_argument('--pages', default=','.join(PAGES), help=f'Comma-separated; choose from {", ".join(PAGES)}')
+        parser.add_argument('--modes', default=','.join(MODES), help=f'Comma-separated; choose from {", ".join(MODES)}')
+        parser.add_argument('--repeat', type=int, default=20, help='Requests per page and mode')
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight in the concurrent round')
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        pages = [name.strip() for name in options['pages'].split(',') if name.strip()]
+        modes = [name.strip() for name in options['modes'].split(',') if name.strip()]
+        unknown = [name for name in pages if name not in PAGES] + [name for name in modes if name not in MODES]
+        if unknown:
+            raise CommandError(f'Unknown page or mode: {", ".join(unknown)}.')
+        users = get_user_model().objects.order_by('username')
+        if options['username']:
+            user = users.filter(username=options['username']).first()
+        else:
+            user = users.filter(username__startswith=options['username_prefix']).first()
+        if user is None:
+            raise CommandError('No such user; create one with generate_data first.')
+        if settings.DEBUG:
+            self.stderr.write('DEBUG is on: queries are logged; DEBUG=False gives realistic numbers.')
+
+        self.visitor = VirtualUser(user, [])
+        self.stdout.write(
+            f'{user.get_username()}: {user.tasks.count()} tasks on {connection.vendor}, '
+            f'{options["repeat"]} requests per page, concurrency {options["concurrency"]}'
+        )
+        # No page cache, so every request runs the page's queries.
+        bench_caches = {**settings.CACHES, BENCH_CACHE: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        results = {}
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, HOST], CACHES=bench_caches, PLANNER_CACHE=BENCH_CACHE):
+                for mode in modes:
+                    with serving(*MODES[mode]):
+                        for page in pages:
+                            results[f'{page}:{mode}'] = self.measure(mode, page_path(page), options)
+        finally:
+            self.visitor.session.delete()
+
+        self.stdout.write(f'\n{"page":<18}{"mode":<16}{"median ms":>10}{"p95 ms":>9}  {"concurrent req/s":>16}{"p95 ms":>9}')
+        for key, result in results.items():
+            page, mode = key.split(':')
+            single, concurrent = result['single'], result['concurrent']
+            self.stdout.write(
+                f'{page:<18}{mode:<16}{single["median_ms"]:>10}{single["p95_ms"]:>9}  '
+                f'{concurrent["per_second"]:>16}{concurrent["p95_ms"]:>9}'
+            )
+        if options['output']:
+            report = {'database': connection.vendor, 'user': user.get_username(), 'results': results}
+            Path(options['output']).write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+    def measure(self, mode, path, options):
+        if mode == 'sync':
+            single = self.run_sync(path, options['repeat'], 1)
+            concurrent = self.run_sync(path, options['repeat'] * options['concurrency'], options['concurrency'])
+        else:
+            single = asyncio.run(self.run_async(path, options['repeat'], 1))
+            concurrent = asyncio.run(self.run_async(path, options['repeat'] * options['concurrency'], options['concurrency']))
+        return {'single': single, 'concurrent': concurrent}
+
+    def run_sync(self, path, total, concurrency):
+        """Like a threaded WSGI worker: `concurrency` threads share the requests."""
+        application = WSGIHandler()
+        timings, lock = [], threading.Lock()
+        self.request_wsgi(application, path)
+
+        def worker(count):
+            try:
+                for _ in range(count):
+                    elapsed = self.request_wsgi(application, path)
+                    with lock:
+                        timings.append(elapsed)
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            for future in [pool.submit(worker, total // concurrency) for _ in range(concurrency)]:
+                future.result()
+        return summarize(timings, time.perf_counter() - started)
+
+    def request_wsgi(self, application, path):
+        status = []
+        started = time.perf_counter()
+        result = application(wsgi_environ('GET', path, self.visitor), lambda line, headers, exc_info=None: status.append(line))
+        try:
+            for _ in result:
+                pass
+        finally:
+            result.close()
+        elapsed = (time.perf_counter() - started) * 1000
+        if not status[0].startswith('200'):
+            raise CommandError(f'GET {path}: {status[0]}')
+        return elapsed
+
+    async def run_async(self, path, total, concurrency):
+        """Like one ASGI worker: `concurrency` requests in flight on one event loop."""
+        application = ASGIHandler()
+        timings = []
+        await self.request_asgi(application, path)
+
+        async def worker(count):
+            for _ in range(count):
+                timings.append(await self.request_asgi(application, path))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(total // concurrency) for _ in range(concurrency)))
+        return summarize(timings, time.perf_counter() - started)
+
+    async def request_asgi(self, application, path):
+        path_info, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path_info,
+            'raw_path': path_info.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', HOST.encode()), (b'cookie', self.visitor.cookie.encode())],
+            'client': ('127.0.0.1', 50000),
+            'server': (HOST, 80),
+        }
+        body = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        status = []
+
+        async def receive():
+            if body:
+                return body.pop()
+            # The handler listens for a disconnect until the response is sent, then cancels this.
+            return await asyncio.Future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        started = time.perf_counter()
+        await application(scope, receive, send)
+        elapsed = (time.perf_counter() - started) * 1000
+        if status != [200]:
+            raise CommandError(f'GET {path}: {status}')
+        return elapsed
@@ -0,0 +1,70 @@
+﻿import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from planner.forecast import DeadlineForecast
+from planner.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the batch deadline forecast against per-task aggregate queries (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=10000, help='Open tasks to seed')
+        parser.add_argument('--sample', type=int, default=200, help='Tasks to forecast one by one for the comparison')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(username=f'bench_forecast_{time.time_ns()}')
+            now = timezone.now()
+            open_tasks = [
+                Task(
+                    owner=user,
+                    title=f'Task {i}',
+                    deadline=now + timedelta(minutes=rng.randint(60, 60 * 24 * 60)),
+                    estimated_minutes=rng.choice([15, 30, 45, 60, 90, 120, 180]),
+                )
+                for i in range(options['tasks'])
+            ]
+            done_tasks = [
+                Task(
+                    owner=user,
+                    title=f'Done {i}',
+                    status=Task.Status.DONE,
+                    completed_at=now - timedelta(minutes=rng.randint(1, 60 * 24 * 7)),
+                    estimated_minutes=rng.choice([30, 60, 90]),
+                )
+                for i in range(options['tasks'] // 10)
+            ]
+            Task.objects.bulk_create(open_tasks + done_tasks, batch_size=1000)
+
+            started = time.perf_counter()
+            forecasts = DeadlineForecast(user, now=now).all()
+            batch_seconds = time.perf_counter() - started
+
+            sample = rng.sample(open_tasks, min(options['sample'], len(open_tasks)))
+            started = time.perf_counter()
+            single = {task.id: DeadlineForecast(user, now=now).for_task(task) for task in sample}
+            single_seconds = time.perf_counter() - started
+
+            mismatched = [task_id for task_id, forecast in single.items() if forecasts[task_id] != forecast]
+            transaction.set_rollback(True)
+
+        if mismatched:
+            raise CommandError(f'Batch and per-task forecasts differ for {len(mismatched)} tasks.')
+
+        per_task = single_seconds / len(sample)
+        risk = sum(1 for forecast in forecasts.values() if forecast['status'] == 'risk')
+        self.stdout.write(f'open tasks: {len(open_tasks)}, at risk: {risk}')
+        self.stdout.write(f'batch engine: {batch_seconds * 1000:.1f} ms for all tasks')
+        self.stdout.write(
+            f'per-task queries: {per_task * 1000:.2f} ms per task, '
+            f'~{per_task * len(open_tasks) * 1000:.0f} ms extrapolated to all tasks'
+        )
@@ -0,0 +1,90 @@
+﻿import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from planner import reminders, rollup
+from planner.models import Reminder, Task
+
+
+class CountingBackend(BaseEmailBackend):
+    """Email backend that only counts deliveries per recipient reminder."""
+
+    def __init__(self, counter, lock, **kwargs):
+        super().__init__(**kwargs)
+        self.counter = counter
+        self.lock = lock
+
+    def send_messages(self, email_messages):
+        with self.lock:
+            for message in email_messages:
+                self.counter[message.extra_headers['X-Reminder-Id']] += 1
+        return len(email_messages)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark reminder dispatch with several concurrent workers (seeded data is deleted afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reminders', type=int, default=100000, help='Due reminders to seed')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent dispatch workers')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in ('', ':memory:'):
+            raise CommandError('Concurrent workers need a file or server database.')
+        user = get_user_model().objects.create_user(
+            username=f'bench_reminders_{time.time_ns()}', email='bench@studyplanner.local',
+        )
+        try:
+            self._run(user, options)
+        finally:
+            with rollup.deferred():
+                user.delete()
+
+    def _run(self, user, options):
+        now = timezone.now()
+        tasks = Task.objects.bulk_create([Task(owner=user, title=f'Task {i}') for i in range(100)])
+        Reminder.objects.bulk_create([
+            Reminder(owner=user, task=tasks[i % len(tasks)], remind_at=now - timedelta(seconds=i))
+            for i in range(options['reminders'])
+        ], batch_size=1000)
+
+        counter, lock = Counter(), threading.Lock()
+        queryset = reminders.due(now).filter(owner=user)
+        errors = []
+
+        def worker():
+            backend = CountingBackend(counter, lock)
+            try:
+                while True:
+                    try:
+                        if not reminders.deliver(queryset, options['batch_size'], backend):
+                            break
+                    except OperationalError as exc:
+                        errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['workers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+
+        duplicates = sum(1 for count in counter.values() if count > 1)
+        left = queryset.count()
+        self.stdout.write(
+            f'{sum(counter.values())} reminders sent by {options["workers"]} workers in {seconds:.2f} s '
+            f'({sum(counter.values()) / seconds:.0f}/s), lock retries: {len(errors)}'
+        )
+        if duplicates or left:
+            raise CommandError(f'{duplicates} reminders delivered more than once, {left} left unsent.')
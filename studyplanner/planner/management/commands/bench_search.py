@@ -0,0 +1,56 @@
+﻿import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from planner import search
+from planner.models import Task
+
+WORDS = [
+    'алгебра', 'геометрия', 'история', 'реферат', 'конспект', 'лекция', 'семинар', 'контрольная', 'проект',
+    'глава', 'задачи', 'повторить', 'english', 'essay', 'physics', 'lab', 'report', 'exam', 'чтение', 'тест',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark indexed full-text task search against icontains scans (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=50000, help='Tasks to seed')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        queries = ['алг', 'essay', 'лекция семинар', 'тема421', 'нетакогослова']
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(username=f'bench_search_{time.time_ns()}')
+            Task.objects.bulk_create([
+                Task(
+                    owner=user,
+                    title=' '.join(rng.sample(WORDS, 3)),
+                    description=' '.join(rng.choices(WORDS, k=12) + [f'тема{rng.randrange(1000)}']),
+                )
+                for _ in range(options['tasks'])
+            ], batch_size=1000)
+            tasks = Task.objects.filter(owner=user)
+
+            for query in queries:
+                icontains = tasks.filter(Q(title__icontains=query) | Q(description__icontains=query))
+                indexed = search.filter_queryset(tasks, query)
+                scan_ms = self._time(lambda: (list(icontains[:10]), icontains.count()), options['repeat'])
+                index_ms = self._time(lambda: (list(indexed[:10]), indexed.count()), options['repeat'])
+                self.stdout.write(
+                    f'{query!r}: icontains {scan_ms:.2f} ms ({icontains.count()} rows), '
+                    f'indexed {index_ms:.2f} ms ({indexed.count()} rows)'
+                )
+            transaction.set_rollback(True)
+
+    def _time(self, func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) * 1000 / repeat
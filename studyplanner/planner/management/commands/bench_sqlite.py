@@ -0,0 +1,170 @@
+﻿import json
+import random
+import threading
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.db.models import Count
+from django.test import override_settings
+from django.utils import timezone
+
+from planner import sqlite, stamps
+from planner.management.commands.load_test import percentile
+from planner.models import OPEN_STATUSES, Reminder, Task
+
+MODES = ('default', 'tuned')
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent writers (task status toggles, new reminders) and readers (task list, status counts, '
+        'reminders) against SQLite, first with Django defaults and plain saves, then with planner.sqlite '
+        '(SQLITE_WAL, BEGIN IMMEDIATE in sqlite.write()): write throughput, lock errors and read '
+        'latency. Writes go to the configured database and are undone afterwards; prefer a throwaway copy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per mode')
+        parser.add_argument('--users', type=int, default=20, help='Seeded users whose data is read and written')
+        parser.add_argument('--username-prefix', default='synthetic', help='Users created by generate_data')
+        parser.add_argument('--modes', default=','.join(MODES), help=f'Comma-separated; choose from {", ".join(MODES)}')
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_sqlite needs a SQLite database.')
+        modes = [name.strip() for name in options['modes'].split(',') if name.strip()]
+        unknown = [name for name in modes if name not in MODES]
+        if unknown:
+            raise CommandError(f'Unknown mode: {", ".join(unknown)}.')
+        owners = list(
+            get_user_model().objects.filter(username__startswith=options['username_prefix'])
+            .order_by('username').values_list('pk', flat=True)[:options['users']]
+        )
+        task_ids = {
+            owner: list(Task.objects.filter(owner_id=owner, status=Task.Status.TODO).values_list('pk', flat=True)[:100])
+            for owner in owners
+        }
+        owners = [owner for owner in owners if task_ids[owner]]
+        if not owners:
+            raise CommandError('No users with open tasks; create some with generate_data first.')
+
+        self.stdout.write(
+            f'{options["writers"]} writers, {options["readers"]} readers, {len(owners)} users, '
+            f'{options["duration"]:g}s per mode'
+        )
+        results, created = {}, []
+        try:
+            for mode in modes:
+                results[mode] = self.run(mode == 'tuned', owners, task_ids, created, options)
+        finally:
+            self.clean_up(owners, task_ids, created)
+
+        self.stdout.write(
+            f'\n{"mode":<9}{"writes/s":>9}{"p50 ms":>8}{"p95 ms":>8}{"locked":>8}'
+            f'{"reads/s":>9}{"p50 ms":>8}{"p95 ms":>8}{"p99 ms":>8}{"locked":>8}'
+        )
+        for mode, result in results.items():
+            writes, reads = result['writes'], result['reads']
+            self.stdout.write(
+                f'{mode:<9}{writes["per_second"]:>9}{writes["p50_ms"]:>8}{writes["p95_ms"]:>8}{writes["locked"]:>8}'
+                f'{reads["per_second"]:>9}{reads["p50_ms"]:>8}{reads["p95_ms"]:>8}{reads["p99_ms"]:>8}{reads["locked"]:>8}'
+            )
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2), encoding='utf-8')
+
+    def run(self, tuned, owners, task_ids, created, options):
+        connections.close_all()
+        with override_settings(SQLITE_TUNING=tuned, SQLITE_WAL=tuned):
+            if not tuned:
+                # The journal mode is stored in the file: undo WAL left by an earlier run.
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode = DELETE')
+            connections.close_all()
+            write = sqlite.write if tuned else nullcontext
+            timings = {'writes': [], 'reads': []}
+            locked = {'writes': 0, 'reads': 0}
+            lock = threading.Lock()
+            deadline = time.perf_counter() + options['duration']
+
+            def timed(kind, operation, seed):
+                rng = random.Random(seed)
+                try:
+                    while time.perf_counter() < deadline:
+                        owner = rng.choice(owners)
+                        started = time.perf_counter()
+                        try:
+                            operation(rng, owner)
+                        except OperationalError as exc:
+                            if not sqlite.is_locked(exc):
+                                raise
+                            with lock:
+                                locked[kind] += 1
+                            continue
+                        elapsed = (time.perf_counter() - started) * 1000
+                        with lock:
+                            timings[kind].append(elapsed)
+                finally:
+                    connection.close()
+
+            def write_once(rng, owner):
+                if rng.random() < 0.5:
+                    task = Task.objects.get(pk=rng.choice(task_ids[owner]))
+                    task.status = Task.Status.DOING if task.status == Task.Status.TODO else Task.Status.TODO
+                    with write():
+                        task.save()
+                else:
+                    remind_at = timezone.now() + timedelta(days=rng.randint(1, 30))
+                    with write():
+                        reminder = Reminder.objects.create(owner_id=owner, task_id=rng.choice(task_ids[owner]), remind_at=remind_at)
+                    created.append(reminder.pk)
+
+            def read_once(rng, owner):
+                list(Task.objects.filter(owner_id=owner, status__in=OPEN_STATUSES).order_by('deadline', 'id')[:20])
+                list(Task.objects.filter(owner_id=owner).order_by().values('status').annotate(count=Count('id')))
+                list(Reminder.objects.filter(owner_id=owner, is_sent=False).order_by('remind_at')[:10])
+
+            threads = [
+                threading.Thread(target=timed, args=('writes', write_once, number)) for number in range(options['writers'])
+            ] + [
+                threading.Thread(target=timed, args=('reads', read_once, 1000 + number)) for number in range(options['readers'])
+            ]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            seconds = time.perf_counter() - started
+        connections.close_all()
+
+        result = {}
+        for kind, values in timings.items():
+            values.sort()
+            result[kind] = {
+                'count': len(values),
+                'per_second': round(len(values) / seconds, 1),
+                'p50_ms': round(percentile(values, 0.50), 1),
+                'p95_ms': round(percentile(values, 0.95), 1),
+                'p99_ms': round(percentile(values, 0.99), 1),
+                'locked': locked[kind],
+            }
+        return result
+
+    def clean_up(self, owners, task_ids, created):
+        Reminder.objects.filter(pk__in=created).delete()
+        # TODO and DOING both count as open, so the daily rollups are unaffected; only the stamps move.
+        Task.objects.filter(pk__in=[pk for ids in task_ids.values() for pk in ids]).update(status=Task.Status.TODO)
+        for owner in owners:
+            stamps.touch(owner)
+        if not getattr(settings, 'SQLITE_WAL', False):
+            # The journal mode is stored in the file: undo WAL left by the tuned run.
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode = DELETE')
@@ -0,0 +1,162 @@
+﻿import itertools
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.conf import settings
+from django.core.cache import caches
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from planner import stamps, synthetic
+from planner.models import Course, Task
+
+BENCH_CACHE = 'bench_views'
+# Maximum queries per page, independent of how much data the user has.
+QUERY_BUDGETS = {
+    'dashboard': 10,
+    'task_list': 7,
+    'task_detail': 8,
+    'calendar_week': 4,
+    'stats': 6,
+    'reminders': 4,
+}
+TASK_LIST_FILTERS = {
+    'status': ('', Task.Status.TODO, Task.Status.DOING, Task.Status.DONE),
+    'deadline': ('', 'today', 'week', 'overdue'),
+    'q': ('', 'Реферат'),
+    'course': ('', '{course}'),
+}
+
+
+def task_list_pages(course_id):
+    """(label, url) for every filter combination; labels do not depend on ids so runs can be compared."""
+    names = list(TASK_LIST_FILTERS)
+    path = reverse('task_list')
+    for values in itertools.product(*TASK_LIST_FILTERS.values()):
+        chosen = [(name, value) for name, value in zip(names, values) if value]
+        params = {name: value.format(course=course_id) for name, value in chosen}
+        label = '&'.join(f'{name}={value}' for name, value in chosen)
+        yield label, f'{path}?{urlencode(params)}' if params else path
+
+
+class Command(BaseCommand):
+    help = 'Time the main planner pages at several data sizes, check query budgets and compare with a baseline (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='100,10000,100000', help='Comma-separated tasks per user')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per page')
+        parser.add_argument('--reminders-per-task', type=int, default=1, help='Reminders seeded for each open task with a deadline')
+        parser.add_argument('--warm', action='store_true', help='Keep the per-user page cache between requests')
+        parser.add_argument('--output', default='bench_views.json', help='Where to write the JSON results')
+        parser.add_argument('--baseline', help='Earlier results to compare against')
+        parser.add_argument('--tolerance', type=float, default=1.3, help='Allowed slowdown of the median against the baseline')
+        parser.add_argument('--min-delta-ms', type=float, default=5.0, help='Ignore slowdowns smaller than this (timer noise)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        scales = [int(value) for value in options['scales'].split(',') if value.strip()]
+        results = {}
+        # A private page cache: rolled-back users reuse ids and stamp versions, so entries must not outlive a scale.
+        bench_caches = {**settings.CACHES, BENCH_CACHE: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': BENCH_CACHE}}
+        with override_settings(ALLOWED_HOSTS=['testserver'], CACHES=bench_caches, PLANNER_CACHE=BENCH_CACHE):
+            for scale in scales:
+                caches[BENCH_CACHE].clear()
+                results.update(self.run_scale(scale, options))
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'warm_cache': options['warm'],
+            'results': results,
+        }
+        Path(options['output']).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(f'Results written to {options["output"]}.')
+
+        problems = [
+            f'{key}: {result["queries"]} queries, budget {result["budget"]}'
+            for key, result in results.items() if result['queries'] > result['budget']
+        ]
+        problems += [f'{key}: HTTP {result["status"]}' for key, result in results.items() if result['status'] != 200]
+        if options['baseline']:
+            problems += self.compare(results, options['baseline'], options['tolerance'], options['min_delta_ms'])
+        if problems:
+            raise CommandError('\n'.join(['Benchmark failed:'] + problems))
+        self.stdout.write(self.style.SUCCESS('All pages within budget.'))
+
+    def run_scale(self, scale, options):
+        results = {}
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(username=f'bench_views_{time.time_ns()}')
+            started = time.perf_counter()
+            synthetic.seed_user(user, scale, reminders_per_task=options['reminders_per_task'], seed=options['seed'])
+            self.stdout.write(f'{scale} tasks seeded in {time.perf_counter() - started:.1f}s')
+
+            client = Client()
+            client.force_login(user)
+            task = Task.objects.filter(owner=user).exclude(deadline=None).exclude(status=Task.Status.DONE).first()
+            course = Course.objects.filter(owner=user).first()
+            pages = [
+                ('dashboard', '', reverse('dashboard')),
+                *(('task_list', label, url) for label, url in task_list_pages(course.pk)),
+                ('task_detail', '', reverse('task_detail', args=[task.pk])),
+                ('calendar_week', '', reverse('calendar_week')),
+                ('stats', '', reverse('stats')),
+                ('reminders', '', reverse('reminder_list')),
+            ]
+            for view, label, url in pages:
+                result = self.measure(client, user, url, options)
+                result.update(scale=scale, view=view, filters=label, budget=QUERY_BUDGETS[view])
+                key = f'{scale}:{view}:{label}' if label else f'{scale}:{view}'
+                results[key] = result
+                self.stdout.write(
+                    f'{key:<50} {result["median_ms"]:>9.1f} ms median {result["p95_ms"]:>9.1f} ms p95 '
+                    f'{result["queries"]:>3} queries'
+                )
+            transaction.set_rollback(True)
+        return results
+
+    def measure(self, client, user, url, options):
+        timings, queries, status = [], 0, None
+        for _ in range(options['repeat']):
+            if not options['warm']:
+                # A new stamp version makes every cached page context miss.
+                stamps.touch(user.pk)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, len(captured.captured_queries))
+            status = response.status_code
+        timings.sort()
+        return {
+            'status': status,
+            'queries': queries,
+            'median_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+            'max_ms': round(timings[-1], 2),
+        }
+
+    def compare(self, results, baseline_path, tolerance, min_delta_ms):
+        baseline = json.loads(Path(baseline_path).read_text(encoding='utf-8'))['results']
+        problems = []
+        for key, result in results.items():
+            before = baseline.get(key)
+            if before is None:
+                continue
+            if result['queries'] > before['queries']:
+                problems.append(f'{key}: {before["queries"]} -> {result["queries"]} queries')
+            slower = result['median_ms'] - before['median_ms']
+            if result['median_ms'] > before['median_ms'] * tolerance and slower > min_delta_ms:
+                problems.append(f'{key}: median {before["median_ms"]} -> {result["median_ms"]} ms')
+        for key in sorted(set(baseline) - set(results)):
+            self.stdout.write(f'{key} is in the baseline but was not measured.')
+        return problems
@@ -0,0 +1,102 @@
+﻿import re
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+
+from planner import rollup
+from planner.models import Task
+from planner.pagination import KeysetPaginator, encode_cursor
+from planner.views import CalendarWeekView, DashboardView, ReminderListView, TaskListView
+
+DASHBOARD_INDEXES = ('task_owner_status_dl_idx', 'task_owner_deadline_idx')
+# Correlated subquery for the nearest upcoming reminder of each listed task.
+NEAREST_REMINDER_INDEX = 'reminder_task_remind_idx'
+
+
+def view_for(view_class, user, params=None):
+    request = RequestFactory().get('/', params or {})
+    request.user = user
+    view = view_class()
+    view.setup(request)
+    return view
+
+
+def view_queries(user):
+    """(name, expected indexes, queryset) for the querysets the views themselves build and run.
+
+    Each entry of the expected indexes must show up in the plan; a tuple entry means any one of them.
+    No plan may scan a whole table.
+    """
+    now = timezone.now()
+    today = timezone.localdate()
+    dashboard = view_for(DashboardView, user).dashboard_querysets(now, today)
+    calendar = view_for(CalendarWeekView, user)
+
+    def task_list(**params):
+        return view_for(TaskListView, user, params).get_queryset()
+
+    def first_page(queryset, cursor=None):
+        return KeysetPaginator(queryset, TaskListView.paginate_by).window(cursor)[1]
+
+    return [
+        # Overdue has no lower bound, so the counts read the owner's open tasks whatever index is picked.
+        ('dashboard.counts', (), dashboard['counts']),
+        ('dashboard.tasks_today', (DASHBOARD_INDEXES,), dashboard['tasks_today']),
+        ('dashboard.tasks_overdue', (DASHBOARD_INDEXES,), dashboard['tasks_overdue']),
+        ('dashboard.tasks_next_7', (DASHBOARD_INDEXES,), dashboard['tasks_next_7']),
+        ('stats.daily', ('sqlite_autoindex_planner_dailystat_1',), rollup.daily_rows(user, today - timedelta(days=13), today)),
+        ('stats.streak', ('sqlite_autoindex_planner_dailystat_1',), rollup.active_days(user, today)),
+        ('task_list.all', ('task_owner_created_idx', NEAREST_REMINDER_INDEX), first_page(task_list())),
+        ('task_list.cursor', ('task_owner_created_idx (owner_id=? AND created_at<?)', NEAREST_REMINDER_INDEX),
+         first_page(task_list(), encode_cursor(Task(id=1, created_at=now), 'next'))),
+        ('task_list.overdue', ('task_owner_deadline_idx', NEAREST_REMINDER_INDEX), task_list(deadline='overdue')),
+        ('reminder_list', ('reminder_owner_remind_idx',), view_for(ReminderListView, user).get_queryset()),
+        ('calendar_week', (('event_owner_series_end_idx', 'event_owner_start_idx'),),
+         calendar.range_events(*calendar.visible_range())),
+    ]
+
+
+def missing_indexes(plan, expected):
+    """The expected entries (index name or tuple of alternatives) that the plan does not use."""
+    missing = ['no full scan'] if re.search(r'\bSCAN planner_', plan) else []
+    for alternatives in expected:
+        if isinstance(alternatives, str):
+            alternatives = (alternatives,)
+        if not any(re.search(rf'INDEX {re.escape(index_name)}(\s|$)', plan) for index_name in alternatives):
+            missing.append(' or '.join(alternatives))
+    return missing
+
+
+class Command(BaseCommand):
+    help = 'Check that the querysets the planner views build use their composite indexes (SQLite EXPLAIN QUERY PLAN)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner-id', type=int, default=1, help='Owner id to build the queries for')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan for every query')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Query plan checks are only defined for SQLite.')
+        user = get_user_model().objects.filter(pk=options['owner_id']).first()
+        if user is None:
+            raise CommandError(f'No user with id {options["owner_id"]}.')
+
+        failures = []
+        for name, expected, queryset in view_queries(user):
+            plan = queryset.explain()
+            if options['verbose_plans']:
+                self.stdout.write(f'{name}:\n{plan}')
+            missing = missing_indexes(plan, expected)
+            if not missing:
+                self.stdout.write(f'{name}: ok')
+            else:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: expected {", ".join(missing)}, got\n{plan}'))
+
+        if failures:
+            raise CommandError(f'{len(failures)} queries do not use their index: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('All view queries use their indexes.'))
@@ -0,0 +1,81 @@
+﻿import time
+from contextlib import ExitStack
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from planner import search, synthetic
+from planner.models import Course, Reminder, StudyEvent, Task
+
+COMMIT_TASKS = 100000
+
+
+class Command(BaseCommand):
+    help = 'Generate deterministic synthetic users with courses, tasks, reminders and events for capacity testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1)
+        parser.add_argument('--courses-per-user', type=int, default=8)
+        parser.add_argument('--tasks-per-user', type=int, default=1000)
+        parser.add_argument('--reminders-per-task', type=int, default=1, help='For open tasks with a deadline')
+        parser.add_argument('--events-per-user', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1, help='Same seed and usernames give the same data')
+        parser.add_argument('--username-prefix', default='synthetic', help='Users are named PREFIX00001, PREFIX00002...')
+        parser.add_argument('--password', default='synthetic_pass12345', help='Password of every generated user')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT/COPY batch')
+        parser.add_argument('--sqlite-cache-mb', type=int, default=256, help='SQLite page cache for this run (indexes of big tables)')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        prefix = options['username_prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f'Users named {prefix}* already exist; delete them or pick another --username-prefix.')
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA cache_size = -{options["sqlite_cache_mb"] * 1024}')
+
+        # Hash once: a password hash per user would dominate runs with many small users.
+        password = make_password(options['password'])
+        totals = dict.fromkeys((Course, Task, Reminder, StudyEvent), 0)
+        report_every = max(options['batch_size'], 100000)
+        progress = {'tasks': 0, 'reported': 0}
+        started = time.perf_counter()
+
+        def on_batch(model, count):
+            totals[model] += count
+            if model is Task and options['verbosity'] >= 2:
+                progress['tasks'] += count
+                if progress['tasks'] - progress['reported'] >= report_every:
+                    progress['reported'] = progress['tasks']
+                    self.stdout.write(f'  {progress["tasks"]} tasks, {progress["tasks"] / (time.perf_counter() - started):.0f}/s')
+
+        # Users are committed in groups of about COMMIT_TASKS tasks: one commit and one search index pass per group.
+        per_commit = max(1, COMMIT_TASKS // max(options['tasks_per_user'], 1))
+        for first in range(1, options['users'] + 1, per_commit):
+            last = min(first + per_commit - 1, options['users'])
+            with ExitStack() as stack:
+                stack.enter_context(transaction.atomic())
+                for model in (Course, Task, StudyEvent):
+                    stack.enter_context(search.bulk_load(model))
+                for number in range(first, last + 1):
+                    user = User.objects.create(username=f'{prefix}{number:05d}', password=password)
+                    synthetic.seed_user(
+                        user,
+                        options['tasks_per_user'],
+                        course_count=options['courses_per_user'],
+                        reminders_per_task=options['reminders_per_task'],
+                        event_count=options['events_per_user'],
+                        seed=options['seed'],
+                        batch_size=options['batch_size'],
+                        progress=on_batch,
+                    )
+            self.stdout.write(f'{last}/{options["users"]} users, {totals[Task]} tasks')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {options["users"]} users, {totals[Course]} courses, {totals[Task]} tasks, '
+            f'{totals[Reminder]} reminders and {totals[StudyEvent]} events in {elapsed:.1f}s '
+            f'({totals[Task] / elapsed:.0f} tasks/s).'
+        ))
@@ -0,0 +1,44 @@
+﻿import sys
+
+from django import forms
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from planner.importer import TaskImporter, open_text, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import tasks for a user from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import; "-" reads standard input')
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default=None,
+                            help='Defaults to csv for .csv files and jsonl otherwise')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--create-courses', action='store_true', help='Create courses that do not exist yet')
+        parser.add_argument('--strict', action='store_true', help='Import nothing if any row is invalid')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['username']} not found.")
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        importer = TaskImporter(
+            user, batch_size=options['batch_size'], create_courses=options['create_courses'], strict=options['strict'],
+        )
+        with (open_text(sys.stdin.buffer) if path == '-' else open(path, encoding='utf-8-sig', newline='')) as stream:
+            try:
+                report = importer.run(read_rows(stream, fmt))
+            except forms.ValidationError as exc:
+                raise CommandError(f'{" ".join(exc.messages)} Nothing was imported.')
+
+        for line, message in report.errors:
+            self.stderr.write(f'line {line}: {message}')
+        if report.failed > len(report.errors):
+            self.stderr.write(f'... and {report.failed - len(report.errors)} more errors')
+        if report.rolled_back:
+            raise CommandError(f'{report.failed} invalid rows; nothing was imported.')
+        self.stdout.write(self.style.SUCCESS(f'Imported {report.created} tasks, skipped {report.failed} rows.'))
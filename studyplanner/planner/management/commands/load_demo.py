@@ -1,6 +1,7 @@
 ﻿from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from planner import recurrence, rollup
 from planner.models import Course, Task, StudyEvent
 
 
@@ -24,7 +25,8 @@ class Command(BaseCommand):
         if not user:
             user = User.objects.create_user(username='demo_user', password='demo_pass12345')
 
-        Task.objects.filter(owner=user).delete()
+        with rollup.deferred():
+            Task.objects.filter(owner=user).delete()
         StudyEvent.objects.filter(owner=user).delete()
         Course.objects.filter(owner=user).delete()
 
@@ -47,10 +49,13 @@ class Command(BaseCommand):
         Task.objects.bulk_create(tasks)
 
         events = [
-            StudyEvent(owner=user, title='Лекция по математике', start_at=now + timezone.timedelta(days=1, hours=2), end_at=now + timezone.timedelta(days=1, hours=3), location='Аудитория 101'),
+            StudyEvent(owner=user, title='Лекция по математике', start_at=now + timezone.timedelta(days=1, hours=2), end_at=now + timezone.timedelta(days=1, hours=3), location='Аудитория 101', repeat=StudyEvent.Repeat.WEEKLY, repeat_count=12),
             StudyEvent(owner=user, title='Семинар по истории', start_at=now + timezone.timedelta(days=3, hours=1), end_at=now + timezone.timedelta(days=3, hours=2), location='Аудитория 202'),
             StudyEvent(owner=user, title='Самостоятельная работа', start_at=now + timezone.timedelta(days=5, hours=4), end_at=now + timezone.timedelta(days=5, hours=6), location='Библиотека'),
         ]
+        for event in events:
+            event.series_end_at = recurrence.series_end(event)
         StudyEvent.objects.bulk_create(events)
+        rollup.rebuild(owner_ids=[user.id])
 
         self.stdout.write(self.style.SUCCESS(f'Demo data created for {user.username}.'))
\ No newline at end of file
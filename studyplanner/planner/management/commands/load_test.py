@@ -0,0 +1,272 @@
+﻿import io
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connection, connections
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_SECRET_LENGTH
+from django.test import override_settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from planner import caching
+from planner.models import Task
+
+HOST = 'loadtest.local'
+# name: (method, URL name, query string parameters)
+ROUTES = {
+    'dashboard': ('GET', 'dashboard', None),
+    'tasks': ('GET', 'task_list', None),
+    'tasks_filtered': ('GET', 'task_list', {'status': 'TODO', 'deadline': 'week'}),
+    'task_detail': ('GET', 'task_detail', None),
+    'calendar': ('GET', 'calendar_week', None),
+    'stats': ('GET', 'stats', None),
+    'reminders': ('GET', 'reminder_list', None),
+    'search': ('GET', 'search', {'q': 'Реферат'}),
+    'task_status': ('POST', 'task_status', None),
+    'task_create': ('POST', 'task_add', None),
+}
+# URL names whose path takes the id of one of the user's tasks.
+TASK_URLS = ('task_detail', 'task_status')
+DEFAULT_MIX = 'dashboard=30,tasks=20,tasks_filtered=10,task_detail=15,calendar=10,stats=8,task_status=5,task_create=2'
+
+_local = threading.local()
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in ROUTES:
+            raise CommandError(f'Unknown route "{name}"; choose from {", ".join(ROUTES)}.')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(ordered, fraction):
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)] if ordered else 0.0
+
+
+def error_kind(exc):
+    message = str(exc).lower()
+    if isinstance(exc, OperationalError) and 'locked' in message:
+        return 'database locked'
+    if 'timeout' in message or 'timed out' in message:
+        return 'timeout'
+    return type(exc).__name__
+
+
+def remember_exception(sender, **kwargs):
+    # Sent from inside the handler's except block, so the exception is still current.
+    _local.exception = sys.exc_info()[1]
+
+
+def wsgi_environ(method, path, user, data=None):
+    """A WSGI environ for a request from a VirtualUser, as a server would pass it."""
+    path_info, _, query = path.partition('?')
+    body = urlencode(data or {}).encode()
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': query,
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': HOST,
+        'HTTP_COOKIE': user.cookie,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    if method == 'POST':
+        environ['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+        environ['HTTP_X_CSRFTOKEN'] = user.csrf
+    return environ
+
+
+class VirtualUser:
+    """A seeded user with a live session, a CSRF token and a few of their task ids."""
+
+    def __init__(self, user, task_ids):
+        engine = import_module(settings.SESSION_ENGINE)
+        self.session = engine.SessionStore()
+        self.session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        self.session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        self.session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        self.session.save()
+        self.csrf = get_random_string(CSRF_SECRET_LENGTH, allowed_chars=CSRF_ALLOWED_CHARS)
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={self.session.session_key}; {settings.CSRF_COOKIE_NAME}={self.csrf}'
+        self.task_ids = task_ids
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive studyplanner.wsgi.application in-process from a thread pool with seeded logged-in users and report '
+        'throughput, latency percentiles per route and database lock/timeout errors. Write routes change data: '
+        'use a throwaway database (see generate_data).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+        parser.add_argument('--users', type=int, default=50, help='Seeded users to log in')
+        parser.add_argument('--username-prefix', default='synthetic', help='Users created by generate_data')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'route=weight list; routes: {", ".join(ROUTES)}')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        from studyplanner.wsgi import application
+
+        mix = parse_mix(options['mix'])
+        users = list(get_user_model().objects.filter(username__startswith=options['username_prefix'])
+                     .order_by('username')[:options['users']])
+        if not users:
+            raise CommandError(f'No users named {options["username_prefix"]}*; create them with generate_data first.')
+        if settings.DEBUG:
+            self.stderr.write('DEBUG is on: queries are logged and error pages are slow; DEBUG=False gives realistic numbers.')
+
+        virtual_users = [VirtualUser(user, self.sample_tasks(user)) for user in users]
+        virtual_users = [user for user in virtual_users if user.task_ids]
+        if not virtual_users:
+            raise CommandError('The seeded users have no open tasks.')
+        self.stdout.write(
+            f'{len(virtual_users)} users, {options["threads"]} threads, {options["duration"]:.0f}s on {connection.vendor} '
+            f'(CONN_MAX_AGE={connection.settings_dict["CONN_MAX_AGE"]})'
+        )
+
+        self.application = application
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = defaultdict(Counter)
+        self.lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+        names, weights = list(mix), list(mix.values())
+
+        def worker(index):
+            rng = random.Random(f'{options["seed"]}:{index}')
+            try:
+                while time.perf_counter() < deadline:
+                    self.request(rng.choices(names, weights)[0], rng.choice(virtual_users), rng)
+            finally:
+                connections.close_all()
+
+        got_request_exception.connect(remember_exception)
+        caching.reset_stats()
+        started = time.perf_counter()
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, HOST]):
+                with ThreadPoolExecutor(options['threads']) as pool:
+                    for future in [pool.submit(worker, index) for index in range(options['threads'])]:
+                        future.result()
+        finally:
+            got_request_exception.disconnect(remember_exception)
+            for user in virtual_users:
+                user.session.delete()
+        self.report(time.perf_counter() - started, options)
+
+    def sample_tasks(self, user, size=50):
+        tasks = Task.objects.filter(owner=user).exclude(status=Task.Status.DONE).order_by('-created_at')
+        return list(tasks.values_list('id', flat=True)[:size])
+
+    def request(self, route, user, rng):
+        method, url_name, params = ROUTES[route]
+        task_id = rng.choice(user.task_ids)
+        path = reverse(url_name, args=[task_id] if url_name in TASK_URLS else None)
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        data = None
+        if route == 'task_status':
+            data = {'status': rng.choice((Task.Status.TODO, Task.Status.DOING))}
+        elif route == 'task_create':
+            data = {'title': f'Нагрузка {rng.randrange(10 ** 6)}', 'priority': 3, 'estimated_minutes': 30, 'status': Task.Status.TODO}
+
+        status = []
+        _local.exception = None
+        started = time.perf_counter()
+        try:
+            result = self.application(wsgi_environ(method, path, user, data), lambda line, headers, exc_info=None: status.append(int(line[:3])))
+            try:
+                for _ in result:
+                    pass
+            finally:
+                result.close()
+        except Exception as exc:
+            _local.exception = exc
+        elapsed = (time.perf_counter() - started) * 1000
+
+        with self.lock:
+            self.latencies[route].append(elapsed)
+            self.statuses[route][status[0] if status else 'exception'] += 1
+            if _local.exception is not None:
+                self.errors[route][error_kind(_local.exception)] += 1
+            elif status and status[0] >= 400:
+                self.errors[route][f'HTTP {status[0]}'] += 1
+
+    def report(self, elapsed, options):
+        total = sum(len(values) for values in self.latencies.values())
+        results = {}
+        self.stdout.write(f'\n{"route":<16}{"requests":>9}{"req/s":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"max ms":>9}  errors')
+        for route in sorted(self.latencies, key=lambda name: -len(self.latencies[name])):
+            ordered = sorted(self.latencies[route])
+            results[route] = {
+                'requests': len(ordered),
+                'per_second': round(len(ordered) / elapsed, 1),
+                'p50_ms': round(percentile(ordered, 0.50), 1),
+                'p95_ms': round(percentile(ordered, 0.95), 1),
+                'p99_ms': round(percentile(ordered, 0.99), 1),
+                'max_ms': round(ordered[-1], 1),
+                'statuses': {str(key): value for key, value in self.statuses[route].items()},
+                'errors': dict(self.errors[route]),
+            }
+            row = results[route]
+            errors = ', '.join(f'{kind}: {count}' for kind, count in row['errors'].items()) or '-'
+            self.stdout.write(
+                f'{route:<16}{row["requests"]:>9}{row["per_second"]:>8}{row["p50_ms"]:>9}{row["p95_ms"]:>9}'
+                f'{row["p99_ms"]:>9}{row["max_ms"]:>9}  {errors}'
+            )
+        error_kinds = Counter()
+        for counts in self.errors.values():
+            error_kinds.update(counts)
+        self.stdout.write(f'\n{total} requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s')
+        if error_kinds:
+            self.stdout.write(self.style.WARNING(
+                'Errors: ' + ', '.join(f'{kind} {count}' for kind, count in error_kinds.most_common())
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('No errors.'))
+        cache_stats = caching.stats()
+        self.stdout.write(
+            f'Page cache: {cache_stats["hits"]} hits ({cache_stats["waits"]} after waiting for another request), '
+            f'{cache_stats["misses"]} misses, hit rate {cache_stats["hit_rate"]:.0%}'
+        )
+
+        if options['output']:
+            summary = {
+                'database': connection.vendor,
+                'threads': options['threads'],
+                'duration_s': round(elapsed, 1),
+                'requests': total,
+                'per_second': round(total / elapsed, 1),
+                'errors': dict(error_kinds),
+                'cache': cache_stats,
+                'routes': results,
+            }
+            Path(options['output']).write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding='utf-8')
@@ -0,0 +1,24 @@
+﻿from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from planner import rollup
+
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the per-user daily task rollup (DailyStat)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', type=str, default=None, help='Rebuild only this user')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        owner_ids = None
+        username = options.get('username')
+        if username:
+            user = get_user_model().objects.filter(username=username).first()
+            if not user:
+                raise CommandError(f'User {username} does not exist.')
+            owner_ids = [user.id]
+
+        rows = rollup.rebuild(owner_ids=owner_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Daily stats rebuilt: {rows} rows.'))
@@ -0,0 +1,37 @@
+﻿import asyncio
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from planner import reminders
+from planner.scheduler import ReminderScheduler
+
+
+class Command(BaseCommand):
+    help = 'Run the in-process reminder scheduler (timer heap instead of polling the reminder table)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', type=str, default=None,
+                            help='console, file, smtp, locmem, dummy or a dotted email backend path')
+        parser.add_argument('--horizon-hours', type=float, default=24.0, help='How far ahead reminders are loaded')
+        parser.add_argument('--capacity', type=int, default=10000, help='Most reminders held in memory at once')
+        parser.add_argument('--poll-seconds', type=float, default=2.0,
+                            help='How often change stamps are checked for reminders changed by other processes')
+        parser.add_argument('--resync-minutes', type=float, default=60.0,
+                            help='Reload the whole window now and then, as a safety net for missed changes')
+
+    def handle(self, *args, **options):
+        if options['poll_seconds'] <= 0 or options['resync_minutes'] <= 0:
+            raise CommandError('--poll-seconds and --resync-minutes must be positive.')
+        scheduler = ReminderScheduler(
+            backend=reminders.get_backend(options['backend']),
+            horizon=timedelta(hours=options['horizon_hours']),
+            capacity=options['capacity'],
+            resync=timedelta(minutes=options['resync_minutes']),
+            poll=timedelta(seconds=options['poll_seconds']),
+        )
+        try:
+            asyncio.run(scheduler.run())
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Reminders sent: {scheduler.sent}.'))
@@ -0,0 +1,34 @@
+﻿import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+
+from planner import reminders
+
+
+class Command(BaseCommand):
+    help = 'Send due reminders in batches; safe to run in several processes at once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Reminders claimed per transaction')
+        parser.add_argument('--backend', type=str, default=None,
+                            help='console, file, smtp, locmem, dummy or a dotted email backend path')
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when nothing is due')
+        parser.add_argument('--interval', type=float, default=10.0, help='Seconds to sleep between polls with --loop')
+
+    def handle(self, *args, **options):
+        backend = reminders.get_backend(options['backend'])
+        total = 0
+        while True:
+            try:
+                sent = reminders.send_due(batch_size=options['batch_size'], backend=backend)
+            except OperationalError as exc:
+                self.stderr.write(f'Batch skipped: {exc}')
+                sent = 0
+            total += sent
+            if sent:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Reminders sent: {total}.'))
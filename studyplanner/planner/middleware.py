@@ -0,0 +1,306 @@
+﻿"""Per-request instrumentation: SQL/timing numbers (REQUEST_TIMING=True) and on-demand staff profiling.
+
+Both middlewares run in the handler's mode, so under ASGI an async view stays on the event loop.
+"""
+import cProfile
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import caching, profiling
+
+logger = logging.getLogger(__name__)
+
+_recorder = ContextVar('planner_query_recorder', default=None)
+
+_PLACEHOLDER_LIST = re.compile(r'%s(?:, %s)+')
+_NUMBER = re.compile(r'\b\d+\b')
+
+
+def query_template(sql):
+    """SQL with IN lists and inlined numbers (LIMIT, OFFSET) collapsed, so repeats of one query compare equal."""
+    return _NUMBER.sub('?', _PLACEHOLDER_LIST.sub('%s, ...', sql))
+
+
+class QueryRecorder:
+    """Database execute wrapper counting queries, SQL time and how often each statement ran."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        # An async page can run its queries on several threads at once (planner.parallel).
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.duration += elapsed
+                self.count += 1
+                self.statements[sql] += 1
+
+    def repeated(self, threshold):
+        """Query templates run at least `threshold` times, most repeated first: likely N+1 loops."""
+        templates = Counter()
+        for sql, count in self.statements.items():
+            templates[query_template(sql)] += count
+        return [(sql, count) for sql, count in templates.most_common() if count >= threshold]
+
+
+def _record_query(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def _install_recorder(connection, **kwargs):
+    # First in line: connection.execute_wrapper() blocks pop the last wrapper on exit.
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+def watch_connections():
+    """Route the queries of every connection, in every thread, through the current request's recorder."""
+    connection_created.connect(_install_recorder, dispatch_uid='planner-query-recorder')
+    for connection in connections.all(initialized_only=True):
+        _install_recorder(connection)
+
+
+@contextmanager
+def recording(recorder):
+    """Send the queries of the current request to `recorder`.
+
+    A context variable rather than connection.execute_wrapper(): connections belong to threads, and an async
+    request runs its queries in sync_to_async and planner.parallel threads, which inherit the context.
+    """
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that also runs in async mode, so ASGI requests do not hop to a thread at the top of the chain.
+
+    Without autorefresh (DEBUG off) the file lookup is a dictionary read and stays on the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class RequestTimingMiddleware:
+    """Record query count, SQL time, view time, render time and page cache hits of each request.
+
+    The numbers go to a `Server-Timing` header and one log line per request; requests over the query or
+    time budget and statements repeated REQUEST_REPEATED_QUERY_THRESHOLD times are logged as warnings.
+    With REQUEST_TIMING off the middleware removes itself from the chain at startup.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_TIMING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.query_budget = getattr(settings, 'REQUEST_QUERY_BUDGET', 30)
+        self.time_budget_ms = getattr(settings, 'REQUEST_TIME_BUDGET_MS', 500)
+        self.repeat_threshold = getattr(settings, 'REQUEST_REPEATED_QUERY_THRESHOLD', 5)
+        watch_connections()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # An async handler runs plain hooks in a thread; coroutine hooks stay on the event loop.
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        marks = request._timing_marks = {'start': time.perf_counter()}
+        with recording(QueryRecorder()) as recorder, caching.counting() as cache_counts:
+            response = self.get_response(request)
+        marks['end'] = time.perf_counter()
+        self.report(request, response, recorder, cache_counts, marks)
+        return response
+
+    async def __acall__(self, request):
+        marks = request._timing_marks = {'start': time.perf_counter()}
+        with recording(QueryRecorder()) as recorder, caching.counting() as cache_counts:
+            response = await self.get_response(request)
+        marks['end'] = time.perf_counter()
+        self.report(request, response, recorder, cache_counts, marks)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.mark_view(request)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.mark_view(request)
+
+    def process_template_response(self, request, response):
+        return self.mark_render(request, response)
+
+    async def aprocess_template_response(self, request, response):
+        return self.mark_render(request, response)
+
+    def mark_view(self, request):
+        request._timing_marks['view'] = time.perf_counter()
+
+    def mark_render(self, request, response):
+        # Template responses render after the view returns; the callback marks the end of rendering.
+        marks = request._timing_marks
+        marks['view_end'] = time.perf_counter()
+        response.add_post_render_callback(lambda rendered: marks.__setitem__('render_end', time.perf_counter()))
+        return response
+
+    def report(self, request, response, recorder, cache_counts, marks):
+        total_ms = (marks['end'] - marks['start']) * 1000
+        view_start = marks.get('view', marks['start'])
+        view_ms = (marks.get('view_end', marks['end']) - view_start) * 1000
+        render_ms = (marks['render_end'] - marks['view_end']) * 1000 if 'render_end' in marks else 0.0
+        db_ms = recorder.duration * 1000
+
+        response.headers['Server-Timing'] = ', '.join((
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries"',
+            f'view;dur={view_ms:.1f}',
+            f'render;dur={render_ms:.1f}',
+            f'cache;desc="{cache_counts["hits"]} hits, {cache_counts["misses"]} misses"',
+            f'total;dur={total_ms:.1f}',
+        ))
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'cache_hits': cache_counts['hits'],
+            'cache_misses': cache_counts['misses'],
+            'db_ms': round(db_ms, 1),
+            'view_ms': round(view_ms, 1),
+            'render_ms': round(render_ms, 1),
+            'total_ms': round(total_ms, 1),
+        }
+        message = ' '.join(f'{key}={value}' for key, value in fields.items())
+        logger.info('request %s', message, extra={'timing': fields})
+
+        if recorder.count > self.query_budget or total_ms > self.time_budget_ms:
+            logger.warning(
+                'request over budget (%s queries, %s ms allowed) %s',
+                self.query_budget, self.time_budget_ms, message, extra={'timing': fields},
+            )
+        for sql, count in recorder.repeated(self.repeat_threshold):
+            logger.warning(
+                'possible N+1: query ran %s times in %s %s: %s',
+                count, request.method, request.path, sql[:300], extra={'timing': fields},
+            )
+
+
+class ProfilingMiddleware:
+    """Run a staff request under cProfile when asked with `?_profile=N` or an `X-Profile: N` header.
+
+    The page is replaced by a plain-text summary of the N most expensive calls (cumulative time); the full
+    stats are saved as a .prof file, listed under Request profiles in the admin, and only the newest
+    PROFILE_KEEP files are kept. Requests that do not ask for a profile pass straight through, and one
+    profile runs at a time: a second request asking while one is running is served unprofiled.
+
+    cProfile follows one thread. Under ASGI that is the event loop's: work done in sync_to_async threads
+    shows up as time spent awaiting it, and other requests served meanwhile are counted in.
+    """
+    sync_capable = True
+    async_capable = True
+    _running = threading.Lock()
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        watch_connections()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        limit = profiling.requested_limit(request)
+        if limit is None or not self._running.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            profiler, recorder, start = cProfile.Profile(), QueryRecorder(), time.perf_counter()
+            with recording(recorder):
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+            duration_ms = (time.perf_counter() - start) * 1000
+            return self.report(request, response, profiler, recorder, duration_ms, limit)
+        finally:
+            self._running.release()
+
+    async def __acall__(self, request):
+        limit = await profiling.arequested_limit(request)
+        if limit is None or not self._running.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            profiler, recorder, start = cProfile.Profile(), QueryRecorder(), time.perf_counter()
+            with recording(recorder):
+                profiler.enable()
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    profiler.disable()
+            duration_ms = (time.perf_counter() - start) * 1000
+            # Saving writes the .prof file and its admin row.
+            return await sync_to_async(self.report)(request, response, profiler, recorder, duration_ms, limit)
+        finally:
+            self._running.release()
+
+    def report(self, request, response, profiler, recorder, duration_ms, limit):
+        record = profiling.save(profiler, request, response.status_code, duration_ms, recorder.count, limit)
+        header = (
+            f'{request.method} {request.get_full_path()} -> {response.status_code}\n'
+            f'{duration_ms:.1f} ms, {recorder.count} SQL queries ({recorder.duration * 1000:.1f} ms)\n'
+            f'Saved as {record.file_name} (request profile #{record.pk} in the admin)\n\n'
+        )
+        profiled = HttpResponse(header + record.summary + '\n', content_type='text/plain; charset=utf-8')
+        profiled.headers['X-Profile-Id'] = str(record.pk)
+        profiled.headers['Cache-Control'] = 'no-store'
+        return profiled
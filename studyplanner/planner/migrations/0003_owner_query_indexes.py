@@ -0,0 +1,37 @@
+﻿from django.db import migrations, models
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0002_owner_required'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(fields=['owner', 'remind_at'], name='reminder_owner_remind_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studyevent',
+            index=models.Index(fields=['owner', 'start_at'], name='event_owner_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', 'status', 'deadline'], name='task_owner_status_dl_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', 'status', 'completed_at'], name='task_owner_status_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', 'deadline'], name='task_owner_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', 'created_at'], name='task_owner_created_idx'),
+        ),
+    ]
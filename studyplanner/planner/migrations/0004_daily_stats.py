@@ -0,0 +1,58 @@
+﻿from django.db import migrations, models
+import django.db.models.deletion
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill(apps, schema_editor):
+    Task = apps.get_model('planner', 'Task')
+    DailyStat = apps.get_model('planner', 'DailyStat')
+
+    totals = {}
+    created = Task.objects.annotate(day=TruncDate('created_at')).values('owner_id', 'day').annotate(count=Count('id'))
+    for row in created.order_by():
+        totals.setdefault((row['owner_id'], row['day']), [0, 0, 0])[2] = row['count']
+    done = Task.objects.filter(status='DONE', completed_at__isnull=False).annotate(
+        day=TruncDate('completed_at'),
+    ).values('owner_id', 'day').annotate(count=Count('id'), minutes=Sum('estimated_minutes'))
+    for row in done.order_by():
+        total = totals.setdefault((row['owner_id'], row['day']), [0, 0, 0])
+        total[0] = row['count']
+        total[1] = row['minutes'] or 0
+
+    DailyStat.objects.bulk_create([
+        DailyStat(owner_id=owner_id, day=day, done_count=done, done_minutes=minutes, created_count=created)
+        for (owner_id, day), (done, minutes, created) in totals.items()
+    ], batch_size=1000)
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0003_owner_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('done_count', models.IntegerField(default=0)),
+                ('done_minutes', models.IntegerField(default=0)),
+                ('created_count', models.IntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['day'],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'day'), name='uniq_dailystat_owner_day')],
+            },
+        ),
+        migrations.RunPython(backfill, noop),
+    ]
@@ -0,0 +1,64 @@
+﻿from django.db import migrations
+
+# Frozen copy of planner.search as of this migration: later changes to the search fields or to the
+# live models must not change what this step creates.
+SEARCH_FIELDS = {
+    'planner_task': ('title', 'description'),
+    'planner_course': ('name', 'teacher'),
+    'planner_studyevent': ('title', 'location', 'notes'),
+}
+
+
+def sqlite_statements(table, fields):
+    fts = f'{table}_fts'
+    columns = ', '.join(fields)
+    new_values = ', '.join(f'new.{field}' for field in fields)
+    old_values = ', '.join(f'old.{field}' for field in fields)
+    changed = ' OR '.join(f'old.{field} IS NOT new.{field}' for field in fields)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} WHEN {changed} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END',
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def install(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, fields in SEARCH_FIELDS.items():
+        if vendor == 'sqlite':
+            for statement in sqlite_statements(table, fields):
+                schema_editor.execute(statement)
+        elif vendor == 'postgresql':
+            tsvector = " || ' ' || ".join(f"coalesce({field}, '')" for field in fields)
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_search_idx ON {table} USING GIN (to_tsvector('simple', {tsvector}))"
+            )
+
+
+def uninstall(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table in SEARCH_FIELDS:
+        if vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{suffix}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+        elif vendor == 'postgresql':
+            schema_editor.execute(f'DROP INDEX IF EXISTS {table}_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0004_daily_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
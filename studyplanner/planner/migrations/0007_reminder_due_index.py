@@ -0,0 +1,17 @@
+﻿from django.db import migrations, models
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0006_reminder_task_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(fields=['is_sent', 'remind_at'], name='reminder_due_idx'),
+        ),
+    ]
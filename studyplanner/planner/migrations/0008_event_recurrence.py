@@ -0,0 +1,78 @@
+﻿from django.db import migrations, models
+from django.conf import settings
+from django.db.models.functions import Coalesce
+
+# Search triggers of planner_studyevent as created by 0005_search_index, then a reindex.
+STUDYEVENT_SEARCH_TRIGGERS = [
+    'CREATE TRIGGER IF NOT EXISTS planner_studyevent_fts_ai AFTER INSERT ON planner_studyevent BEGIN '
+    'INSERT INTO planner_studyevent_fts(rowid, title, location, notes) VALUES (new.id, new.title, new.location, new.notes); END',
+    'CREATE TRIGGER IF NOT EXISTS planner_studyevent_fts_ad AFTER DELETE ON planner_studyevent BEGIN '
+    'INSERT INTO planner_studyevent_fts(planner_studyevent_fts, rowid, title, location, notes) '
+    "VALUES ('delete', old.id, old.title, old.location, old.notes); END",
+    'CREATE TRIGGER IF NOT EXISTS planner_studyevent_fts_au AFTER UPDATE OF title, location, notes ON planner_studyevent '
+    'WHEN old.title IS NOT new.title OR old.location IS NOT new.location OR old.notes IS NOT new.notes BEGIN '
+    'INSERT INTO planner_studyevent_fts(planner_studyevent_fts, rowid, title, location, notes) '
+    "VALUES ('delete', old.id, old.title, old.location, old.notes); "
+    'INSERT INTO planner_studyevent_fts(rowid, title, location, notes) VALUES (new.id, new.title, new.location, new.notes); END',
+    "INSERT INTO planner_studyevent_fts(planner_studyevent_fts) VALUES ('rebuild')",
+]
+
+
+def backfill_series_end(apps, schema_editor):
+    # Every existing event is a one-off, so its series ends with the event itself.
+    StudyEvent = apps.get_model('planner', 'StudyEvent')
+    StudyEvent.objects.update(series_end_at=Coalesce('end_at', 'start_at'))
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in STUDYEVENT_SEARCH_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0007_reminder_due_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studyevent',
+            name='exception_dates',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='studyevent',
+            name='repeat',
+            field=models.CharField(choices=[('none', 'Does not repeat'), ('daily', 'Daily'), ('weekly', 'Weekly')], default='none', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='studyevent',
+            name='repeat_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='studyevent',
+            name='repeat_interval',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='studyevent',
+            name='repeat_until',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='studyevent',
+            name='series_end_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='studyevent',
+            index=models.Index(fields=['owner', 'series_end_at'], name='event_owner_series_end_idx'),
+        ),
+        migrations.RunPython(backfill_series_end, migrations.RunPython.noop),
+        # Adding the fields rebuilds the SQLite table, which drops its search triggers.
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+﻿from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0010_request_profiles'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='changestamp',
+            index=models.Index(fields=['changed_at'], name='changestamp_changed_idx'),
+        ),
+    ]
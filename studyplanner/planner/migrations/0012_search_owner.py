@@ -0,0 +1,53 @@
+﻿from django.db import migrations
+
+# Frozen copy of planner.search as of this migration. The FTS tables get an owner_id column so that a
+# search is restricted to one owner's rows inside the MATCH instead of after it.
+SEARCH_FIELDS = {
+    'planner_task': ('title', 'description'),
+    'planner_course': ('name', 'teacher'),
+    'planner_studyevent': ('title', 'location', 'notes'),
+}
+OWNER_COLUMN = 'owner_id'
+
+
+def sqlite_statements(table, fields):
+    fts = f'{table}_fts'
+    columns = ', '.join(fields)
+    new_values = ', '.join(f'new.{field}' for field in fields)
+    old_values = ', '.join(f'old.{field}' for field in fields)
+    changed = ' OR '.join(f'old.{field} IS NOT new.{field}' for field in fields)
+    return [
+        *(f'DROP TRIGGER IF EXISTS {fts}_{suffix}' for suffix in ('ai', 'ad', 'au')),
+        f'DROP TABLE IF EXISTS {fts}',
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({columns}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f'CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END',
+        f'CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        f'CREATE TRIGGER {fts}_au AFTER UPDATE OF {columns} ON {table} WHEN {changed} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END',
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def rebuild(with_owner):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for table, fields in SEARCH_FIELDS.items():
+            for statement in sqlite_statements(table, (*fields, OWNER_COLUMN) if with_owner else fields):
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0011_change_stamp_changed_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild(with_owner=True), rebuild(with_owner=False)),
+    ]
@@ -1,8 +1,16 @@
-﻿from django.db import models
+﻿import secrets
+
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.conf import settings
 
+from . import recurrence
+
+
+def new_feed_token():
+    return secrets.token_urlsafe(24)
+
 
 class Course(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='courses')
@@ -40,6 +48,12 @@ class Task(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['owner', 'status', 'deadline'], name='task_owner_status_dl_idx'),
+            models.Index(fields=['owner', 'status', 'completed_at'], name='task_owner_status_done_idx'),
+            models.Index(fields=['owner', 'deadline'], name='task_owner_deadline_idx'),
+            models.Index(fields=['owner', 'created_at'], name='task_owner_created_idx'),
+        ]
 
     def clean(self):
         super().clean()
@@ -48,17 +62,33 @@ class Task(models.Model):
         if self.deadline and self.created_at and self.deadline < self.created_at:
             raise ValidationError({'deadline': 'Deadline cannot be earlier than created_at.'})
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._rollup_state = instance.rollup_state()
+        return instance
+
+    def rollup_state(self):
+        if any(name not in self.__dict__ for name in ('status', 'created_at', 'completed_at', 'estimated_minutes')):
+            return None
+        completed_at = self.completed_at if self.status == self.Status.DONE else None
+        return self.created_at, completed_at, self.estimated_minutes
+
     def save(self, *args, **kwargs):
         if self.status == self.Status.DONE and self.completed_at is None:
             self.completed_at = timezone.now()
         if self.status != self.Status.DONE:
             self.completed_at = None
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         return self.title
 
 
+OPEN_STATUSES = [Task.Status.TODO, Task.Status.DOING]
+
+
 class Reminder(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reminders')
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='reminders')
@@ -68,27 +98,117 @@ class Reminder(models.Model):
 
     class Meta:
         ordering = ['remind_at']
+        indexes = [
+            models.Index(fields=['owner', 'remind_at'], name='reminder_owner_remind_idx'),
+            models.Index(fields=['task', 'remind_at'], name='reminder_task_remind_idx'),
+            models.Index(fields=['is_sent', 'remind_at'], name='reminder_due_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"Reminder for {self.task_id} at {self.remind_at}"
 
 
 class StudyEvent(models.Model):
+    class Repeat(models.TextChoices):
+        NONE = 'none', 'Does not repeat'
+        DAILY = 'daily', 'Daily'
+        WEEKLY = 'weekly', 'Weekly'
+
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='events')
     title = models.CharField(max_length=255)
     start_at = models.DateTimeField()
     end_at = models.DateTimeField(blank=True, null=True)
     location = models.CharField(max_length=255, blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
+    repeat = models.CharField(max_length=10, choices=Repeat.choices, default=Repeat.NONE)
+    repeat_interval = models.PositiveSmallIntegerField(default=1)
+    repeat_until = models.DateField(blank=True, null=True)
+    repeat_count = models.PositiveIntegerField(blank=True, null=True)
+    exception_dates = models.JSONField(default=list, blank=True)
+    series_end_at = models.DateTimeField(blank=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['start_at']
+        indexes = [
+            models.Index(fields=['owner', 'start_at'], name='event_owner_start_idx'),
+            models.Index(fields=['owner', 'series_end_at'], name='event_owner_series_end_idx'),
+        ]
 
     def clean(self):
         super().clean()
         if self.end_at and self.end_at < self.start_at:
             raise ValidationError({'end_at': 'End time must be after start time.'})
+        if self.repeat_interval is not None and self.repeat_interval < 1:
+            raise ValidationError({'repeat_interval': 'Interval must be at least 1.'})
+        if self.repeat_until and self.start_at and self.repeat_until < timezone.localtime(self.start_at).date():
+            raise ValidationError({'repeat_until': 'Repeat end cannot be earlier than the first occurrence.'})
+
+    def save(self, *args, **kwargs):
+        self.series_end_at = recurrence.series_end(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'series_end_at'}
+        super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         return self.title
+
+
+class DailyStat(models.Model):
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    done_count = models.IntegerField(default=0)
+    done_minutes = models.IntegerField(default=0)
+    created_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'day'], name='uniq_dailystat_owner_day')
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.owner_id} {self.day}: {self.done_count} done"
+
+
+class ChangeStamp(models.Model):
+    """Per-user version bumped on every change to the user's planner data (feeds, caches, ETags)."""
+    owner = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='change_stamp')
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # The reminder scheduler polls for stamps changed since its last look.
+        indexes = [models.Index(fields=['changed_at'], name='changestamp_changed_idx')]
+
+    def __str__(self) -> str:
+        return f"{self.owner_id} v{self.version}"
+
+
+class CalendarFeed(models.Model):
+    owner = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='calendar_feed')
+    token = models.CharField(max_length=64, unique=True, default=new_feed_token)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"Calendar feed of {self.owner_id}"
+
+
+class RequestProfile(models.Model):
+    """One profiled staff request; the cProfile stats are kept in a .prof file under PROFILE_DIR."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    file_name = models.CharField(max_length=255)
+    summary = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self) -> str:
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,122 @@
+﻿"""Keyset (cursor) pagination ordered by (-created_at, id)."""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def _encode(values):
+    payload = json.dumps(values, separators=(',', ':'), ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode(token):
+    padded = token + '=' * (-len(token) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def encode_cursor(obj, direction):
+    return _encode([direction, obj.created_at.isoformat(), obj.pk])
+
+
+def decode_cursor(token):
+    try:
+        direction, created_at, pk = _decode(token)
+        if direction not in ('next', 'prev'):
+            return None
+        return direction, datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def encode_position(obj, ordering):
+    """Cursor holding the ordering values of the last row shown; the fields must be JSON values (ids, names)."""
+    return _encode([getattr(obj, name.lstrip('-')) for name in ordering])
+
+
+def decode_position(token, ordering):
+    try:
+        values = _decode(token)
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+    return values if isinstance(values, list) and len(values) == len(ordering) else None
+
+
+def after_position(ordering, values):
+    """Rows that come after `values` in `ordering`, e.g. ('name', 'id'): name > x, or name = x and id > y."""
+    condition = Q()
+    for index, name in enumerate(ordering):
+        field = name.lstrip('-')
+        lookup = 'lt' if name.startswith('-') else 'gt'
+        equal = {previous.lstrip('-'): value for previous, value in zip(ordering[:index], values)}
+        condition |= Q(**equal, **{f'{field}__{lookup}': values[index]})
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous, count=None):
+        self.object_list = object_list
+        self.count = count
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1], 'next') if self._has_next and self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0], 'prev') if self._has_previous and self.object_list else None
+
+
+class KeysetPaginator:
+    """Pages without OFFSET or COUNT(*): each page is one indexed range scan past the cursor row."""
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def count(self):
+        return self.queryset.count()
+
+    def window(self, cursor=None):
+        """Return (direction, queryset) fetching one row more than a page past the cursor."""
+        decoded = decode_cursor(cursor) if cursor else None
+        limit = self.per_page + 1
+        if decoded is None:
+            return 'first', self.queryset.order_by('-created_at', 'id')[:limit]
+
+        direction, created_at, pk = decoded
+        # The redundant created_at bound lets the (owner, created_at) index seek past the cursor.
+        if direction == 'next':
+            after = Q(created_at__lt=created_at) | Q(created_at=created_at, id__gt=pk)
+            return direction, self.queryset.filter(after, created_at__lte=created_at).order_by('-created_at', 'id')[:limit]
+        before = Q(created_at__gt=created_at) | Q(created_at=created_at, id__lt=pk)
+        return direction, self.queryset.filter(before, created_at__gte=created_at).order_by('created_at', '-id')[:limit]
+
+    def page(self, cursor=None, with_count=False):
+        direction, queryset = self.window(cursor)
+        rows = list(queryset)
+        count = self.count() if with_count else None
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'prev':
+            return KeysetPage(rows[::-1], True, more, count)
+        return KeysetPage(rows, more, direction == 'next', count)
@@ -0,0 +1,51 @@
+﻿"""Run the independent queries of one async page at the same time.
+
+Django's async ORM (acount, aaggregate...) hands every call to the request's single sync thread, so
+asyncio.gather over it still runs the queries one after another. Here each job is plain sync ORM code run
+on a small pool of threads with their own connections, so the database works on them together. The jobs
+must be read-only: they do not see the request's uncommitted writes.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+_executor = None
+
+
+def enabled():
+    """PLANNER_PARALLEL_QUERIES, or by default on for every database but SQLite.
+
+    SQLite readers share the process's CPU with the view and gained nothing in bench_async.
+    """
+    setting = getattr(settings, 'PLANNER_PARALLEL_QUERIES', None)
+    return connection.vendor != 'sqlite' if setting is None else setting
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        # Every thread keeps its own persistent connection (CONN_MAX_AGE), so this also caps the extra
+        # connections per process.
+        _executor = ThreadPoolExecutor(getattr(settings, 'PLANNER_QUERY_THREADS', 4), thread_name_prefix='planner-db')
+    return _executor
+
+
+def _run(job):
+    # What request_started/request_finished do for a sync request: drop broken or expired connections.
+    close_old_connections()
+    try:
+        return job()
+    finally:
+        close_old_connections()
+
+
+async def gather(jobs):
+    """Run a dict of zero-argument callables and return their results under the same names."""
+    if not enabled():
+        return await sync_to_async(lambda: {name: job() for name, job in jobs.items()})()
+    run = sync_to_async(_run, thread_sensitive=False, executor=executor())
+    results = await asyncio.gather(*(run(job) for job in jobs.values()))
+    return dict(zip(jobs, results))
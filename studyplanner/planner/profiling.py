@@ -0,0 +1,88 @@
+﻿"""Staff-only request profiling: cProfile runs kept in a bounded ring of .prof files."""
+import io
+import pstats
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import RequestProfile
+
+DEFAULT_LIMIT = 25
+MAX_LIMIT = 200
+_UNSAFE = re.compile(r'[^A-Za-z0-9]+')
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def requested_limit(request):
+    """Number of summary rows asked for with ?_profile=N or `X-Profile: N`, or None if not asked.
+
+    Only the cheap parameter check runs on every request; the user is loaded only when profiling is asked.
+    """
+    value = _asked(request)
+    if not value or not request.user.is_staff:
+        return None
+    return _limit(value)
+
+
+async def arequested_limit(request):
+    """requested_limit() for async middleware: loads the user without blocking the event loop."""
+    value = _asked(request)
+    if not value or not (await request.auser()).is_staff:
+        return None
+    return _limit(value)
+
+
+def _asked(request):
+    return request.GET.get('_profile') or request.headers.get('X-Profile')
+
+
+def _limit(value):
+    return min(int(value), MAX_LIMIT) if value.isdigit() and int(value) > 0 else DEFAULT_LIMIT
+
+
+def summary(profiler, limit):
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue().strip('\n')
+
+
+def save(profiler, request, status_code, duration_ms, query_count, limit):
+    """Dump the stats to a new .prof file, record it and drop the oldest runs beyond PROFILE_KEEP."""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = _UNSAFE.sub('-', request.path).strip('-')[:80] or 'root'
+    file_name = f'{timezone.now():%Y%m%d-%H%M%S-%f}-{slug}.prof'
+    profiler.dump_stats(directory / file_name)
+    record = RequestProfile.objects.create(
+        user=request.user,
+        method=request.method,
+        path=request.get_full_path()[:500],
+        status_code=status_code,
+        duration_ms=duration_ms,
+        query_count=query_count,
+        file_name=file_name,
+        summary=summary(profiler, limit),
+    )
+    prune()
+    return record
+
+
+def prune(keep=None):
+    keep = getattr(settings, 'PROFILE_KEEP', 20) if keep is None else keep
+    stale = list(RequestProfile.objects.values_list('pk', flat=True)[keep:])
+    if stale:
+        # The post_delete signal removes the files.
+        RequestProfile.objects.filter(pk__in=stale).delete()
+
+
+def file_path(record):
+    return profile_dir() / record.file_name
+
+
+def remove_file(record):
+    file_path(record).unlink(missing_ok=True)
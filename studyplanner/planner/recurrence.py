@@ -0,0 +1,114 @@
+﻿"""Recurring study events: occurrences are expanded lazily for the range being shown, never stored."""
+import heapq
+from datetime import date, datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+STEP_DAYS = {'daily': 1, 'weekly': 7}
+# Columns occurrences() reads; views add the ones their templates render.
+EXPANSION_FIELDS = ('start_at', 'end_at', 'repeat', 'repeat_interval', 'repeat_until', 'repeat_count', 'exception_dates')
+
+
+class Occurrence:
+    """One occurrence of a study event; other attributes (id, title, location...) come from the event."""
+
+    def __init__(self, event, start_at, end_at):
+        self.event = event
+        self.start_at = start_at
+        self.end_at = end_at
+
+    def __getattr__(self, name):
+        return getattr(self.event, name)
+
+
+def is_recurring(event):
+    return event.repeat in STEP_DAYS
+
+
+def _step_days(event):
+    return STEP_DAYS[event.repeat] * event.repeat_interval
+
+
+def start_on(event, day):
+    # Occurrences keep the local wall-clock time of the first one, across DST changes.
+    return timezone.make_aware(datetime.combine(day, timezone.localtime(event.start_at).time()))
+
+
+def _start_of(event, index):
+    first_day = timezone.localtime(event.start_at).date()
+    return start_on(event, first_day + timedelta(days=index * _step_days(event)))
+
+
+def _bounds(event):
+    """{'count' or 'until': index of the last occurrence that bound allows}."""
+    bounds = {}
+    # 0 is a series with no occurrences left, not one without an end.
+    if event.repeat_count is not None:
+        bounds['count'] = event.repeat_count - 1
+    if event.repeat_until:
+        first_day = timezone.localtime(event.start_at).date()
+        bounds['until'] = (event.repeat_until - first_day).days // _step_days(event)
+    return bounds
+
+
+def _last_index(event):
+    """Index of the final occurrence, or None for a series without an end."""
+    bounds = _bounds(event)
+    return min(bounds.values()) if bounds else None
+
+
+def ending_bound(event):
+    """'count' or 'until', whichever ends the series first, or None for a series without an end."""
+    bounds = _bounds(event)
+    return min(bounds, key=bounds.get) if bounds else None
+
+
+def series_end(event):
+    """When the last occurrence ends (None if the series never ends); stored to prune range queries."""
+    if not is_recurring(event):
+        return event.end_at or event.start_at
+    last = _last_index(event)
+    if last is None:
+        return None
+    start_at = _start_of(event, max(last, 0))
+    return start_at + (event.end_at - event.start_at) if event.end_at else start_at
+
+
+def overlapping(queryset, start, end):
+    """Events with at least one occurrence that may overlap [start, end): one query however long the series."""
+    return queryset.filter(Q(series_end_at__isnull=True) | Q(series_end_at__gte=start), start_at__lt=end)
+
+
+def exception_days(event):
+    return {date.fromisoformat(day) for day in event.exception_dates or ()}
+
+
+def occurrences(event, start, end):
+    """Yield the event's occurrences overlapping [start, end) in start order."""
+    duration = event.end_at - event.start_at if event.end_at else None
+    if not is_recurring(event):
+        if event.start_at < end and (event.end_at or event.start_at) >= start:
+            yield Occurrence(event, event.start_at, event.end_at)
+        return
+
+    step = _step_days(event)
+    last = _last_index(event)
+    skipped = exception_days(event)
+    first_day = timezone.localtime(event.start_at).date()
+    # Jump straight to the first occurrence that can still overlap the range, however long the series is.
+    lead_days = (timezone.localtime(start).date() - first_day).days - (duration.days + 1 if duration else 0)
+    index = max(0, lead_days // step)
+    while last is None or index <= last:
+        start_at = _start_of(event, index)
+        if start_at >= end:
+            break
+        end_at = start_at + duration if duration else None
+        if (end_at or start_at) >= start and timezone.localtime(start_at).date() not in skipped:
+            yield Occurrence(event, start_at, end_at)
+        index += 1
+
+
+def expand(events, start, end):
+    """Merge the occurrences of several events in the range into one start-ordered stream."""
+    return heapq.merge(*(occurrences(event, start, end) for event in events), key=lambda item: item.start_at)
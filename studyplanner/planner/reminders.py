@@ -0,0 +1,90 @@
+﻿"""Claiming and delivering due reminders."""
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import stamps
+from .models import Reminder
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = {
+    'console': 'django.core.mail.backends.console.EmailBackend',
+    'file': 'django.core.mail.backends.filebased.EmailBackend',
+    'smtp': 'django.core.mail.backends.smtp.EmailBackend',
+    'locmem': 'django.core.mail.backends.locmem.EmailBackend',
+    'dummy': 'django.core.mail.backends.dummy.EmailBackend',
+}
+
+
+def get_backend(name=None, **kwargs):
+    name = name or getattr(settings, 'REMINDER_EMAIL_BACKEND', 'console')
+    return get_connection(BACKENDS.get(name, name), **kwargs)
+
+
+def build_message(reminder):
+    task = reminder.task
+    lines = [f'Напоминание о задаче «{task.title}».']
+    if task.deadline:
+        lines.append(f'Дедлайн: {timezone.localtime(task.deadline):%d.%m.%Y %H:%M}.')
+    return EmailMessage(
+        subject=f'StudyPlanner: {task.title}',
+        body='\n'.join(lines),
+        to=[reminder.owner.email],
+        headers={'X-Reminder-Id': str(reminder.pk)},
+    )
+
+
+def _lock_for_write(model):
+    # Without row locks (SQLite) a no-op UPDATE takes the database write lock up front, so a second
+    # worker waits here instead of reading the same batch and sending it again.
+    with connection.cursor() as cursor:
+        cursor.execute(f'UPDATE {model._meta.db_table} SET is_sent = is_sent WHERE 0 = 1')
+
+
+def due(now=None):
+    return Reminder.objects.filter(is_sent=False, remind_at__lte=now or timezone.now()).order_by('remind_at')
+
+
+def deliver(queryset, limit, backend):
+    """Claim up to `limit` reminders from the queryset by marking them sent, commit, then send them.
+
+    No lock is held while the backend talks to the mail server, so app writes never wait for delivery.
+    When sending fails the claimed reminders with a message are released for the next run; a worker
+    that dies between the commit and the send loses its batch rather than sending it twice.
+    """
+    with transaction.atomic():
+        queryset = queryset.select_related('task', 'owner')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True, of=('self',))
+        else:
+            _lock_for_write(Reminder)
+        batch = list(queryset[:limit])
+        if not batch:
+            return 0
+        _mark_sent(batch, True)
+    messages = [build_message(reminder) for reminder in batch if reminder.owner.email]
+    if messages:
+        try:
+            backend.send_messages(messages)
+        except Exception:
+            _mark_sent([reminder for reminder in batch if reminder.owner.email], False)
+            raise
+    skipped = len(batch) - len(messages)
+    if skipped:
+        logger.info('Marked %s reminders sent without delivery: owner has no email.', skipped)
+    return len(batch)
+
+
+def _mark_sent(batch, is_sent):
+    Reminder.objects.filter(pk__in=[reminder.pk for reminder in batch]).update(is_sent=is_sent)
+    # The UPDATE skips the Reminder signals; pages showing the sent state are validated by the stamp.
+    for owner_id in {reminder.owner_id for reminder in batch}:
+        stamps.touch(owner_id)
+
+
+def send_due(batch_size=500, now=None, backend=None):
+    return deliver(due(now), batch_size, backend or get_backend())
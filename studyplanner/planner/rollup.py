@@ -0,0 +1,161 @@
+﻿"""Per-user daily rollup of created and completed tasks (DailyStat)."""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyStat, Task
+
+_local = threading.local()
+
+
+def task_deltas(old_state, new_state):
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is None:
+            continue
+        created_at, completed_at, minutes = state
+        if created_at:
+            deltas[timezone.localdate(created_at)][2] += sign
+        if completed_at:
+            delta = deltas[timezone.localdate(completed_at)]
+            delta[0] += sign
+            delta[1] += sign * minutes
+    return {day: delta for day, delta in deltas.items() if any(delta)}
+
+
+def record(owner_id, deltas):
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        for day, (done, minutes, created) in deltas.items():
+            delta = pending[(owner_id, day)]
+            delta[0] += done
+            delta[1] += minutes
+            delta[2] += created
+        return
+    for day, delta in deltas.items():
+        _apply(owner_id, day, *delta)
+
+
+@contextmanager
+def deferred():
+    """Collect deltas from many saves/deletes and write one row update per (owner, day)."""
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = defaultdict(lambda: [0, 0, 0])
+    try:
+        yield
+        pending = _local.pending
+    finally:
+        _local.pending = None
+    for (owner_id, day), delta in pending.items():
+        if any(delta):
+            _apply(owner_id, day, *delta)
+
+
+def _apply(owner_id, day, done, minutes, created):
+    stats = DailyStat.objects.filter(owner_id=owner_id, day=day)
+    changes = {
+        'done_count': F('done_count') + done,
+        'done_minutes': F('done_minutes') + minutes,
+        'created_count': F('created_count') + created,
+    }
+    if stats.update(**changes):
+        return
+    # A day without a row can only grow; pure decrements mean the owner or the day is already gone.
+    if done <= 0 and minutes <= 0 and created <= 0:
+        return
+    try:
+        with transaction.atomic():
+            DailyStat.objects.create(
+                owner_id=owner_id,
+                day=day,
+                done_count=max(done, 0),
+                done_minutes=max(minutes, 0),
+                created_count=max(created, 0),
+            )
+    except IntegrityError:
+        stats.update(**changes)
+
+
+def _aggregate(tasks):
+    totals = defaultdict(lambda: [0, 0, 0])
+    created = tasks.annotate(day=TruncDate('created_at')).values('owner_id', 'day').annotate(count=Count('id'))
+    for row in created.order_by():
+        totals[(row['owner_id'], row['day'])][2] = row['count']
+    done = tasks.filter(status=Task.Status.DONE, completed_at__isnull=False).annotate(
+        day=TruncDate('completed_at'),
+    ).values('owner_id', 'day').annotate(count=Count('id'), minutes=Sum('estimated_minutes'))
+    for row in done.order_by():
+        total = totals[(row['owner_id'], row['day'])]
+        total[0] = row['count']
+        total[1] = row['minutes'] or 0
+    return totals
+
+
+def _stat_rows(totals):
+    return [
+        DailyStat(owner_id=owner_id, day=day, done_count=done, done_minutes=minutes, created_count=created)
+        for (owner_id, day), (done, minutes, created) in totals.items()
+        if done or created
+    ]
+
+
+def rebuild(owner_ids=None, batch_size=1000) -> int:
+    tasks = Task.objects.all()
+    stats = DailyStat.objects.all()
+    if owner_ids is not None:
+        tasks = tasks.filter(owner_id__in=owner_ids)
+        stats = stats.filter(owner_id__in=owner_ids)
+    with transaction.atomic():
+        stats.delete()
+        rows = DailyStat.objects.bulk_create(_stat_rows(_aggregate(tasks)), batch_size=batch_size)
+    return len(rows)
+
+
+def refresh(owner_id, days):
+    """Recompute the given days from the task table, for set-based updates that bypass Task.save."""
+    days = set(days)
+    if not days:
+        return
+    period = Q()
+    for day in days:
+        start = timezone.make_aware(timezone.datetime.combine(day, timezone.datetime.min.time()))
+        end = start + timedelta(days=1)
+        period |= Q(created_at__gte=start, created_at__lt=end) | Q(completed_at__gte=start, completed_at__lt=end)
+    totals = _aggregate(Task.objects.filter(period, owner_id=owner_id))
+    totals = {key: value for key, value in totals.items() if key[1] in days}
+    with transaction.atomic():
+        DailyStat.objects.filter(owner_id=owner_id, day__in=days).delete()
+        DailyStat.objects.bulk_create(_stat_rows(totals))
+
+
+def daily_rows(owner, start, end):
+    return DailyStat.objects.filter(owner=owner, day__gte=start, day__lte=end)
+
+
+def daily(owner, start, end):
+    return {row.day: row for row in daily_rows(owner, start, end)}
+
+
+def active_days(owner, today):
+    """Days up to today with a completed task, latest first."""
+    return DailyStat.objects.filter(owner=owner, done_count__gt=0, day__lte=today).order_by('-day')
+
+
+def streak(owner, today) -> int:
+    days = active_days(owner, today)
+    count = 0
+    cursor = today
+    for day in days.values_list('day', flat=True).iterator(chunk_size=64):
+        if day != cursor:
+            break
+        count += 1
+        cursor -= timedelta(days=1)
+    return count
@@ -0,0 +1,228 @@
+﻿"""In-process asyncio reminder scheduler: a min-heap of upcoming reminders instead of table polling."""
+import asyncio
+import heapq
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import OperationalError, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from . import reminders
+from .models import ChangeStamp, Reminder
+
+logger = logging.getLogger(__name__)
+
+# How far back each poll looks again: a stamp is written with its transaction's clock but becomes visible at
+# commit, so a slow commit can land behind the last changed_at the scheduler saw.
+POLL_OVERLAP = timedelta(seconds=10)
+
+
+class ReminderScheduler:
+    """Sleep until the next reminder is due and send everything due by then as one batch.
+
+    Only reminders up to `horizon` ahead are held in memory (at most `capacity` of them); the window is
+    refilled when the scheduler reaches its end. Saves and deletes in this process reach the heap through
+    model signals. Changes made by other processes (the web app, send_reminders) are found every `poll`
+    through the owners' change stamps, and only those owners' reminders are reloaded; `resync` reloads the
+    whole window now and then as a safety net, e.g. for an owner whose stamp row does not exist yet.
+    """
+
+    def __init__(self, backend=None, horizon=timedelta(hours=24), capacity=10000,
+                 batch_window=timedelta(seconds=1), resync=timedelta(hours=1), batch_size=500,
+                 poll=timedelta(seconds=2)):
+        if not resync or not poll:
+            raise ValueError('resync and poll must be positive: without them changes from other processes are missed.')
+        self.backend = backend or reminders.get_backend()
+        self.horizon = horizon
+        self.capacity = capacity
+        self.batch_window = batch_window
+        self.resync = resync
+        self.batch_size = batch_size
+        self.poll = poll
+        self.retry_delay = timedelta(seconds=30)
+        self.sent = 0
+        self._heap = []
+        self._due_at = {}
+        self._loaded_until = None
+        self._changed_during_load = None
+        self._stamps_seen = None
+        self._stamp_versions = {}
+        self._loop = None
+        self._wakeup = None
+        self._stopping = False
+
+    # Heap bookkeeping. Entries are (remind_at, pk); an entry is stale once _due_at no longer agrees with it.
+
+    def _push(self, pk, remind_at):
+        self._due_at[pk] = remind_at
+        heapq.heappush(self._heap, (remind_at, pk))
+
+    def _discard(self, pk):
+        self._due_at.pop(pk, None)
+
+    def _peek(self):
+        while self._heap and self._due_at.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self, until):
+        pks = []
+        while (due_at := self._peek()) is not None and due_at <= until:
+            pks.append(heapq.heappop(self._heap)[1])
+            del self._due_at[pks[-1]]
+        return pks
+
+    def _load(self, after, until):
+        queryset = Reminder.objects.filter(is_sent=False, remind_at__lte=until).order_by('remind_at')
+        if after is not None:
+            queryset = queryset.filter(remind_at__gt=after)
+        rows = list(queryset.values_list('pk', 'remind_at')[:self.capacity + 1])
+        if len(rows) > self.capacity:
+            # End the window on the last timestamp that did not fit, loading all of its ties, so the next
+            # refill can continue strictly after it.
+            until = rows[-1][1]
+            rows = [row for row in rows if row[1] < until]
+            rows += queryset.filter(remind_at=until).values_list('pk', 'remind_at')
+        return rows, until
+
+    async def _query(self, load, *args):
+        """Run a loading query; also return the reminders notified meanwhile, which are newer than its rows."""
+        self._changed_during_load = set()
+        try:
+            result = await sync_to_async(load)(*args)
+        finally:
+            changed, self._changed_during_load = self._changed_during_load, None
+        return result, changed
+
+    def _push_rows(self, rows, changed):
+        for pk, remind_at in rows:
+            if pk not in changed:
+                self._push(pk, remind_at)
+
+    async def refill(self, reset=False):
+        now = timezone.now()
+        after = None if reset else self._loaded_until
+        if reset:
+            self._heap, self._due_at = [], {}
+            # Whatever changes from here on is picked up by the next poll.
+            self._stamps_seen, self._stamp_versions = now, {}
+        (rows, until), changed = await self._query(self._load, after, now + self.horizon)
+        self._push_rows(rows, changed)
+        self._loaded_until = until
+        logger.debug('Loaded %s reminders up to %s.', len(rows), until)
+
+    def _changed_owners(self):
+        """Owners whose change stamp moved since the last poll; advances the poll position."""
+        stamps = list(
+            ChangeStamp.objects.filter(changed_at__gte=self._stamps_seen - POLL_OVERLAP)
+            .values_list('owner_id', 'version', 'changed_at')
+        )
+        owners = [owner for owner, version, _ in stamps if self._stamp_versions.get(owner) != version]
+        # Older stamps are never read again, so only the overlap's versions need remembering.
+        self._stamp_versions = {owner: version for owner, version, _ in stamps}
+        self._stamps_seen = max([self._stamps_seen, *(changed_at for _, _, changed_at in stamps)])
+        return owners
+
+    def _load_owners(self, owners):
+        # Reminders that were deleted, sent or moved past the window keep their heap entries; fire() claims
+        # them again through reminders.due() and skips them.
+        return list(
+            Reminder.objects.filter(owner_id__in=owners, is_sent=False, remind_at__lte=self._loaded_until)
+            .values_list('pk', 'remind_at')
+        )
+
+    async def poll_changes(self):
+        owners = await sync_to_async(self._changed_owners)()
+        if owners:
+            rows, changed = await self._query(self._load_owners, owners)
+            self._push_rows(rows, changed)
+            logger.debug('Reloaded %s reminders of %s changed owners.', len(rows), len(owners))
+
+    # Change notifications.
+
+    def reminder_changed(self, pk, remind_at, is_sent, deleted=False):
+        """Apply a saved or deleted reminder to the heap; must run on the scheduler's event loop."""
+        if self._changed_during_load is not None:
+            self._changed_during_load.add(pk)
+        if deleted or is_sent or self._loaded_until is None or remind_at > self._loaded_until:
+            self._discard(pk)
+        elif self._due_at.get(pk) != remind_at:
+            self._push(pk, remind_at)
+        self._wakeup.set()
+
+    def _notify(self, instance, deleted):
+        args = (instance.pk, instance.remind_at, instance.is_sent, deleted)
+        # Wait for the commit so a rolled-back edit never reaches the heap.
+        transaction.on_commit(lambda: self._loop.call_soon_threadsafe(self.reminder_changed, *args))
+
+    def _on_save(self, sender, instance, raw=False, **kwargs):
+        if not raw:
+            self._notify(instance, deleted=False)
+
+    def _on_delete(self, sender, instance, **kwargs):
+        self._notify(instance, deleted=True)
+
+    def _connect(self):
+        # Connected only while running: idle processes keep Reminder cascades on the fast delete path.
+        post_save.connect(self._on_save, sender=Reminder, weak=False, dispatch_uid=f'scheduler-{id(self)}')
+        post_delete.connect(self._on_delete, sender=Reminder, weak=False, dispatch_uid=f'scheduler-{id(self)}')
+
+    def _disconnect(self):
+        post_save.disconnect(sender=Reminder, dispatch_uid=f'scheduler-{id(self)}')
+        post_delete.disconnect(sender=Reminder, dispatch_uid=f'scheduler-{id(self)}')
+
+    # Main loop.
+
+    async def fire(self, pks):
+        now = timezone.now()
+        # deliver() claims the rows again, so a reminder already sent by a send_reminders worker is skipped.
+        queryset = reminders.due(now + self.batch_window).filter(pk__in=pks)
+        try:
+            while sent := await sync_to_async(reminders.deliver)(queryset, self.batch_size, self.backend):
+                self.sent += sent
+        except OperationalError:
+            logger.exception('Sending %s due reminders failed; retrying in %s.', len(pks), self.retry_delay)
+            for pk in pks:
+                self._push(pk, now + self.retry_delay)
+            return
+        logger.info('Fired %s due reminders.', len(pks))
+
+    def stop(self):
+        self._stopping = True
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._connect()
+        try:
+            await self.refill(reset=True)
+            next_resync = timezone.now() + self.resync
+            next_poll = timezone.now() + self.poll
+            while not self._stopping:
+                now = timezone.now()
+                if now >= next_poll:
+                    await self.poll_changes()
+                    next_poll = now + self.poll
+                pks = self._pop_due(now + self.batch_window)
+                if pks:
+                    await self.fire(pks)
+                    continue
+                if now >= next_resync:
+                    await self.refill(reset=True)
+                    next_resync = now + self.resync
+                    continue
+                if now >= self._loaded_until:
+                    await self.refill()
+                    continue
+                wake_at = min(filter(None, (self._peek(), self._loaded_until, next_resync, next_poll)))
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), (wake_at - now).total_seconds())
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._disconnect()
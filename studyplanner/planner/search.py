@@ -0,0 +1,155 @@
+﻿"""Full-text search: SQLite FTS5 tables kept in sync by triggers, or tsvector GIN indexes on PostgreSQL."""
+import re
+import threading
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Course, StudyEvent, Task
+
+# The FTS tables, triggers and GIN indexes are created by migrations (0005_search_index, 0012_search_owner),
+# which keep their own copy of these fields: changing them needs a new migration.
+SEARCH_FIELDS = {
+    Task: ('title', 'description'),
+    Course: ('name', 'teacher'),
+    StudyEvent: ('title', 'location', 'notes'),
+}
+# Also indexed in each FTS table, so that an owner's search only ranks their rows.
+OWNER_COLUMN = 'owner_id'
+RESULT_LIMIT = 20
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_local = threading.local()
+
+
+def terms(query):
+    return _WORD_RE.findall(query or '')[:16]
+
+
+def fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def _fts_columns(model):
+    return (*SEARCH_FIELDS[model], OWNER_COLUMN)
+
+
+def _tsvector(model):
+    columns = " || ' ' || ".join(f"coalesce({field}, '')" for field in SEARCH_FIELDS[model])
+    return f"to_tsvector('simple', {columns})"
+
+
+def _match(model, query, vendor, owner=None):
+    words = terms(query)
+    if vendor == 'postgresql':
+        return ' & '.join(f'{word}:*' for word in words)
+    phrases = ' '.join(f'"{word}"*' for word in words)
+    # The words only match the text columns, never the owner's id.
+    match = f'{{{" ".join(SEARCH_FIELDS[model])}}} : ({phrases})'
+    return f'{OWNER_COLUMN} : "{owner.pk}" AND {match}' if owner is not None else match
+
+
+def is_indexed(vendor=None):
+    return (vendor or connection.vendor) in ('sqlite', 'postgresql')
+
+
+def _ids_sql(model, vendor):
+    table = model._meta.db_table
+    if vendor == 'postgresql':
+        return f"SELECT id FROM {table} WHERE {_tsvector(model)} @@ to_tsquery('simple', %s)"
+    return f'SELECT rowid FROM {fts_table(model)} WHERE {fts_table(model)} MATCH %s'
+
+
+def filter_queryset(queryset, query):
+    """Restrict a queryset to rows matching every word of the query as a prefix."""
+    model = queryset.model
+    vendor = connection.vendor
+    if not terms(query) or not is_indexed(vendor):
+        condition = Q()
+        for field in SEARCH_FIELDS[model]:
+            condition |= Q(**{f'{field}__icontains': query})
+        return queryset.filter(condition)
+    return queryset.filter(id__in=RawSQL(_ids_sql(model, vendor), [_match(model, query, vendor)]))
+
+
+def ranked(model, query, owner=None, limit=RESULT_LIMIT):
+    """Return model instances matching the query, best match first."""
+    vendor = connection.vendor
+    if not terms(query):
+        return []
+    if not is_indexed(vendor):
+        queryset = filter_queryset(model.objects.all(), query)
+        if owner is not None:
+            queryset = queryset.filter(owner=owner)
+        return list(queryset[:limit])
+
+    table = model._meta.db_table
+    if vendor == 'postgresql':
+        match = _match(model, query, vendor)
+        sql = (
+            f"SELECT id FROM {table} WHERE {_tsvector(model)} @@ to_tsquery('simple', %s)"
+            f"{' AND owner_id = %s' if owner is not None else ''} "
+            f"ORDER BY ts_rank({_tsvector(model)}, to_tsquery('simple', %s)) DESC LIMIT %s"
+        )
+        params = [match, *([owner.pk] if owner is not None else []), match, limit]
+    else:
+        fts = fts_table(model)
+        # The owner column is weighted 0: every row of the owner matches it alike.
+        weights = ', '.join(['1.0'] * len(SEARCH_FIELDS[model]) + ['0.0'])
+        sql = f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s ORDER BY bm25({fts}, {weights}) LIMIT %s'
+        params = [_match(model, query, vendor, owner), limit]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ids = [row[0] for row in cursor.fetchall()]
+    objects = model.objects.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+def search_all(owner, query, limit=RESULT_LIMIT):
+    return {
+        'tasks': ranked(Task, query, owner=owner, limit=limit),
+        'courses': ranked(Course, query, owner=owner, limit=limit),
+        'events': ranked(StudyEvent, query, owner=owner, limit=limit),
+    }
+
+
+def _sqlite_insert_trigger(model):
+    fts = fts_table(model)
+    fields = _fts_columns(model)
+    return (
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {model._meta.db_table} BEGIN '
+        f'INSERT INTO {fts}(rowid, {", ".join(fields)}) VALUES (new.id, {", ".join(f"new.{field}" for field in fields)}); END'
+    )
+
+
+@contextmanager
+def bulk_load(model):
+    """Index the rows inserted in the block in one pass at the end instead of one trigger call per row.
+
+    On SQLite the insert trigger is dropped and restored inside one transaction, so no other connection
+    ever writes to the table without it. Elsewhere the block just runs in a transaction. Nested blocks for
+    the same model join the outer one.
+    """
+    loading = _local.__dict__.setdefault('loading', set())
+    with transaction.atomic():
+        if connection.vendor != 'sqlite' or model not in SEARCH_FIELDS or model in loading:
+            yield
+            return
+        table, fts = model._meta.db_table, fts_table(model)
+        columns = ', '.join(_fts_columns(model))
+        with connection.cursor() as cursor:
+            # Dropping the trigger takes the write lock, so no other connection can add rows after last_id.
+            cursor.execute(f'DROP TRIGGER IF EXISTS {fts}_ai')
+            cursor.execute(f'SELECT coalesce(max(id), 0) FROM {table}')
+            last_id = cursor.fetchone()[0]
+        loading.add(model)
+        try:
+            yield
+        finally:
+            loading.discard(model)
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {fts}(rowid, {columns}) SELECT id, {columns} FROM {table} WHERE id > %s', [last_id])
+            cursor.execute(_sqlite_insert_trigger(model))
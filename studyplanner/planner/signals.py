@@ -0,0 +1,62 @@
+﻿from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import profiling, rollup, sqlite, stamps
+from .models import Course, Reminder, RequestProfile, StudyEvent, Task
+
+
+def _stored_rollup_state(task):
+    if task.pk is None:
+        return None
+    stored = Task.objects.filter(pk=task.pk).only('status', 'created_at', 'completed_at', 'estimated_minutes').first()
+    return stored.rollup_state() if stored else None
+
+
+@receiver(pre_save, sender=Task)
+def load_task_rollup_state(sender, instance, raw=False, **kwargs):
+    if raw or getattr(instance, '_rollup_state', None) is not None:
+        return
+    instance._rollup_state = _stored_rollup_state(instance)
+
+
+@receiver(post_save, sender=Task)
+def update_task_rollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    state = instance.rollup_state() or _stored_rollup_state(instance)
+    deltas = rollup.task_deltas(instance._rollup_state, state)
+    if deltas:
+        rollup.record(instance.owner_id, deltas)
+    instance._rollup_state = state
+
+
+@receiver(post_delete, sender=Task)
+def remove_task_rollup(sender, instance, **kwargs):
+    state = getattr(instance, '_rollup_state', None) or instance.rollup_state()
+    deltas = rollup.task_deltas(state, None)
+    if deltas:
+        rollup.record(instance.owner_id, deltas)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=Reminder)
+@receiver(post_save, sender=StudyEvent)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Reminder)
+@receiver(post_delete, sender=StudyEvent)
+def touch_change_stamp(sender, instance, raw=False, **kwargs):
+    if not raw:
+        stamps.touch(instance.owner_id)
+
+
+@receiver(post_delete, sender=RequestProfile)
+def remove_profile_file(sender, instance, **kwargs):
+    profiling.remove_file(instance)
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    sqlite.configure(connection)
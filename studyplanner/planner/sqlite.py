@@ -0,0 +1,92 @@
+﻿"""SQLite tuning: pragmas for every new connection and a write transaction that waits for the lock.
+
+SQLite has one writer at a time. In WAL mode (SQLITE_WAL) readers keep working while it writes. A plain
+BEGIN takes no lock, so a transaction that has read and then writes must upgrade its lock, and when
+another connection is writing that fails at once with "database is locked" instead of waiting for the
+busy timeout. write() starts its transaction with BEGIN IMMEDIATE, which takes the write lock, and waits
+for it, up front; other atomic() blocks keep the plain BEGIN, so reads never queue behind a writer.
+write() retries that start a few times, so the block itself always runs exactly once.
+"""
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+WRITE_ATTEMPTS = 3
+RETRY_DELAY = 0.05
+
+
+def configure(wrapper):
+    """Tune a new SQLite connection (SQLITE_TUNING)."""
+    if wrapper.vendor != 'sqlite' or not getattr(settings, 'SQLITE_TUNING', True):
+        return
+    megabyte = 1024 * 1024
+    pragmas = {
+        'busy_timeout': getattr(settings, 'SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'mmap_size': getattr(settings, 'SQLITE_MMAP_SIZE_MB', 256) * megabyte,
+        # Negative: in KiB rather than pages. Per connection, i.e. per thread.
+        'cache_size': -getattr(settings, 'SQLITE_CACHE_SIZE_MB', 32) * 1024,
+        'temp_store': 'MEMORY',
+    }
+    if getattr(settings, 'SQLITE_WAL', False):
+        # Persistent in the database file, which is rewritten on the first connection; hence opt-in.
+        pragmas['journal_mode'] = 'WAL'
+        # In WAL mode a commit is durable at the next checkpoint instead of every commit; a power loss
+        # can drop the last transactions but never corrupts the file.
+        pragmas['synchronous'] = 'NORMAL'
+    for name, value in pragmas.items():
+        wrapper.connection.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def _immediate():
+    """Start the transaction opened inside with BEGIN IMMEDIATE; DATABASES OPTIONS transaction_mode still wins."""
+    if connection.vendor != 'sqlite' or not getattr(settings, 'SQLITE_TUNING', True):
+        yield
+        return
+    # The OPTIONS mode is read when the connection opens.
+    connection.ensure_connection()
+    if connection.transaction_mode:
+        yield
+        return
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        yield
+    finally:
+        connection.transaction_mode = None
+
+
+def is_locked(exc):
+    message = str(exc).lower()
+    return isinstance(exc, OperationalError) and ('locked' in message or 'busy' in message)
+
+
+@contextmanager
+def write():
+    """transaction.atomic() for a short write, started again while the database stays locked.
+
+    Keep the block to the writes themselves (validate and render outside): every other writer waits
+    for it. Inside an outer transaction it is a plain savepoint, since only the outer one can be retried.
+    """
+    if connection.in_atomic_block:
+        with transaction.atomic():
+            yield
+        return
+    with ExitStack() as stack:
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                # A failed start leaves no transaction behind, so trying again is safe.
+                with _immediate():
+                    stack.enter_context(transaction.atomic())
+                break
+            except OperationalError as exc:
+                if not is_locked(exc) or attempt == WRITE_ATTEMPTS:
+                    raise
+                logger.warning('Database locked, starting the write again (attempt %s of %s).', attempt + 1, WRITE_ATTEMPTS)
+                time.sleep(RETRY_DELAY * attempt * random.uniform(0.5, 1.5))
+        yield
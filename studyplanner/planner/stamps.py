@@ -0,0 +1,62 @@
+﻿"""Per-user change stamps: one version row per user, bumped whenever the user's planner data changes."""
+import threading
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ChangeStamp
+
+_local = threading.local()
+
+
+def touch(owner_id):
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.add(owner_id)
+        return
+    # Update only: a missing row is created on the next read, so a touch during a cascading user
+    # delete never inserts a row for the user being removed.
+    ChangeStamp.objects.filter(owner_id=owner_id).update(version=F('version') + 1, changed_at=timezone.now())
+
+
+@contextmanager
+def deferred():
+    """Collect touches from many saves/deletes and bump each owner's stamp once at the end."""
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = set()
+    try:
+        yield
+        pending = _local.pending
+    finally:
+        _local.pending = None
+    for owner_id in pending:
+        touch(owner_id)
+
+
+def current(owner_id):
+    stamp, _ = ChangeStamp.objects.get_or_create(owner_id=owner_id)
+    return stamp
+
+
+def for_user(user):
+    """The user's stamp, read once per user object (i.e. once per request for request.user)."""
+    stamp = getattr(user, '_planner_stamp', None)
+    if stamp is None:
+        stamp = user._planner_stamp = current(user.pk)
+    return stamp
+
+
+async def acurrent(owner_id):
+    stamp, _ = await ChangeStamp.objects.aget_or_create(owner_id=owner_id)
+    return stamp
+
+
+async def afor_user(user):
+    """for_user() for async views; afterwards for_user(user) answers without a query."""
+    stamp = getattr(user, '_planner_stamp', None)
+    if stamp is None:
+        stamp = user._planner_stamp = await acurrent(user.pk)
+    return stamp
@@ -0,0 +1,69 @@
+// Lazy <select> widgets (forms.LazySelect): the page holds only the chosen option,
+// the rest is fetched page by page from the data-autocomplete-url JSON endpoint.
+const AUTOCOMPLETE_DELAY = 250;
+
+const setupAutocomplete = (select) => {
+    const url = select.dataset.autocompleteUrl;
+    const search = document.createElement("input");
+    search.type = "search";
+    search.className = "form-control form-control-sm mb-1";
+    search.placeholder = "Search…";
+    search.setAttribute("aria-label", "Search choices");
+    const more = document.createElement("button");
+    more.type = "button";
+    more.className = "btn btn-link btn-sm px-0";
+    more.textContent = "Show more";
+    more.hidden = true;
+    select.before(search);
+    select.after(more);
+
+    let cursor = null;
+    let loaded = false;
+    let timer = null;
+    let request = 0;
+
+    const keepOptions = () => Array.from(select.options).filter((option) => option.value === "" || option.selected);
+
+    const load = async (append) => {
+        const params = new URLSearchParams({ q: search.value.trim() });
+        if (append && cursor) {
+            params.set("cursor", cursor);
+        }
+        const current = ++request;
+        const response = await fetch(`${url}?${params}`, { credentials: "same-origin", headers: { Accept: "application/json" } });
+        if (!response.ok || current !== request) {
+            return;
+        }
+        const data = await response.json();
+        if (!append) {
+            const kept = keepOptions();
+            select.replaceChildren(...kept);
+        }
+        const present = new Set(Array.from(select.options).map((option) => option.value));
+        data.results.forEach((item) => {
+            if (!present.has(String(item.id))) {
+                select.add(new Option(item.text, item.id));
+            }
+        });
+        cursor = data.next;
+        more.hidden = !cursor;
+        loaded = true;
+    };
+
+    search.addEventListener("input", () => {
+        window.clearTimeout(timer);
+        timer = window.setTimeout(() => load(false), AUTOCOMPLETE_DELAY);
+    });
+    ["focus", "mousedown"].forEach((name) => {
+        select.addEventListener(name, () => {
+            if (!loaded) {
+                load(false);
+            }
+        });
+    });
+    more.addEventListener("click", () => load(true));
+};
+
+document.addEventListener("DOMContentLoaded", () => {
+    document.querySelectorAll("select[data-autocomplete-url]").forEach(setupAutocomplete);
+});
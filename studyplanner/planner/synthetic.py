@@ -0,0 +1,230 @@
+﻿"""Deterministic synthetic planner data for benchmarks and capacity tests, inserted in streamed batches.
+
+Rows are generated lazily and written one batch at a time (see insert), so memory
+stays flat however many tasks are asked for. The same seed and usernames give the same data.
+"""
+import csv
+import io
+import random
+from bisect import bisect
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import accumulate, islice
+
+from django.db import connection
+from django.utils import timezone
+
+from . import recurrence, rollup, search, stamps
+from .models import Course, Reminder, StudyEvent, Task
+
+SUBJECTS = ('Математика', 'История', 'Физика', 'Химия', 'Биология', 'Литература', 'Английский', 'Информатика',
+            'Экономика', 'Философия', 'Статистика', 'Право')
+KINDS = ('Домашка', 'Конспект', 'Реферат', 'Лабораторная', 'Подготовка к тесту', 'Чтение главы', 'Проект', 'Практика')
+TEACHERS = ('Иванов И.И.', 'Петрова А.А.', 'Сидоров П.П.', 'Кузнецова Е.В.', 'Смирнов А.Н.')
+COLORS = ('#FF6B6B', '#4D96FF', '#6BCB77', '#FFD93D', '#9B5DE5', '#F15BB5')
+PLACES = ('Аудитория 101', 'Аудитория 202', 'Библиотека', 'Онлайн', 'Лаборатория 3')
+MINUTES = (15, 30, 45, 60, 90, 120, 180, 240)
+PRIORITY_CUMULATIVE = list(accumulate((0.15, 0.25, 0.30, 0.20, 0.10)))
+HISTORY_MINUTES = 60 * 24 * 120
+# The large tables skip the ORM's per-value preparation: COPY on PostgreSQL, one prepared executemany
+# INSERT on SQLite. The rest (few rows, JSON columns) use bulk_create.
+FAST_MODELS = (Task, Reminder)
+# Models whose generated rows carry their own created_at (spread over HISTORY_MINUTES).
+GENERATED_CREATED_AT = (Task,)
+COPY_NULL = r'\N'
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _db_value(value, vendor):
+    if isinstance(value, datetime):
+        # Django stores SQLite datetimes as naive UTC text.
+        return value.astimezone(dt_timezone.utc).replace(tzinfo=None).isoformat(' ') if vendor == 'sqlite' else value
+    return value
+
+
+def _rows(batch, fields, vendor):
+    for obj in batch:
+        # pre_save only where it matters (auto_now_add not set by the generator); other values are read as they are.
+        yield [
+            _db_value(field.pre_save(obj, True) if _stamped_on_insert(field, obj) else getattr(obj, field.attname), vendor)
+            for field in fields
+        ]
+
+
+def _stamped_on_insert(field, obj):
+    return getattr(field, 'auto_now_add', False) and getattr(obj, field.attname) is None
+
+
+def _allocate_ids(model, batch, cursor):
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)", [table, len(batch)])
+        ids = [row[0] for row in cursor.fetchall()]
+    else:
+        # Callers hold the write lock (see seed_user), so nobody else can take these ids meanwhile.
+        cursor.execute(f'SELECT coalesce(max(id), 0) FROM {table}')
+        first = cursor.fetchone()[0] + 1
+        ids = range(first, first + len(batch))
+    for obj, pk in zip(batch, ids):
+        obj.pk = pk
+
+
+def _fast_insert(model, batch):
+    table = model._meta.db_table
+    fields = model._meta.concrete_fields
+    columns = ', '.join(field.column for field in fields)
+    vendor = connection.vendor
+    with connection.cursor() as cursor:
+        _allocate_ids(model, batch, cursor)
+        if vendor == 'sqlite':
+            cursor.executemany(
+                f'INSERT INTO {table} ({columns}) VALUES ({", ".join(["%s"] * len(fields))})', _rows(batch, fields, vendor),
+            )
+            return
+        buffer = io.StringIO()
+        # The csv module quotes None as "" like any string, so NULLs travel as a marker that FORCE_NULL
+        # turns back into NULL in the nullable columns.
+        rows = ([COPY_NULL if value is None else value for value in row] for row in _rows(batch, fields, vendor))
+        csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+        nullable = [field.column for field in fields if field.null]
+        force_null = f", FORCE_NULL ({', '.join(nullable)})" if nullable else ''
+        sql = f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}'{force_null})"
+        raw = cursor.cursor
+        if hasattr(raw, 'copy'):
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+        else:
+            buffer.seek(0)
+            raw.copy_expert(sql, buffer)
+
+
+def insert(model, objects, batch_size):
+    """Save a stream of unsaved objects one batch at a time; yields each saved batch (with pks set)."""
+    fast = connection.vendor in ('sqlite', 'postgresql') and model in FAST_MODELS
+    for batch in batches(objects, batch_size):
+        if fast:
+            _fast_insert(model, batch)
+        else:
+            generated = [obj.created_at for obj in batch] if model in GENERATED_CREATED_AT else None
+            model.objects.bulk_create(batch)
+            if generated:
+                # bulk_create stamps auto_now_add over the generated values; write them back by pk.
+                for obj, created_at in zip(batch, generated):
+                    obj.created_at = created_at
+                model.objects.bulk_update(batch, ['created_at'])
+        # With DEBUG on, the query log would otherwise keep every INSERT.
+        connection.queries_log.clear()
+        yield batch
+
+
+def courses(owner, count, rng):
+    for i in range(count):
+        subject = SUBJECTS[i % len(SUBJECTS)]
+        name = subject if i < len(SUBJECTS) else f'{subject} {i // len(SUBJECTS) + 1}'
+        yield Course(owner=owner, name=name, teacher=rng.choice(TEACHERS), color=rng.choice(COLORS))
+
+
+def tasks(owner, course_ids, count, rng, now):
+    """Tasks created over the last four months: ~40% done, ~15% overdue, ~10% without a deadline.
+
+    Open deadlines cluster in the coming weeks with a long tail; priorities lean towards the middle.
+    """
+    random_value, choice = rng.random, rng.choice
+    for i in range(count):
+        created_at = now - timedelta(minutes=int(HISTORY_MINUTES * random_value() ** 2))
+        roll = random_value()
+        if roll < 0.40:
+            status = Task.Status.DONE
+            completed_at = created_at + (now - created_at) * random_value()
+            deadline = completed_at + timedelta(minutes=int(rng.expovariate(1 / (60 * 24 * 3))) - 60 * 24)
+        else:
+            status = Task.Status.DOING if roll < 0.55 else Task.Status.TODO
+            completed_at = None
+            deadline_roll = random_value()
+            if deadline_roll < 0.17:
+                deadline = None
+            elif deadline_roll < 0.42:
+                deadline = now - timedelta(minutes=int(60 * 24 * 30 * random_value()) + 1)
+            else:
+                deadline = now + timedelta(minutes=int(rng.expovariate(1 / (60 * 24 * 10))) + 30)
+        yield Task(
+            owner=owner,
+            course_id=choice(course_ids) if course_ids and random_value() < 0.85 else None,
+            title=f'{choice(KINDS)} {i + 1}',
+            description=f'{choice(SUBJECTS)}: задание {int(random_value() * 40) + 1}' if random_value() < 0.7 else None,
+            deadline=deadline,
+            priority=bisect(PRIORITY_CUMULATIVE, random_value() * PRIORITY_CUMULATIVE[-1]) + 1,
+            estimated_minutes=choice(MINUTES),
+            status=status,
+            created_at=created_at,
+            completed_at=completed_at,
+        )
+
+
+def reminders(task_batch, per_task, now):
+    """Reminders for open tasks with a deadline: 2 hours before, then a day earlier for each extra one."""
+    for task in task_batch:
+        if task.status == Task.Status.DONE or task.deadline is None:
+            continue
+        for n in range(per_task):
+            remind_at = task.deadline - timedelta(hours=2 + 24 * n)
+            yield Reminder(owner_id=task.owner_id, task_id=task.pk, remind_at=remind_at, is_sent=remind_at <= now)
+
+
+def events(owner, count, rng, now):
+    week_start = timezone.localdate(now) - timedelta(days=timezone.localdate(now).weekday())
+    for i in range(count):
+        start_at = timezone.make_aware(timezone.datetime.combine(
+            week_start + timedelta(days=rng.randint(-14, 42)), timezone.datetime.min.time(),
+        )) + timedelta(hours=rng.randint(8, 19))
+        event = StudyEvent(
+            owner=owner,
+            title=f'{rng.choice(("Лекция", "Семинар", "Консультация"))}: {rng.choice(SUBJECTS)}',
+            start_at=start_at,
+            end_at=start_at + timedelta(minutes=rng.choice((45, 90))),
+            location=rng.choice(PLACES),
+        )
+        if i % 4 == 0:
+            event.repeat, event.repeat_count = StudyEvent.Repeat.WEEKLY, rng.randint(8, 16)
+        event.series_end_at = recurrence.series_end(event)
+        yield event
+
+
+def seed_user(owner, task_count, course_count=8, reminders_per_task=0, event_count=20, seed=1, batch_size=2000,
+              now=None, progress=None):
+    """Add synthetic data to one user and bring the daily rollup and change stamp up to date.
+
+    `progress(model, count)` is called after each inserted batch. Returns the number of rows per model.
+    """
+    rng = random.Random(f'{seed}:{owner.get_username()}')
+    now = now or timezone.now()
+    counts = dict.fromkeys((Course, Task, Reminder, StudyEvent), 0)
+    if not connection.in_atomic_block:
+        raise RuntimeError('seed_user must run inside transaction.atomic().')
+
+    def save(model, objects):
+        for batch in insert(model, objects, batch_size):
+            counts[model] += len(batch)
+            if progress:
+                progress(model, len(batch))
+            yield batch
+
+    with search.bulk_load(Course):
+        course_ids = [course.pk for batch in save(Course, courses(owner, course_count, rng)) for course in batch]
+    with search.bulk_load(Task):
+        for batch in save(Task, tasks(owner, course_ids, task_count, rng, now)):
+            if reminders_per_task:
+                for _ in save(Reminder, reminders(batch, reminders_per_task, now)):
+                    pass
+    with search.bulk_load(StudyEvent):
+        for _ in save(StudyEvent, events(owner, event_count, rng, now)):
+            pass
+    # Inserts above skip the model signals.
+    rollup.rebuild(owner_ids=[owner.pk])
+    stamps.current(owner.pk)
+    stamps.touch(owner.pk)
+    return counts
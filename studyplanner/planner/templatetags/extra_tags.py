@@ -5,4 +5,15 @@ register = template.Library()
 
 @register.filter
 def get_item(mapping, key):
-    return mapping.get(key)
\ No newline at end of file
+    return mapping.get(key)
+
+
+@register.simple_tag(takes_context=True)
+def url_replace(context, **kwargs):
+    query = context['request'].GET.copy()
+    for key, value in kwargs.items():
+        if value in (None, ''):
+            query.pop(key, None)
+        else:
+            query[key] = value
+    return f'?{query.urlencode()}'
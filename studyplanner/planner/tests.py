@@ -0,0 +1,584 @@
+﻿import csv
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import admin, ics, middleware, recurrence, reminders, rollup, search, sqlite, stamps, synthetic
+from .forecast import DeadlineForecast
+from .forms import StudyEventForm
+from .management.commands.bench_async import serving
+from .management.commands.bench_views import QUERY_BUDGETS
+from .management.commands.check_query_plans import missing_indexes, view_queries
+from .management.commands.load_test import parse_mix, percentile
+from .models import CalendarFeed, Course, DailyStat, Reminder, StudyEvent, Task
+from .scheduler import ReminderScheduler
+
+
+class PlannerTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('student', password='student_pass12345')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        # Page data is cached per user id and stamp version, both of which repeat across rolled-back tests.
+        for cache in caches.all():
+            cache.clear()
+
+
+class DashboardQueryTests(PlannerTestCase):
+    def assert_dashboard_queries(self, task_count):
+        synthetic.seed_user(self.user, task_count, reminders_per_task=1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        # The budget is a maximum, not an exact count.
+        self.assertLessEqual(len(queries), QUERY_BUDGETS['dashboard'], [query['sql'] for query in queries])
+
+    def test_small_user(self):
+        self.assert_dashboard_queries(20)
+
+    def test_large_user(self):
+        self.assert_dashboard_queries(2000)
+
+    def test_top_tasks_are_the_newest(self):
+        now = timezone.now()
+        for days in range(1, 7):
+            task = Task.objects.create(owner=self.user, title=f'Due in {days}', deadline=now + timedelta(days=days))
+            # The later the deadline, the newer the task.
+            Task.objects.filter(pk=task.pk).update(created_at=now - timedelta(days=7 - days))
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual([task.title for task in response.context['tasks_next_7']], [f'Due in {days}' for days in range(6, 1, -1)])
+
+
+class ForecastTests(PlannerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.now = timezone.now()
+        # 70 minutes done in the last week: a capacity of 10 minutes a day.
+        Task.objects.create(
+            owner=cls.user, title='Done', status=Task.Status.DONE, estimated_minutes=70,
+            completed_at=cls.now - timedelta(days=1),
+        )
+        cls.tasks = [
+            Task.objects.create(
+                owner=cls.user, title=f'Task {days}', deadline=cls.now + timedelta(days=days, hours=1), estimated_minutes=minutes,
+            )
+            for days, minutes in [(1, 25), (2, 5), (3, 30), (40, 500)]
+        ]
+
+    def expected(self, tasks):
+        forecasts = DeadlineForecast(self.user, now=self.now).all()
+        return {task.id: forecasts[task.id]['status'] for task in tasks}
+
+    def test_statuses_match_the_full_forecast(self):
+        page = self.tasks[:3]
+        forecast = DeadlineForecast(self.user, now=self.now)
+        with self.assertNumQueries(1):
+            statuses = forecast.statuses(page)
+        self.assertEqual(statuses, self.expected(page))
+        self.assertEqual(list(statuses.values()), ['risk', 'ok', 'risk'])
+
+    def test_bounded_load_falls_back_beyond_its_bound(self):
+        forecast = DeadlineForecast(self.user, now=self.now).load(until=self.now + timedelta(days=7))
+        self.assertEqual(forecast.statuses(self.tasks), self.expected(self.tasks))
+        with self.assertRaises(ValueError):
+            forecast.all()
+
+
+class RollupTests(PlannerTestCase):
+    def stats(self):
+        # Updates leave emptied days behind as zero rows; a rebuild has none.
+        rows = DailyStat.objects.filter(owner=self.user).exclude(done_count=0, created_count=0)
+        return set(rows.values_list('day', 'done_count', 'done_minutes', 'created_count'))
+
+    def test_saves_and_deletes_match_a_rebuild(self):
+        now = timezone.now()
+        today = timezone.localdate(now)
+        tasks = [Task.objects.create(owner=self.user, title=f'Task {days}', estimated_minutes=30) for days in range(3)]
+        for days, task in enumerate(tasks):
+            task.status, task.completed_at = Task.Status.DONE, now - timedelta(days=days)
+            task.save()
+        self.assertEqual(rollup.streak(self.user, today), 3)
+        tasks[2].delete()
+        tasks[1].status = Task.Status.TODO
+        tasks[1].save()
+        self.assertEqual(rollup.streak(self.user, today), 1)
+
+        incremental = self.stats()
+        rollup.rebuild(owner_ids=[self.user.pk])
+        self.assertEqual(self.stats(), incremental)
+        self.assertIn((today, 1, 30, 2), incremental)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Query plan checks are only defined for SQLite.')
+class QueryPlanTests(PlannerTestCase):
+    def test_view_querysets_use_their_indexes(self):
+        synthetic.seed_user(self.user, 200, reminders_per_task=1)
+        for name, expected, queryset in view_queries(self.user):
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertEqual(missing_indexes(plan, expected), [], plan)
+
+
+class RequestTimingTests(PlannerTestCase):
+    @override_settings(REQUEST_TIMING=True)
+    def test_page_cache_hits_are_reported(self):
+        with self.assertLogs('planner.middleware', 'INFO') as logs:
+            first = self.client.get(reverse('dashboard'))
+            second = self.client.get(reverse('dashboard'))
+        self.assertIn('cache;desc="0 hits, 1 misses"', first.headers['Server-Timing'])
+        self.assertIn('cache;desc="1 hits, 0 misses"', second.headers['Server-Timing'])
+        self.assertEqual([record.timing['cache_hits'] for record in logs.records], [0, 1])
+
+
+class QueryRecorderTests(unittest.TestCase):
+    def test_repeats_of_one_query_are_grouped(self):
+        recorder = middleware.QueryRecorder()
+        for pk in range(6):
+            recorder(lambda *args: None, f'SELECT * FROM planner_reminder WHERE task_id = {pk} LIMIT 1', None, False, {})
+        recorder(lambda *args: None, 'SELECT * FROM planner_task WHERE id IN (%s, %s, %s)', None, False, {})
+        self.assertEqual(recorder.count, 7)
+        self.assertEqual(recorder.repeated(5), [('SELECT * FROM planner_reminder WHERE task_id = ? LIMIT ?', 6)])
+        self.assertEqual(middleware.query_template('id IN (%s, %s)'), 'id IN (%s, ...)')
+
+
+class SyntheticDataTests(PlannerTestCase):
+    def assert_generated_created_at_kept(self):
+        synthetic.seed_user(self.user, 50, reminders_per_task=1)
+        created = Task.objects.filter(owner=self.user).values_list('created_at', flat=True)
+        self.assertGreater(len(set(created)), 1)
+        self.assertLess(min(created), timezone.now() - timedelta(days=1))
+
+    def test_fast_insert_keeps_generated_created_at(self):
+        self.assert_generated_created_at_kept()
+
+    def test_bulk_create_keeps_generated_created_at(self):
+        with mock.patch.object(synthetic, 'FAST_MODELS', ()):
+            self.assert_generated_created_at_kept()
+
+    def test_bulk_create_leaves_auto_now_add_alone(self):
+        stamped = []
+
+        def create_task(*args, **kwargs):
+            # What a request saving a task meanwhile would see.
+            stamped.append(Task._meta.get_field('created_at').auto_now_add)
+            return bulk_create(*args, **kwargs)
+
+        bulk_create = Task.objects.bulk_create
+        with mock.patch.object(synthetic, 'FAST_MODELS', ()), mock.patch.object(Task.objects, 'bulk_create', create_task):
+            self.assert_generated_created_at_kept()
+        self.assertEqual(set(stamped), {True})
+
+
+class SearchTests(PlannerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = get_user_model().objects.create_user('other')
+        cls.essay = Task.objects.create(owner=cls.user, title='Essay draft', description='History essay')
+        cls.outline = Task.objects.create(owner=cls.user, title='Outline', description='For the essay')
+        Task.objects.create(owner=cls.other, title='Essay', description='Someone else')
+
+    def test_ranked_is_restricted_to_the_owner(self):
+        self.assertEqual(search.ranked(Task, 'ess', owner=self.user), [self.essay, self.outline])
+        self.assertEqual(len(search.ranked(Task, 'essay')), 3)
+
+    def test_owner_id_is_not_searchable_text(self):
+        self.assertEqual(search.ranked(Task, str(self.user.pk), owner=self.user), [])
+        self.assertFalse(search.filter_queryset(Task.objects.all(), str(self.user.pk)).exists())
+
+    def test_search_page_and_task_list(self):
+        response = self.client.get(reverse('search'), {'q': 'essay dra'})
+        self.assertEqual(response.context['results']['tasks'], [self.essay])
+        response = self.client.get(reverse('task_list'), {'q': 'essay'})
+        self.assertEqual({task.pk for task in response.context['tasks']}, {self.essay.pk, self.outline.pk})
+
+
+class TaskListTests(PlannerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        created = timezone.now() - timedelta(days=1)
+        cls.tasks = [Task.objects.create(owner=cls.user, title=f'Task {number}') for number in range(25)]
+        # Two tasks share a created_at, so the id breaks the tie.
+        Task.objects.filter(pk__in=[cls.tasks[3].pk, cls.tasks[4].pk]).update(created_at=created)
+
+    def page(self, **params):
+        response = self.client.get(reverse('task_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['page_obj']
+
+    def test_cursor_pages_cover_every_task_once(self):
+        seen, page = [], self.page()
+        pages = [page]
+        while page.has_next():
+            page = self.page(cursor=page.next_cursor)
+            pages.append(page)
+        for page in pages:
+            seen += [task.pk for task in page]
+        self.assertEqual(len(pages), 3)
+        self.assertCountEqual(seen, [task.pk for task in self.tasks])
+        expected = list(Task.objects.filter(owner=self.user).order_by('-created_at', 'id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+        previous = self.page(cursor=pages[2].previous_cursor)
+        self.assertEqual([task.pk for task in previous], [task.pk for task in pages[1]])
+        self.assertEqual(self.page(count=1).count, 25)
+
+    def test_invalid_cursor_shows_the_first_page(self):
+        self.assertEqual([task.pk for task in self.page(cursor='not-a-cursor')], [task.pk for task in self.page()])
+
+    def test_nearest_upcoming_reminder(self):
+        task = self.tasks[-1]
+        now = timezone.now()
+        for hours in (-1, 5, 2):
+            Reminder.objects.create(owner=self.user, task=task, remind_at=now + timedelta(hours=hours))
+        tasks = {listed.pk: listed for listed in self.page()}
+        self.assertAlmostEqual(tasks[task.pk].nearest_remind_at, now + timedelta(hours=2), delta=timedelta(seconds=1))
+        self.assertIsNone(tasks[self.tasks[-2].pk].nearest_remind_at)
+
+
+class ConditionalPageTests(PlannerTestCase):
+    def test_unchanged_page_is_not_modified(self):
+        first = self.client.get(reverse('course_list'))
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['ETag']
+        repeat = self.client.get(reverse('course_list'), headers={'If-None-Match': etag})
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat.headers['ETag'], etag)
+
+        Course.objects.create(owner=self.user, name='Math')
+        changed = self.client.get(reverse('course_list'), headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+
+    def test_validators_are_per_user(self):
+        etag = self.client.get(reverse('course_list')).headers['ETag']
+        self.client.force_login(get_user_model().objects.create_user('other'))
+        self.assertEqual(self.client.get(reverse('course_list'), headers={'If-None-Match': etag}).status_code, 200)
+
+
+class AutocompleteTests(PlannerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for name in ('Physics', 'Algebra', 'Geometry', 'Art'):
+            Course.objects.create(owner=cls.user, name=name)
+        Course.objects.create(owner=get_user_model().objects.create_user('other'), name='Astronomy')
+
+    def get(self, status=200, **params):
+        response = self.client.get(reverse('course_autocomplete'), params)
+        self.assertEqual(response.status_code, status)
+        return response.json()
+
+    def test_pages_follow_the_cursor(self):
+        first = self.get(limit=3)
+        self.assertEqual([row['text'] for row in first['results']], ['Algebra', 'Art', 'Geometry'])
+        second = self.get(limit=3, cursor=first['next'])
+        self.assertEqual([row['text'] for row in second['results']], ['Physics'])
+        self.assertIsNone(second['next'])
+
+    def test_query_matches_word_prefixes_of_own_rows(self):
+        self.assertEqual([row['text'] for row in self.get(q='a')['results']], ['Algebra', 'Art'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.get(status=400, cursor='x'), {'error': 'Invalid cursor.'})
+
+    def test_done_tasks_are_not_offered(self):
+        Task.objects.create(owner=self.user, title='Open')
+        Task.objects.create(owner=self.user, title='Finished', status=Task.Status.DONE)
+        response = self.client.get(reverse('task_autocomplete'))
+        self.assertEqual([row['text'] for row in response.json()['results']], ['Open'])
+
+
+class TaskBulkActionTests(PlannerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.math = Course.objects.create(owner=cls.user, name='Math')
+        cls.physics = Course.objects.create(owner=cls.user, name='Physics')
+        cls.math_task = Task.objects.create(owner=cls.user, course=cls.math, title='Integrals')
+        cls.physics_task = Task.objects.create(owner=cls.user, course=cls.physics, title='Optics')
+
+    def post(self, **data):
+        # The task list posts its active filters as hidden inputs next to the action fields.
+        return self.client.post(reverse('task_bulk'), {'scope': 'filter', 'course': self.math.pk, 'target_course': '', **data})
+
+    def test_filter_scope_keeps_course_filter(self):
+        self.post(action='done')
+        self.assertEqual(Task.objects.get(pk=self.math_task.pk).status, Task.Status.DONE)
+        self.assertEqual(Task.objects.get(pk=self.physics_task.pk).status, Task.Status.TODO)
+
+    def test_move_to_course_uses_target_not_filter(self):
+        self.post(action='course', target_course=self.physics.pk)
+        self.assertEqual(Task.objects.get(pk=self.math_task.pk).course, self.physics)
+        self.assertEqual(Task.objects.get(pk=self.physics_task.pk).course, self.physics)
+
+    def test_move_to_no_course(self):
+        self.post(action='course')
+        self.assertIsNone(Task.objects.get(pk=self.math_task.pk).course)
+        self.assertEqual(Task.objects.get(pk=self.physics_task.pk).course, self.physics)
+
+
+class TaskImportTests(PlannerTestCase):
+    def upload(self, name, content):
+        return self.client.post(reverse('task_import'), {'file': SimpleUploadedFile(name, content), 'format': ''})
+
+    def test_file_that_is_not_utf8_is_a_form_error(self):
+        response = self.upload('tasks.csv', 'title\nRéviser\n'.encode('cp1252'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response.context['form'], 'file', 'The file is not UTF-8 encoded text.')
+        self.assertFalse(Task.objects.exists())
+
+    def test_broken_csv_is_a_form_error(self):
+        response = self.upload('tasks.csv', b'title\nEssay\n' + b'x' * (csv.field_size_limit() + 1) + b'\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors['file'][0].startswith('Line 3: not valid CSV'))
+        self.assertFalse(Task.objects.exists())
+
+    def test_out_of_range_integers_are_reported_per_line(self):
+        rows = b'{"title": "Essay", "estimated_minutes": 99999999999999999999}\n{"title": "Lab", "estimated_minutes": 90}\n'
+        response = self.upload('tasks.jsonl', rows)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['report'].errors, [(1, 'estimated_minutes must be between 0 and 2147483647.')])
+        self.assertEqual(list(Task.objects.values_list('title', flat=True)), ['Lab'])
+
+
+class EventTestCase(PlannerTestCase):
+    def weekly(self, **fields):
+        start_at = timezone.make_aware(timezone.datetime(2026, 3, 2, 10, 0))
+        return StudyEvent.objects.create(
+            owner=self.user, title='Seminar', start_at=start_at, end_at=start_at + timedelta(hours=1),
+            repeat=StudyEvent.Repeat.WEEKLY, **fields,
+        )
+
+
+class RecurrenceTests(EventTestCase):
+    def starts(self, event, days=60):
+        start = event.start_at - timedelta(days=1)
+        return [item.start_at for item in recurrence.occurrences(event, start, start + timedelta(days=days))]
+
+    def test_count_ends_the_series(self):
+        event = self.weekly(repeat_count=3)
+        self.assertEqual(self.starts(event), [event.start_at + timedelta(weeks=week) for week in range(3)])
+        self.assertEqual(event.series_end_at, event.start_at + timedelta(weeks=2, hours=1))
+
+    def test_zero_count_is_not_an_endless_series(self):
+        event = self.weekly(repeat_count=0)
+        self.assertEqual(self.starts(event), [])
+        self.assertIsNotNone(event.series_end_at)
+
+    def test_exception_dates_are_skipped(self):
+        event = self.weekly(repeat_count=3, exception_dates=['2026-03-09'])
+        self.assertEqual(self.starts(event), [event.start_at, event.start_at + timedelta(weeks=2)])
+
+    def test_form_rejects_count_and_until_together(self):
+        form = StudyEventForm(data={
+            'title': 'Seminar', 'start_at': '2026-03-02T10:00', 'repeat': 'weekly', 'repeat_interval': 1,
+            'repeat_count': 3, 'repeat_until': '2026-06-01',
+        })
+        self.assertFalse(form.is_valid())
+        self.assertTrue(form.non_field_errors())
+
+    def test_form_rejects_zero_count(self):
+        form = StudyEventForm(data={
+            'title': 'Seminar', 'start_at': '2026-03-02T10:00', 'repeat': 'weekly', 'repeat_interval': 1, 'repeat_count': 0,
+        })
+        self.assertIn('repeat_count', form.errors)
+
+
+class CalendarRangeTests(PlannerTestCase):
+    pages = [
+        ('calendar_week', 'week', '9999-12-27'),
+        ('calendar_month', 'month', '9999-12'),
+        ('calendar_agenda', 'from', '9999-12-30'),
+        ('calendar_agenda', 'from', '0001-01-01'),
+    ]
+
+    def test_dates_at_the_ends_of_the_calendar_fall_back_to_today(self):
+        for name, param, value in self.pages:
+            with self.subTest(name=name, value=value):
+                self.assertEqual(self.client.get(reverse(name), {param: value}).status_code, 200)
+
+    def test_async_views_too(self):
+        self.async_client.force_login(self.user)
+        with serving(async_views=True, parallel_queries=False):
+            for name, param, value in self.pages:
+                with self.subTest(name=name, value=value):
+                    response = async_to_sync(self.async_client.get)(reverse(name), {param: value})
+                    self.assertEqual(response.status_code, 200)
+
+
+class CalendarFeedTests(PlannerTestCase):
+    def test_event_timezone_is_defined_in_the_feed(self):
+        StudyEvent.objects.create(
+            owner=self.user, title='Lecture', start_at=timezone.now(), repeat=StudyEvent.Repeat.WEEKLY,
+            exception_dates=[str(timezone.localdate() + timedelta(days=7))],
+        )
+        feed = CalendarFeed.objects.create(owner=self.user)
+        response = self.client.get(reverse('calendar_feed_ics', args=[feed.token]))
+        body = b''.join(response.streaming_content).decode()
+        tzid = timezone.get_current_timezone_name()
+        self.assertIn(f'DTSTART;TZID={tzid}:', body)
+        self.assertIn(f'EXDATE;TZID={tzid}:', body)
+        self.assertEqual(body.count('BEGIN:VTIMEZONE'), 1)
+        self.assertLess(body.index(f'TZID:{tzid}\r\n'), body.index('BEGIN:VEVENT'))
+
+
+class EventRuleTests(EventTestCase):
+    def rule(self, event):
+        return next(line for line in ics.event_component(event, timezone.now()).split('\r\n') if line.startswith('RRULE:'))
+
+    def test_rule_keeps_the_bound_that_ends_first(self):
+        # Stored before the form made the two exclusive.
+        by_count = self.weekly(repeat_count=3, repeat_until=date(2026, 6, 1))
+        self.assertEqual(self.rule(by_count), 'RRULE:FREQ=WEEKLY;INTERVAL=1;COUNT=3')
+        by_date = self.weekly(repeat_count=30, repeat_until=date(2026, 3, 20))
+        self.assertRegex(self.rule(by_date), r'^RRULE:FREQ=WEEKLY;INTERVAL=1;UNTIL=20260320T\d{6}Z$')
+
+    def test_endless_rule(self):
+        self.assertEqual(self.rule(self.weekly()), 'RRULE:FREQ=WEEKLY;INTERVAL=1')
+
+
+class ReminderDeliveryTests(PlannerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user.email = 'student@example.com'
+        cls.user.save()
+        task = Task.objects.create(owner=cls.user, title='Essay')
+        cls.reminder = Reminder.objects.create(owner=cls.user, task=task, remind_at=timezone.now() - timedelta(minutes=1))
+
+    def test_sends_after_the_claim_is_committed(self):
+        depth = []
+
+        class Backend(reminders.get_backend('locmem').__class__):
+            def send_messages(self, messages):
+                depth.append(len(connection.atomic_blocks))
+                return super().send_messages(messages)
+
+        outer = len(connection.atomic_blocks)
+        self.assertEqual(reminders.send_due(backend=Backend()), 1)
+        self.assertEqual(depth, [outer])
+        self.assertTrue(Reminder.objects.get(pk=self.reminder.pk).is_sent)
+
+    def test_failed_send_releases_the_claim(self):
+        backend = reminders.get_backend('locmem')
+        with mock.patch.object(backend, 'send_messages', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                reminders.send_due(backend=backend)
+        self.assertFalse(Reminder.objects.get(pk=self.reminder.pk).is_sent)
+
+
+class ReminderSchedulerTests(PlannerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.task = Task.objects.create(owner=cls.user, title='Essay')
+        stamps.current(cls.user.pk)
+
+    def test_poll_picks_up_reminder_from_another_process(self):
+        scheduler = ReminderScheduler(backend=reminders.get_backend('dummy'))
+        async_to_sync(scheduler.refill)(reset=True)
+        self.assertIsNone(scheduler._peek())
+        # Saved while the scheduler's signal handlers are not connected, as in the web process.
+        remind_at = timezone.now() + timedelta(minutes=5)
+        reminder = Reminder.objects.create(owner=self.user, task=self.task, remind_at=remind_at)
+        async_to_sync(scheduler.poll_changes)()
+        self.assertEqual(scheduler._peek(), remind_at)
+        self.assertEqual(scheduler._pop_due(remind_at), [reminder.pk])
+
+    def test_resync_and_poll_are_required(self):
+        with self.assertRaises(ValueError):
+            ReminderScheduler(backend=reminders.get_backend('dummy'), resync=None)
+        with self.assertRaises(ValueError):
+            ReminderScheduler(backend=reminders.get_backend('dummy'), poll=timedelta(0))
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'BEGIN IMMEDIATE is SQLite only.')
+class SqliteWriteTests(TransactionTestCase):
+    def begins(self, block):
+        with CaptureQueriesContext(connection) as queries:
+            with block():
+                Course.objects.count()
+        return [query['sql'] for query in queries if query['sql'].startswith('BEGIN')]
+
+    def test_only_writes_begin_immediate(self):
+        self.assertEqual(self.begins(sqlite.write), ['BEGIN IMMEDIATE'])
+        self.assertEqual(self.begins(transaction.atomic), ['BEGIN'])
+
+    def test_locked_start_is_retried(self):
+        runs = []
+        atomic = transaction.atomic
+        starts = iter([OperationalError('database is locked'), None])
+
+        def locked_once():
+            error = next(starts)
+            if error:
+                raise error
+            return atomic()
+
+        with mock.patch.object(sqlite.time, 'sleep'), self.assertLogs('planner.sqlite', 'WARNING'):
+            with mock.patch.object(sqlite.transaction, 'atomic', side_effect=locked_once):
+                with sqlite.write():
+                    runs.append(connection.in_atomic_block)
+        self.assertEqual(runs, [True])
+
+
+class LoadTestHelperTests(unittest.TestCase):
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('dashboard=3,tasks'), {'dashboard': 3.0, 'tasks': 1.0})
+        with self.assertRaises(CommandError):
+            parse_mix('nowhere=1')
+
+    def test_percentile(self):
+        self.assertEqual(percentile([1, 2, 3, 4], 0.5), 2)
+        self.assertEqual(percentile([1, 2, 3, 4], 0.99), 4)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+
+class LargeTableAdminTests(PlannerTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = get_user_model().objects.create_superuser('admin', password='admin_pass12345')
+        for number in range(8):
+            Task.objects.create(owner=cls.user, title=f'Essay {number}')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def count(self, queryset, estimate):
+        with mock.patch.object(admin, 'COUNT_LIMIT', 5), mock.patch.object(admin, 'estimated_count', return_value=estimate):
+            return admin.EstimatedCountPaginator(queryset.order_by('-pk'), 3).count
+
+    def test_counts_stop_at_the_limit(self):
+        self.assertEqual(self.count(Task.objects.all(), 1000), 1000)
+        # Without an estimate, or when filtered, at most COUNT_LIMIT rows are counted.
+        self.assertEqual(self.count(Task.objects.all(), None), 5)
+        self.assertEqual(self.count(Task.objects.filter(owner=self.user), 1000), 5)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'The SQLite estimate is the highest id.')
+    def test_sqlite_estimate(self):
+        self.assertEqual(admin.estimated_count(Task), Task.objects.order_by('-pk').first().pk)
+
+    def test_changelist_with_search_and_owner_filter(self):
+        url = reverse('admin:planner_task_changelist')
+        response = self.client.get(url, {'q': 'essay', 'owner__id__exact': self.user.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 8)
+        self.assertEqual(self.client.get(reverse('admin:planner_reminder_changelist'), {'q': 'essay'}).status_code, 200)
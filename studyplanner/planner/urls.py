@@ -1,17 +1,28 @@
-﻿from django.urls import path
+﻿from django.conf import settings
+from django.urls import path
 from . import views
 
+
+def page(sync_view, async_view):
+    """The async version of a read-only page when PLANNER_ASYNC_VIEWS is on (under ASGI, see asgi.py)."""
+    return (async_view if getattr(settings, 'PLANNER_ASYNC_VIEWS', False) else sync_view).as_view()
+
+
 urlpatterns = [
-    path('', views.DashboardView.as_view(), name='dashboard'),
+    path('', page(views.DashboardView, views.AsyncDashboardView), name='dashboard'),
 
     path('courses/', views.CourseListView.as_view(), name='course_list'),
+    path('courses/autocomplete/', views.CourseAutocompleteView.as_view(), name='course_autocomplete'),
     path('courses/add/', views.CourseCreateView.as_view(), name='course_add'),
     path('courses/<int:pk>/', views.CourseDetailView.as_view(), name='course_detail'),
     path('courses/<int:pk>/edit/', views.CourseUpdateView.as_view(), name='course_edit'),
     path('courses/<int:pk>/delete/', views.CourseDeleteView.as_view(), name='course_delete'),
 
     path('tasks/', views.TaskListView.as_view(), name='task_list'),
+    path('tasks/autocomplete/', views.TaskAutocompleteView.as_view(), name='task_autocomplete'),
     path('tasks/add/', views.TaskCreateView.as_view(), name='task_add'),
+    path('tasks/bulk/', views.TaskBulkActionView.as_view(), name='task_bulk'),
+    path('tasks/import/', views.TaskImportView.as_view(), name='task_import'),
     path('tasks/<int:pk>/', views.TaskDetailView.as_view(), name='task_detail'),
     path('tasks/<int:pk>/edit/', views.TaskUpdateView.as_view(), name='task_edit'),
     path('tasks/<int:pk>/delete/', views.TaskDeleteView.as_view(), name='task_delete'),
@@ -22,12 +33,17 @@ urlpatterns = [
     path('reminders/<int:pk>/edit/', views.ReminderUpdateView.as_view(), name='reminder_edit'),
     path('reminders/<int:pk>/delete/', views.ReminderDeleteView.as_view(), name='reminder_delete'),
 
-    path('calendar/', views.CalendarWeekView.as_view(), name='calendar_week'),
+    path('calendar/', page(views.CalendarWeekView, views.AsyncCalendarWeekView), name='calendar_week'),
+    path('calendar/month/', page(views.CalendarMonthView, views.AsyncCalendarMonthView), name='calendar_month'),
+    path('calendar/agenda/', page(views.CalendarAgendaView, views.AsyncCalendarAgendaView), name='calendar_agenda'),
+    path('calendar/feed/', views.CalendarFeedSettingsView.as_view(), name='calendar_feed'),
+    path('calendar/feed/<str:token>.ics', views.CalendarFeedView.as_view(), name='calendar_feed_ics'),
     path('calendar/add/', views.StudyEventCreateView.as_view(), name='event_add'),
     path('calendar/<int:pk>/edit/', views.StudyEventUpdateView.as_view(), name='event_edit'),
     path('calendar/<int:pk>/delete/', views.StudyEventDeleteView.as_view(), name='event_delete'),
 
-    path('stats/', views.StatsView.as_view(), name='stats'),
+    path('stats/', page(views.StatsView, views.AsyncStatsView), name='stats'),
+    path('search/', views.SearchView.as_view(), name='search'),
 
     path('accounts/login/', views.UserLoginView.as_view(), name='login'),
     path('accounts/logout/', views.UserLogoutView.as_view(), name='logout'),
@@ -1,18 +1,116 @@
-﻿from datetime import timedelta
+﻿from datetime import date, datetime, timedelta, timezone as dt_timezone
 
+from django import forms
 from django.contrib import messages
 from django.contrib.auth import login
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.mixins import AccessMixin, LoginRequiredMixin
 from django.contrib.auth.views import LoginView, LogoutView
-from django.db.models import Q, Sum, Count
-from django.db.models.functions import TruncDate
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy, reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, urlencode
 from django.utils import timezone
 from django.views import generic
+from django.views.generic.base import ContextMixin
 
-from .forms import CourseForm, TaskForm, ReminderForm, StudyEventForm, SignUpForm, LoginForm
-from .models import Course, Task, Reminder, StudyEvent
+from .forms import CourseForm, TaskForm, TaskBulkActionForm, TaskImportForm, ReminderForm, StudyEventForm, SignUpForm, LoginForm
+from . import bulk, caching, ics, parallel, recurrence, rollup, search, sqlite, stamps
+from .forecast import DeadlineForecast
+from .importer import TaskImporter, open_text, read_rows
+from .models import OPEN_STATUSES, Course, Task, Reminder, StudyEvent, DailyStat, CalendarFeed, ChangeStamp, new_feed_token
+from .pagination import KeysetPaginator, after_position, decode_position, encode_position
+
+
+DASHBOARD_ROWS = 5
+
+
+def day_start(day):
+    return timezone.make_aware(timezone.datetime.combine(day, timezone.datetime.min.time()))
+
+
+class ConditionalPageMixin:
+    """Answer a repeated GET with 304 Not Modified while the user's planner data is unchanged.
+
+    The validators come from the user's change stamp, so an unchanged page costs one primary-key lookup
+    and nothing is queried or rendered. Pages also depend on today's date; views whose content moves with
+    the clock within a day (overdue marks, "next 7 days") set `revalidate_every` to a number of seconds.
+    """
+    revalidate_every = None
+
+    def get_validators(self):
+        stamp = stamps.for_user(self.request.user)
+        now = timezone.now()
+        today = timezone.localdate(now)
+        period, period_start = today.isoformat(), day_start(today)
+        if self.revalidate_every:
+            slot = int(now.timestamp()) // self.revalidate_every
+            period += f'-{slot}'
+            period_start = datetime.fromtimestamp(slot * self.revalidate_every, tz=dt_timezone.utc)
+        # Weak: the CSRF token makes every rendering differ byte for byte.
+        etag = f'W/"{self.request.user.pk}-{stamp.version}-{period}"'
+        return etag, max(stamp.changed_at, period_start)
+
+    def conditional_response(self, request):
+        """Return (response, etag, last_modified); the response is None unless the client's copy is current."""
+        etag, last_modified = self.get_validators()
+        response = None
+        # Pending flash messages are shown by the next rendered page, so they must not be answered with 304.
+        if not len(messages.get_messages(request)):
+            response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+        return response, etag, last_modified
+
+    def add_validators(self, response, etag, last_modified):
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+    def get(self, request, *args, **kwargs):
+        response, etag, last_modified = self.conditional_response(request)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return self.add_validators(response, etag, last_modified)
+
+
+class AsyncLoginRequiredMixin(AccessMixin):
+    """LoginRequiredMixin for async views."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        # The lazy request.user would query synchronously; swap in the user loaded through the async API.
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncPageMixin(AsyncLoginRequiredMixin, ConditionalPageMixin):
+    """Async GET for a ConditionalPageMixin page; subclasses build the context in aget_context_data().
+
+    Only the independent queries of a page run concurrently (see planner.parallel); template rendering
+    stays synchronous and is done by the handler off the event loop.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        # Loads the stamp once so get_validators() and the page cache read it without a query.
+        await stamps.afor_user(request.user)
+        response, etag, last_modified = self.conditional_response(request)
+        if response is None:
+            response = self.render_to_response(await self.aget_context_data(**kwargs))
+        return self.add_validators(response, etag, last_modified)
+
+    async def aget_context_data(self, **kwargs):
+        return ContextMixin.get_context_data(self, **kwargs)
+
+
+class WriteTransactionMixin:
+    """Save or delete the valid form in one sqlite.write() transaction, started after validation."""
+
+    def form_valid(self, form):
+        with sqlite.write():
+            return super().form_valid(form)
 
 
 class UserLoginView(LoginView):
@@ -42,59 +140,111 @@ class SignUpView(generic.CreateView):
         return response
 
 
-class DashboardView(LoginRequiredMixin, generic.TemplateView):
+class DashboardView(LoginRequiredMixin, ConditionalPageMixin, generic.TemplateView):
     template_name = 'planner/dashboard.html'
+    revalidate_every = 60
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        now = timezone.now()
         today = timezone.localdate()
+        # Buckets move with the clock as well as with the data, so entries live for a minute at most.
+        context.update(caching.get_or_set(
+            self.request.user, f'dashboard:{today}', lambda: self.dashboard_data(timezone.now(), today), timeout=60,
+        ))
+        return context
+
+    def dashboard_filters(self, now, today):
+        """(deadline buckets of open tasks by name, tasks done in the last 7 days) as Q objects."""
         start_of_day = timezone.make_aware(timezone.datetime.combine(today, timezone.datetime.min.time()))
         end_of_day = timezone.make_aware(timezone.datetime.combine(today, timezone.datetime.max.time()))
-        next_week = now + timedelta(days=7)
-
-        context['tasks_today'] = Task.objects.filter(
-            owner=self.request.user,
-            deadline__range=(start_of_day, end_of_day)
-        ).exclude(status=Task.Status.DONE)
-        context['tasks_overdue'] = Task.objects.filter(
-            owner=self.request.user,
-            deadline__lt=now,
-            status__in=[Task.Status.TODO, Task.Status.DOING],
-        )
-        context['tasks_next_7'] = Task.objects.filter(
-            owner=self.request.user,
-            deadline__gt=now,
-            deadline__lte=next_week,
-            status__in=[Task.Status.TODO, Task.Status.DOING],
-        )
         week_start = today - timedelta(days=6)
-        context['done_last_7'] = Task.objects.filter(
-            owner=self.request.user,
+        buckets = {
+            'today': Q(deadline__range=(start_of_day, end_of_day)),
+            'overdue': Q(deadline__lt=now),
+            'next_7': Q(deadline__gt=now, deadline__lte=now + timedelta(days=7)),
+        }
+        done_last_7 = Q(
             status=Task.Status.DONE,
-            completed_at__date__gte=week_start,
-            completed_at__date__lte=today,
-        ).count()
-        done_dates = set(Task.objects.filter(owner=self.request.user, status=Task.Status.DONE).values_list('completed_at__date', flat=True))
-        streak = 0
-        cursor = today
-        while cursor in done_dates:
-            streak += 1
-            cursor -= timedelta(days=1)
-        context['streak'] = streak
+            completed_at__gte=day_start(week_start),
+            completed_at__lt=day_start(today + timedelta(days=1)),
+        )
+        return buckets, done_last_7
+
+    def dashboard_querysets(self, now, today):
+        """The page's task querysets by name ('counts' before aggregation); check_query_plans explains these."""
+        buckets, done_last_7 = self.dashboard_filters(now, today)
+        open_tasks = Q(status__in=OPEN_STATUSES)
+        tasks = Task.objects.filter(owner=self.request.user)
+        counts = tasks.filter((open_tasks & Q(deadline__lte=now + timedelta(days=7))) | done_last_7)
+        # Aggregation ignores the default ordering; without it the plan explained is the one that runs.
+        querysets = {'counts': counts.order_by()}
+        for name, bucket in buckets.items():
+            # Newest first, as the dashboard always listed them.
+            rows = tasks.filter(open_tasks & bucket).only('id', 'title', 'deadline').order_by('-created_at')[:DASHBOARD_ROWS]
+            querysets[f'tasks_{name}'] = rows
+        return querysets
+
+    def dashboard_queries(self, now, today):
+        """The page's independent queries by name: run in turn here, concurrently by AsyncDashboardView."""
+        user = self.request.user
+        buckets, done_last_7 = self.dashboard_filters(now, today)
+        open_tasks = Q(status__in=OPEN_STATUSES)
+        querysets = self.dashboard_querysets(now, today)
+        counts = querysets.pop('counts')
+        queries = {
+            'counts': lambda: counts.aggregate(
+                done_last_7=Count('id', filter=done_last_7),
+                **{name: Count('id', filter=open_tasks & bucket) for name, bucket in buckets.items()},
+            ),
+            'forecast': lambda: self.forecast(now),
+            'streak': lambda: rollup.streak(user, today),
+        }
+        for name, rows in querysets.items():
+            queries[name] = lambda rows=rows: list(rows)
+        return queries
+
+    def forecast(self, now):
+        forecast = DeadlineForecast(self.request.user, now=now)
+        # Loaded up front so that statuses() below needs no further query; the page lists tasks due within a week.
+        return forecast.load(until=now + timedelta(days=7)) if forecast.capacity_per_day else forecast
+
+    def dashboard_context(self, results):
+        context = {name: results[name] for name in ('tasks_today', 'tasks_overdue', 'tasks_next_7', 'counts', 'streak')}
+        context['forecasts'] = results['forecast'].statuses(context['tasks_today'] + context['tasks_next_7'])
+        context['done_last_7'] = results['counts']['done_last_7']
         return context
 
+    def dashboard_data(self, now, today):
+        return self.dashboard_context({name: query() for name, query in self.dashboard_queries(now, today).items()})
+
+
+class AsyncDashboardView(AsyncPageMixin, DashboardView):
+    async def aget_context_data(self, **kwargs):
+        context = await super().aget_context_data(**kwargs)
+        today = timezone.localdate()
+        context.update(await caching.aget_or_set(
+            self.request.user, f'dashboard:{today}', lambda: self.adashboard_data(timezone.now(), today), timeout=60,
+        ))
+        return context
+
+    async def adashboard_data(self, now, today):
+        return self.dashboard_context(await parallel.gather(self.dashboard_queries(now, today)))
+
 
-class CourseListView(LoginRequiredMixin, generic.ListView):
+def user_courses(user):
+    return caching.get_or_set(user, 'courses', lambda: list(Course.objects.filter(owner=user)))
+
+
+class CourseListView(LoginRequiredMixin, ConditionalPageMixin, generic.ListView):
     model = Course
     template_name = 'planner/course_list.html'
     context_object_name = 'courses'
 
     def get_queryset(self):
-        return Course.objects.filter(owner=self.request.user)
+        return user_courses(self.request.user)
 
 
-class CourseCreateView(LoginRequiredMixin, generic.CreateView):
+class CourseCreateView(LoginRequiredMixin, WriteTransactionMixin, generic.CreateView):
     model = Course
     form_class = CourseForm
     template_name = 'planner/course_form.html'
@@ -107,7 +257,7 @@ class CourseCreateView(LoginRequiredMixin, generic.CreateView):
         return reverse('course_detail', kwargs={'pk': self.object.pk})
 
 
-class CourseUpdateView(LoginRequiredMixin, generic.UpdateView):
+class CourseUpdateView(LoginRequiredMixin, WriteTransactionMixin, generic.UpdateView):
     model = Course
     form_class = CourseForm
     template_name = 'planner/course_form.html'
@@ -117,7 +267,7 @@ class CourseUpdateView(LoginRequiredMixin, generic.UpdateView):
         return Course.objects.filter(owner=self.request.user)
 
 
-class CourseDeleteView(LoginRequiredMixin, generic.DeleteView):
+class CourseDeleteView(LoginRequiredMixin, WriteTransactionMixin, generic.DeleteView):
     model = Course
     template_name = 'planner/confirm_delete.html'
     success_url = reverse_lazy('course_list')
@@ -126,10 +276,11 @@ class CourseDeleteView(LoginRequiredMixin, generic.DeleteView):
         return Course.objects.filter(owner=self.request.user)
 
 
-class CourseDetailView(LoginRequiredMixin, generic.DetailView):
+class CourseDetailView(LoginRequiredMixin, ConditionalPageMixin, generic.DetailView):
     model = Course
     template_name = 'planner/course_detail.html'
     context_object_name = 'course'
+    revalidate_every = 60
 
     def get_queryset(self):
         return Course.objects.filter(owner=self.request.user)
@@ -141,111 +292,84 @@ class CourseDetailView(LoginRequiredMixin, generic.DetailView):
         return context
 
 
-class TaskListView(LoginRequiredMixin, generic.ListView):
+TASK_FILTERS = ('q', 'status', 'course', 'deadline')
+
+
+def filter_tasks(qs, params):
+    """Apply the task list filters (status, course, q, deadline range) from request parameters."""
+    status = params.get('status')
+    course = params.get('course')
+    deadline_range = params.get('deadline')
+    query = params.get('q')
+
+    if status:
+        qs = qs.filter(status=status)
+    if course:
+        qs = qs.filter(course_id=course)
+    if query:
+        qs = search.filter_queryset(qs, query)
+
+    now = timezone.now()
+    today = timezone.localdate()
+    start_of_day = timezone.make_aware(timezone.datetime.combine(today, timezone.datetime.min.time()))
+    end_of_day = timezone.make_aware(timezone.datetime.combine(today, timezone.datetime.max.time()))
+    if deadline_range == 'today':
+        qs = qs.filter(deadline__range=(start_of_day, end_of_day))
+    elif deadline_range == 'week':
+        qs = qs.filter(deadline__gte=now, deadline__lte=now + timedelta(days=7))
+    elif deadline_range == 'overdue':
+        qs = qs.filter(deadline__lt=now)
+    return qs
+
+
+class TaskListView(LoginRequiredMixin, ConditionalPageMixin, generic.ListView):
     model = Task
     template_name = 'planner/task_list.html'
     context_object_name = 'tasks'
     paginate_by = 10
+    revalidate_every = 60
 
     def get_queryset(self):
-        qs = Task.objects.filter(owner=self.request.user).select_related('course')
-        status = self.request.GET.get('status')
-        course = self.request.GET.get('course')
-        deadline_range = self.request.GET.get('deadline')
-        query = self.request.GET.get('q')
-
-        if status:
-            qs = qs.filter(status=status)
-        if course:
-            qs = qs.filter(course_id=course)
-        if query:
-            qs = qs.filter(Q(title__icontains=query) | Q(description__icontains=query))
-
+        qs = filter_tasks(Task.objects.filter(owner=self.request.user).select_related('course'), self.request.GET)
         now = timezone.now()
-        today = timezone.localdate()
-        start_of_day = timezone.make_aware(timezone.datetime.combine(today, timezone.datetime.min.time()))
-        end_of_day = timezone.make_aware(timezone.datetime.combine(today, timezone.datetime.max.time()))
-        if deadline_range == 'today':
-            qs = qs.filter(deadline__range=(start_of_day, end_of_day))
-        elif deadline_range == 'week':
-            qs = qs.filter(deadline__gte=now, deadline__lte=now + timedelta(days=7))
-        elif deadline_range == 'overdue':
-            qs = qs.filter(deadline__lt=now)
+        nearest_reminder = Reminder.objects.filter(task=OuterRef('pk'), remind_at__gte=now).order_by('remind_at')
+        return qs.annotate(nearest_remind_at=Subquery(nearest_reminder.values('remind_at')[:1]))
 
-        return qs
+    def paginate_queryset(self, queryset, page_size):
+        if self.request.GET.get('page'):
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size)
+        page = paginator.page(self.request.GET.get('cursor'), with_count=bool(self.request.GET.get('count')))
+        return paginator, page, page.object_list, page.has_other_pages()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['courses'] = Course.objects.filter(owner=self.request.user)
+        context['courses'] = user_courses(self.request.user)
+        context['bulk_form'] = TaskBulkActionForm()
+        context['active_filters'] = [(key, self.request.GET[key]) for key in TASK_FILTERS if self.request.GET.get(key)]
         context['now'] = timezone.now()
-        tasks_page = context['tasks']
-        task_ids = [task.id for task in tasks_page]
-        reminders = Reminder.objects.filter(owner=self.request.user, task_id__in=task_ids).order_by('task_id', 'remind_at')
-        nearest = {}
-        for reminder in reminders:
-            if reminder.task_id not in nearest:
-                nearest[reminder.task_id] = reminder
-        context['nearest_reminders'] = nearest
+        context['forecasts'] = DeadlineForecast(self.request.user, now=context['now']).statuses(context['tasks'])
         return context
 
 
-class TaskDetailView(LoginRequiredMixin, generic.DetailView):
+class TaskDetailView(LoginRequiredMixin, ConditionalPageMixin, generic.DetailView):
     model = Task
     template_name = 'planner/task_detail.html'
     context_object_name = 'task'
+    revalidate_every = 60
 
     def get_queryset(self):
-        return Task.objects.filter(owner=self.request.user)
+        return Task.objects.filter(owner=self.request.user).select_related('course')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         task = self.object
-        forecast = self._build_forecast(task)
-        context['forecast'] = forecast
+        context['forecast'] = DeadlineForecast(self.request.user).for_task(task)
         context['now'] = timezone.now()
         return context
 
-    def _build_forecast(self, task: Task) -> dict:
-        if not task.deadline:
-            return {'status': 'no_deadline'}
-
-        now = timezone.now()
-        if task.deadline <= now:
-            return {'status': 'deadline_passed'}
-
-        seven_days_ago = now - timedelta(days=7)
-        done_minutes = Task.objects.filter(
-            owner=self.request.user,
-            status=Task.Status.DONE,
-            completed_at__gte=seven_days_ago,
-            completed_at__lte=now,
-        ).aggregate(total=Sum('estimated_minutes'))['total'] or 0
-        capacity_per_day = done_minutes / 7
-
-        if capacity_per_day == 0:
-            return {'status': 'no_data'}
-
-        remaining_minutes = Task.objects.filter(
-            owner=self.request.user,
-            status__in=[Task.Status.TODO, Task.Status.DOING],
-            deadline__gte=now,
-            deadline__lte=task.deadline,
-        ).aggregate(total=Sum('estimated_minutes'))['total'] or 0
-
-        seconds_left = (task.deadline - now).total_seconds()
-        days_left = max(1, int((seconds_left + 86399) // 86400))
-        capacity_total = capacity_per_day * days_left
-
-        return {
-            'status': 'ok' if remaining_minutes <= capacity_total else 'risk',
-            'remaining_minutes': remaining_minutes,
-            'days_left': days_left,
-            'capacity_per_day': capacity_per_day,
-            'capacity_total': capacity_total,
-        }
-
 
-class TaskCreateView(LoginRequiredMixin, generic.CreateView):
+class TaskCreateView(LoginRequiredMixin, WriteTransactionMixin, generic.CreateView):
     model = Task
     form_class = TaskForm
     template_name = 'planner/task_form.html'
@@ -274,7 +398,25 @@ class TaskCreateView(LoginRequiredMixin, generic.CreateView):
         return initial
 
 
-class TaskUpdateView(LoginRequiredMixin, generic.UpdateView):
+class TaskImportView(LoginRequiredMixin, generic.FormView):
+    form_class = TaskImportForm
+    template_name = 'planner/task_import.html'
+
+    def form_valid(self, form):
+        importer = TaskImporter(self.request.user, create_courses=form.cleaned_data['create_courses'])
+        upload = form.cleaned_data['file']
+        try:
+            report = importer.run(read_rows(open_text(upload.file), form.cleaned_data['format']))
+        except forms.ValidationError as exc:
+            # Raised part way through the file, after the rows before it were rolled back with the rest.
+            form.add_error('file', exc)
+            return self.form_invalid(form)
+        if report.created:
+            messages.success(self.request, f'Imported {report.created} tasks.')
+        return self.render_to_response(self.get_context_data(form=form, report=report))
+
+
+class TaskUpdateView(LoginRequiredMixin, WriteTransactionMixin, generic.UpdateView):
     model = Task
     form_class = TaskForm
     template_name = 'planner/task_form.html'
@@ -291,7 +433,7 @@ class TaskUpdateView(LoginRequiredMixin, generic.UpdateView):
         return reverse('task_detail', kwargs={'pk': self.object.pk})
 
 
-class TaskDeleteView(LoginRequiredMixin, generic.DeleteView):
+class TaskDeleteView(LoginRequiredMixin, WriteTransactionMixin, generic.DeleteView):
     model = Task
     template_name = 'planner/confirm_delete.html'
     success_url = reverse_lazy('task_list')
@@ -306,11 +448,38 @@ class TaskStatusUpdateView(LoginRequiredMixin, generic.View):
         status = request.POST.get('status')
         if status in Task.Status.values:
             task.status = status
-            task.save()
+            with sqlite.write():
+                task.save()
         return redirect(request.META.get('HTTP_REFERER', reverse('task_detail', kwargs={'pk': pk})))
 
 
-class ReminderListView(LoginRequiredMixin, generic.ListView):
+class TaskBulkActionView(LoginRequiredMixin, generic.View):
+    """Apply one action to the selected tasks or to every task matching the list filter."""
+
+    def post(self, request):
+        filters = {key: request.POST[key] for key in TASK_FILTERS if request.POST.get(key)}
+        back = f"{reverse('task_list')}?{urlencode(filters)}" if filters else reverse('task_list')
+        form = TaskBulkActionForm(request.POST, user=request.user)
+        if not form.is_valid():
+            for errors in form.errors.values():
+                messages.error(request, ' '.join(errors))
+            return redirect(back)
+
+        tasks = Task.objects.all()
+        if form.cleaned_data['scope'] == 'filter':
+            tasks = filter_tasks(tasks, filters)
+        else:
+            tasks = tasks.filter(pk__in=form.cleaned_data['ids'])
+        with sqlite.write():
+            count = bulk.apply(
+                request.user, tasks, form.cleaned_data['action'],
+                course=form.cleaned_data['target_course'], days=form.cleaned_data['days'] or 0,
+            )
+        messages.success(request, f'Updated {count} tasks.' if form.cleaned_data['action'] != 'delete' else f'Deleted {count} tasks.')
+        return redirect(back)
+
+
+class ReminderListView(LoginRequiredMixin, ConditionalPageMixin, generic.ListView):
     model = Reminder
     template_name = 'planner/reminder_list.html'
     context_object_name = 'reminders'
@@ -319,7 +488,7 @@ class ReminderListView(LoginRequiredMixin, generic.ListView):
         return Reminder.objects.filter(owner=self.request.user).select_related('task')
 
 
-class ReminderCreateView(LoginRequiredMixin, generic.CreateView):
+class ReminderCreateView(LoginRequiredMixin, WriteTransactionMixin, generic.CreateView):
     model = Reminder
     form_class = ReminderForm
     template_name = 'planner/reminder_form.html'
@@ -335,7 +504,7 @@ class ReminderCreateView(LoginRequiredMixin, generic.CreateView):
         return super().form_valid(form)
 
 
-class ReminderUpdateView(LoginRequiredMixin, generic.UpdateView):
+class ReminderUpdateView(LoginRequiredMixin, WriteTransactionMixin, generic.UpdateView):
     model = Reminder
     form_class = ReminderForm
     template_name = 'planner/reminder_form.html'
@@ -350,7 +519,7 @@ class ReminderUpdateView(LoginRequiredMixin, generic.UpdateView):
         return kwargs
 
 
-class ReminderDeleteView(LoginRequiredMixin, generic.DeleteView):
+class ReminderDeleteView(LoginRequiredMixin, WriteTransactionMixin, generic.DeleteView):
     model = Reminder
     template_name = 'planner/confirm_delete.html'
     success_url = reverse_lazy('reminder_list')
@@ -359,36 +528,176 @@ class ReminderDeleteView(LoginRequiredMixin, generic.DeleteView):
         return Reminder.objects.filter(owner=self.request.user)
 
 
-class CalendarWeekView(LoginRequiredMixin, generic.TemplateView):
+# Days the calendar pages can show; their ranges and prev/next links stay clear of date.min and date.max.
+CALENDAR_DAYS = (date(1900, 1, 1), date(2999, 12, 31))
+
+
+def parse_day(value, default=None):
+    try:
+        day = date.fromisoformat(value) if value else default
+    except ValueError:
+        return default
+    if day is not None and not CALENDAR_DAYS[0] <= day <= CALENDAR_DAYS[1]:
+        return default
+    return day
+
+
+class CalendarRangeMixin:
+    """Group event occurrences by local day for the days a calendar view shows (visible_range())."""
+    # Set by the async views, which load them before the context is built.
+    events = None
+
+    def range_events(self, first_day, last_day):
+        start_dt, end_dt = day_start(first_day), day_start(last_day + timedelta(days=1))
+        events = recurrence.overlapping(StudyEvent.objects.filter(owner=self.request.user), start_dt, end_dt)
+        return events.only('id', 'title', 'location', *recurrence.EXPANSION_FIELDS)
+
+    def occurrences_by_day(self, first_day, last_day):
+        start_dt, end_dt = day_start(first_day), day_start(last_day + timedelta(days=1))
+        events = self.events if self.events is not None else self.range_events(first_day, last_day)
+        grouped = {first_day + timedelta(days=i): [] for i in range((last_day - first_day).days + 1)}
+        for occurrence in recurrence.expand(events, start_dt, end_dt):
+            # Occurrences that began before the range and run into it are shown on its first day.
+            grouped[max(timezone.localtime(occurrence.start_at).date(), first_day)].append(occurrence)
+        return grouped
+
+
+class CalendarWeekView(LoginRequiredMixin, ConditionalPageMixin, CalendarRangeMixin, generic.TemplateView):
     template_name = 'planner/calendar_week.html'
 
+    def visible_range(self):
+        today = timezone.localdate()
+        week_start = parse_day(self.request.GET.get('week'), today - timedelta(days=today.weekday()))
+        return week_start, week_start + timedelta(days=6)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        week_start_param = self.request.GET.get('week')
-        if week_start_param:
-            week_start = timezone.datetime.fromisoformat(week_start_param).date()
-        else:
-            today = timezone.localdate()
-            week_start = today - timedelta(days=today.weekday())
+        week_start, _ = self.visible_range()
 
         days = [week_start + timedelta(days=i) for i in range(7)]
-        start_dt = timezone.make_aware(timezone.datetime.combine(days[0], timezone.datetime.min.time()))
-        end_dt = timezone.make_aware(timezone.datetime.combine(days[-1], timezone.datetime.max.time()))
-
-        events = StudyEvent.objects.filter(owner=self.request.user, start_at__range=(start_dt, end_dt)).order_by('start_at')
-        grouped = {day: [] for day in days}
-        for event in events:
-            grouped[event.start_at.date()].append(event)
-
         context['week_start'] = week_start
         context['prev_week'] = week_start - timedelta(days=7)
         context['next_week'] = week_start + timedelta(days=7)
         context['days'] = days
+        context['grouped_events'] = self.occurrences_by_day(days[0], days[-1])
+        return context
+
+
+class CalendarMonthView(LoginRequiredMixin, ConditionalPageMixin, CalendarRangeMixin, generic.TemplateView):
+    template_name = 'planner/calendar_month.html'
+
+    def visible_month(self):
+        return parse_day(f"{self.request.GET.get('month')}-01", timezone.localdate()).replace(day=1)
+
+    def visible_range(self):
+        """Whole weeks around the month."""
+        month = self.visible_month()
+        last_day = (month + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+        return month - timedelta(days=month.weekday()), last_day + timedelta(days=6 - last_day.weekday())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        month = self.visible_month()
+        next_month = (month + timedelta(days=31)).replace(day=1)
+        first_day, last_day = self.visible_range()
+
+        grouped = self.occurrences_by_day(first_day, last_day)
+        days = list(grouped)
+        context['month'] = month
+        context['prev_month'] = (month - timedelta(days=1)).replace(day=1)
+        context['next_month'] = next_month
+        context['weeks'] = [days[i:i + 7] for i in range(0, len(days), 7)]
         context['grouped_events'] = grouped
         return context
 
 
-class StudyEventCreateView(LoginRequiredMixin, generic.CreateView):
+class CalendarAgendaView(LoginRequiredMixin, ConditionalPageMixin, CalendarRangeMixin, generic.TemplateView):
+    template_name = 'planner/calendar_agenda.html'
+    default_days = 14
+    max_days = 92
+
+    def visible_range(self):
+        first_day = parse_day(self.request.GET.get('from'), timezone.localdate())
+        last_day = parse_day(self.request.GET.get('to'), first_day + timedelta(days=self.default_days - 1))
+        if last_day < first_day:
+            last_day = first_day
+        return first_day, min(last_day, first_day + timedelta(days=self.max_days - 1))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        first_day, last_day = self.visible_range()
+        span = timedelta(days=(last_day - first_day).days + 1)
+
+        grouped = self.occurrences_by_day(first_day, last_day)
+        context['from_day'] = first_day
+        context['to_day'] = last_day
+        context['prev_from'], context['prev_to'] = first_day - span, first_day - timedelta(days=1)
+        context['next_from'], context['next_to'] = last_day + timedelta(days=1), last_day + span
+        context['agenda'] = [(day, occurrences) for day, occurrences in grouped.items() if occurrences]
+        context['max_days'] = self.max_days
+        return context
+
+
+class AsyncCalendarMixin(AsyncPageMixin):
+    """Async calendar pages: the events are read with async iteration, then the context is built as usual."""
+
+    async def aget_context_data(self, **kwargs):
+        self.events = [event async for event in self.range_events(*self.visible_range())]
+        return self.get_context_data(**kwargs)
+
+
+class AsyncCalendarWeekView(AsyncCalendarMixin, CalendarWeekView):
+    pass
+
+
+class AsyncCalendarMonthView(AsyncCalendarMixin, CalendarMonthView):
+    pass
+
+
+class AsyncCalendarAgendaView(AsyncCalendarMixin, CalendarAgendaView):
+    pass
+
+
+class CalendarFeedSettingsView(LoginRequiredMixin, generic.TemplateView):
+    template_name = 'planner/calendar_feed.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        feed, _ = CalendarFeed.objects.get_or_create(owner=self.request.user)
+        context['feed_url'] = self.request.build_absolute_uri(reverse('calendar_feed_ics', args=[feed.token]))
+        return context
+
+    def post(self, request, *args, **kwargs):
+        with sqlite.write():
+            CalendarFeed.objects.update_or_create(owner=request.user, defaults={'token': new_feed_token()})
+        messages.success(request, 'Feed link regenerated; the old link no longer works.')
+        return redirect('calendar_feed')
+
+
+class CalendarFeedView(generic.View):
+    """Token-authenticated .ics feed; an unchanged calendar costs one query and a 304."""
+
+    def get(self, request, token):
+        feed = CalendarFeed.objects.select_related('owner__change_stamp').filter(token=token).first()
+        if feed is None:
+            raise Http404
+        try:
+            stamp = feed.owner.change_stamp
+        except ChangeStamp.DoesNotExist:
+            stamp = stamps.current(feed.owner_id)
+        etag = f'"{feed.owner_id}-{stamp.version}"'
+        last_modified = int(stamp.changed_at.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = StreamingHttpResponse(ics.feed(feed.owner_id, stamp.changed_at), content_type='text/calendar; charset=utf-8')
+            response['Content-Disposition'] = 'inline; filename="studyplanner.ics"'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, max_age=0)
+        return response
+
+
+class StudyEventCreateView(LoginRequiredMixin, WriteTransactionMixin, generic.CreateView):
     model = StudyEvent
     form_class = StudyEventForm
     template_name = 'planner/event_form.html'
@@ -399,7 +708,7 @@ class StudyEventCreateView(LoginRequiredMixin, generic.CreateView):
         return super().form_valid(form)
 
 
-class StudyEventUpdateView(LoginRequiredMixin, generic.UpdateView):
+class StudyEventUpdateView(LoginRequiredMixin, WriteTransactionMixin, generic.UpdateView):
     model = StudyEvent
     form_class = StudyEventForm
     template_name = 'planner/event_form.html'
@@ -409,7 +718,7 @@ class StudyEventUpdateView(LoginRequiredMixin, generic.UpdateView):
         return StudyEvent.objects.filter(owner=self.request.user)
 
 
-class StudyEventDeleteView(LoginRequiredMixin, generic.DeleteView):
+class StudyEventDeleteView(LoginRequiredMixin, WriteTransactionMixin, generic.DeleteView):
     model = StudyEvent
     template_name = 'planner/confirm_delete.html'
     success_url = reverse_lazy('calendar_week')
@@ -418,54 +727,54 @@ class StudyEventDeleteView(LoginRequiredMixin, generic.DeleteView):
         return StudyEvent.objects.filter(owner=self.request.user)
 
 
-class StatsView(LoginRequiredMixin, generic.TemplateView):
+class StatsView(LoginRequiredMixin, ConditionalPageMixin, generic.TemplateView):
     template_name = 'planner/stats.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         today = timezone.localdate()
-        start_date = today - timedelta(days=13)
+        context.update(caching.get_or_set(self.request.user, f'stats:{today}', lambda: self.stats_data(today)))
+        return context
 
-        done_qs = Task.objects.filter(
-            owner=self.request.user,
-            status=Task.Status.DONE,
-            completed_at__date__gte=start_date,
-            completed_at__date__lte=today,
-        ).annotate(day=TruncDate('completed_at')).values('day').annotate(
-            count=Count('id'),
-            minutes=Sum('estimated_minutes'),
-        )
-        done_map = {row['day']: row for row in done_qs}
+    def stats_queries(self, today):
+        """The page's independent queries by name: run in turn here, concurrently by AsyncStatsView."""
+        user = self.request.user
+        return {
+            'daily': lambda: rollup.daily(user, today - timedelta(days=13), today),
+            'totals': lambda: DailyStat.objects.filter(owner=user).aggregate(
+                total_tasks=Sum('created_count'),
+                total_done=Sum('done_count'),
+            ),
+            'streak': lambda: rollup.streak(user, today),
+        }
 
+    def stats_data(self, today):
+        return self.stats_context({name: query() for name, query in self.stats_queries(today).items()}, today)
+
+    def stats_context(self, results, today):
+        context = {}
+        start_date = today - timedelta(days=13)
+
+        stats = results['daily']
         daily = []
         for i in range(14):
             day = start_date + timedelta(days=i)
-            row = done_map.get(day)
+            row = stats.get(day)
             daily.append({
                 'day': day,
-                'count': row['count'] if row else 0,
-                'minutes': row['minutes'] if row else 0,
+                'count': row.done_count if row else 0,
+                'minutes': row.done_minutes if row else 0,
+                'created': row.created_count if row else 0,
             })
 
-        total_tasks = Task.objects.filter(owner=self.request.user).count()
-        total_done = Task.objects.filter(owner=self.request.user, status=Task.Status.DONE).count()
+        totals = results['totals']
+        total_tasks = totals['total_tasks'] or 0
+        total_done = totals['total_done'] or 0
 
-        week_start = today - timedelta(days=6)
-        done_last_7 = Task.objects.filter(
-            owner=self.request.user,
-            status=Task.Status.DONE,
-            completed_at__date__gte=week_start,
-            completed_at__date__lte=today,
-        ).count()
-        created_last_7 = Task.objects.filter(owner=self.request.user, created_at__date__gte=week_start, created_at__date__lte=today).count()
+        done_last_7 = sum(row['count'] for row in daily[-7:])
+        created_last_7 = sum(row['created'] for row in daily[-7:])
         completion_7 = int((done_last_7 / created_last_7) * 100) if created_last_7 else 0
-
-        done_dates = set(Task.objects.filter(owner=self.request.user, status=Task.Status.DONE).values_list('completed_at__date', flat=True))
-        streak = 0
-        cursor = today
-        while cursor in done_dates:
-            streak += 1
-            cursor -= timedelta(days=1)
+        streak = results['streak']
 
         context['daily'] = daily
         context['total_tasks'] = total_tasks
@@ -473,3 +782,76 @@ class StatsView(LoginRequiredMixin, generic.TemplateView):
         context['completion_7'] = completion_7
         context['streak'] = streak
         return context
+
+
+class AsyncStatsView(AsyncPageMixin, StatsView):
+    async def aget_context_data(self, **kwargs):
+        context = await super().aget_context_data(**kwargs)
+        today = timezone.localdate()
+        context.update(await caching.aget_or_set(self.request.user, f'stats:{today}', lambda: self.astats_data(today)))
+        return context
+
+    async def astats_data(self, today):
+        return self.stats_context(await parallel.gather(self.stats_queries(today)), today)
+
+
+class SearchView(LoginRequiredMixin, generic.TemplateView):
+    template_name = 'planner/search.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        context['query'] = query
+        context['results'] = search.search_all(self.request.user, query) if query else None
+        return context
+
+
+class AutocompleteView(LoginRequiredMixin, generic.View):
+    """JSON choices for the lazy select widgets.
+
+    The user's rows matching every word of ?q as a prefix, ?limit at a time; ?cursor comes from the previous response.
+    """
+    model = None
+    ordering = ('id',)
+    default_limit = 20
+    max_limit = 50
+
+    def get_queryset(self):
+        return self.model.objects.filter(owner=self.request.user)
+
+    def get(self, request):
+        queryset = self.get_queryset()
+        query = request.GET.get('q', '').strip()
+        if query:
+            queryset = search.filter_queryset(queryset, query)
+        cursor = request.GET.get('cursor')
+        if cursor:
+            position = decode_position(cursor, self.ordering)
+            if position is None:
+                return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+            queryset = queryset.filter(after_position(self.ordering, position))
+        limit = request.GET.get('limit', '')
+        limit = min(int(limit), self.max_limit) if limit.isdigit() and int(limit) > 0 else self.default_limit
+
+        rows = list(queryset.order_by(*self.ordering)[:limit + 1])
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return JsonResponse({
+            'results': [{'id': obj.pk, 'text': str(obj)} for obj in rows],
+            'next': encode_position(rows[-1], self.ordering) if more else None,
+        })
+
+
+class TaskAutocompleteView(AutocompleteView):
+    model = Task
+    # Newest first: the owner_id index already holds the ids in order.
+    ordering = ('-id',)
+
+    def get_queryset(self):
+        # Done tasks are still valid choices (old reminders keep them), they are just not offered.
+        return super().get_queryset().filter(status__in=OPEN_STATUSES).only('id', 'title')
+
+
+class CourseAutocompleteView(AutocompleteView):
+    model = Course
+    ordering = ('name', 'id')
@@ -3,5 +3,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'studyplanner.settings')
+# Under ASGI the dashboard, stats and calendar pages are served by their async views.
+os.environ.setdefault('PLANNER_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
\ No newline at end of file
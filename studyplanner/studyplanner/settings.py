@@ -32,11 +32,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'planner.middleware.AsyncWhiteNoiseMiddleware',
+    'planner.middleware.RequestTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'planner.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,6 +69,16 @@ DATABASES = {
     )
 }
 
+# Applied to every new SQLite connection (planner.sqlite): these limits, and BEGIN IMMEDIATE for sqlite.write().
+# Ignored on other databases.
+SQLITE_TUNING = os.getenv('SQLITE_TUNING', 'True').lower() == 'true'
+# WAL journal and synchronous=NORMAL. The journal mode is stored in the database file, so this is off by default
+# to leave the bundled demo database as it is; turn it on for a deployed database.
+SQLITE_WAL = os.getenv('SQLITE_WAL', 'False').lower() == 'true'
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_MMAP_SIZE_MB = int(os.getenv('SQLITE_MMAP_SIZE_MB', '256'))
+SQLITE_CACHE_SIZE_MB = int(os.getenv('SQLITE_CACHE_SIZE_MB', '32'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -94,6 +106,60 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Per-user planner caches (planner.caching); use CACHE_BACKEND=file to share them between processes.
+if os.getenv('CACHE_BACKEND', 'locmem') == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'studyplanner',
+            'TIMEOUT': 300,
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'StudyPlanner <noreply@studyplanner.local>')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '1025'))
+EMAIL_FILE_PATH = os.getenv('EMAIL_FILE_PATH', str(BASE_DIR / 'sent_reminders'))
+REMINDER_EMAIL_BACKEND = os.getenv('REMINDER_EMAIL_BACKEND', 'console')
+
+# Per-request query/timing instrumentation (planner.middleware); removed from the chain when off.
+REQUEST_TIMING = os.getenv('REQUEST_TIMING', 'False').lower() == 'true'
+REQUEST_QUERY_BUDGET = int(os.getenv('REQUEST_QUERY_BUDGET', '30'))
+REQUEST_TIME_BUDGET_MS = int(os.getenv('REQUEST_TIME_BUDGET_MS', '500'))
+REQUEST_REPEATED_QUERY_THRESHOLD = int(os.getenv('REQUEST_REPEATED_QUERY_THRESHOLD', '5'))
+
+# Staff-only cProfile runs (?_profile=N or X-Profile: N); the newest PROFILE_KEEP .prof files are kept.
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', 'True').lower() == 'true'
+PROFILE_DIR = Path(os.getenv('PROFILE_DIR', str(BASE_DIR / 'profiles')))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '20'))
+
+# Async dashboard, stats and calendar pages (planner.views.Async*); asgi.py switches them on. Their independent
+# queries run together on PLANNER_QUERY_THREADS threads per process (planner.parallel); left unset,
+# PLANNER_PARALLEL_QUERIES is on for every database but SQLite.
+PLANNER_ASYNC_VIEWS = os.getenv('PLANNER_ASYNC_VIEWS', 'False').lower() == 'true'
+PLANNER_PARALLEL_QUERIES = {'true': True, 'false': False}.get(os.getenv('PLANNER_PARALLEL_QUERIES', '').lower())
+PLANNER_QUERY_THREADS = int(os.getenv('PLANNER_QUERY_THREADS', '4'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'planner': {'handlers': ['console'], 'level': os.getenv('PLANNER_LOG_LEVEL', 'INFO')},
+    },
+}
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'